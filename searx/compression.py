@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Compression of the responses of the webapp, see the ``compression:`` section of the settings.
+
+The encoding is negotiated with the ``Accept-Encoding`` header among the
+available ``encodings``: ``gzip`` always, ``br`` with the brotli package,
+``zstd`` with the zstandard package.  The streamed responses (for example
+``/search`` with ``Accept: text/event-stream``) are compressed chunk by chunk:
+each chunk is flushed so the client receives each frame without delay.
+
+The responses with a ``Content-Encoding`` (the precompressed static files) and
+the files sent by :py:func:`flask.send_file` are not compressed again.
+"""
+
+import zlib
+
+from searx import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSED_MIMETYPES = frozenset((
+    'text/html',
+    'text/plain',
+    'text/xml',
+    'text/csv',
+    'text/css',
+    'text/event-stream',
+    'application/json',
+    'application/x-ndjson',
+    'application/x-suggestions+json',
+    'application/csv',
+    'application/rss+xml',
+    'application/opensearchdescription+xml',
+))
+
+
+class GzipCompressor:
+
+    __slots__ = '_compressobj',
+
+    def __init__(self, level):
+        self._compressobj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressobj.compress(data)
+
+    def flush(self):
+        return self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressobj.flush()
+
+
+class BrotliCompressor:
+
+    __slots__ = '_compressor',
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+
+    __slots__ = '_compressobj',
+
+    def __init__(self, level):
+        self._compressobj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressobj.compress(data)
+
+    def flush(self):
+        return self._compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressobj.flush()
+
+
+# {encoding: (compressor class, default level)}
+COMPRESSORS = {
+    'gzip': (GzipCompressor, 6),
+}
+if brotli is not None:
+    COMPRESSORS['br'] = (BrotliCompressor, 4)
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (ZstdCompressor, 3)
+
+compression_settings = settings.get('compression') or {}
+enabled = compression_settings.get('enabled', False)
+min_size = compression_settings.get('min_size', 1024)
+levels = compression_settings.get('levels') or {}
+# the available encodings in the order of preference of searx
+encodings = [encoding for encoding in compression_settings.get('encodings', ('br', 'zstd', 'gzip'))
+             if encoding in COMPRESSORS]
+
+
+def get_compressor(encoding):
+    compressor_class, default_level = COMPRESSORS[encoding]
+    return compressor_class(levels.get(encoding, default_level))
+
+
+def _compress_iter(compressor, iterable, charset):
+    try:
+        for data in iterable:
+            if isinstance(data, str):
+                data = data.encode(charset)
+            if data:
+                yield compressor.compress(data) + compressor.flush()
+        yield compressor.finish()
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+def compress_response(response, accept_encodings):
+    """Compress response with the best encoding of accept_encodings (``request.accept_encodings``),
+    return response"""
+    if response.status_code < 200 or response.status_code in (204, 304) \
+       or response.direct_passthrough \
+       or 'Content-Encoding' in response.headers \
+       or response.mimetype not in COMPRESSED_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = accept_encodings.best_match(encodings)
+    if encoding is None:
+        return response
+    compressor = get_compressor(encoding)
+    if response.is_streamed:
+        response.response = _compress_iter(compressor, response.response, response.charset)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compressor.compress(data) + compressor.finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
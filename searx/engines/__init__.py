@@ -28,6 +28,8 @@ from searx import logger
 from searx.data import ENGINES_LANGUAGES
 from searx.poolrequests import get, get_proxy_cycles
 from searx.utils import load_module, match_language, get_engine_from_settings
+from searx.metrology.counters import get_engine_stats
+from searx.metrology.histogram import get_percentiles
 
 
 logger = logger.getChild('engines')
@@ -42,6 +44,10 @@ babel_langs = [lang_parts[0] + '-' + lang_parts[-1] if len(lang_parts) > 1 else
                for lang_parts in (lang_code.split('_') for lang_code in locale_identifiers())]
 
 engine_shortcuts = {}
+
+# incremented each time the engines are loaded: the caches built from the engines compare it
+engines_version = 0
+
 engine_default_args = {'paging': False,
                        'categories': ['general'],
                        'language_support': True,
@@ -50,11 +56,12 @@ engine_default_args = {'paging': False,
                        'timeout': settings['outgoing']['request_timeout'],
                        'shortcut': '-',
                        'disabled': False,
-                       'suspend_end_time': 0,
-                       'continuous_errors': 0,
                        'time_range_support': False,
                        'engine_type': 'online',
                        'display_error_messages': True,
+                       'cache_ttl': 0,
+                       'enable_http2': settings['outgoing'].get('enable_http2', False),
+                       'hedging': settings['outgoing'].get('hedging', False),
                        'tokens': []}
 
 
@@ -132,21 +139,8 @@ def load_engine(engine_data):
         setattr(engine, 'fetch_supported_languages',
                 lambda: engine._fetch_supported_languages(get(engine.supported_languages_url)))
 
-    engine.stats = {
-        'sent_search_count': 0,  # sent search
-        'search_count': 0,  # succesful search
-        'result_count': 0,
-        'engine_time': 0,
-        'engine_time_count': 0,
-        'score_count': 0,
-        'errors': 0
-    }
-
-    engine_type = getattr(engine, 'engine_type', 'online')
-
-    if engine_type != 'offline':
-        engine.stats['page_load_time'] = 0
-        engine.stats['page_load_count'] = 0
+    # sent_search_count: sent search, search_count: succesful search
+    engine.stats = get_engine_stats(engine.name)
 
     # tor related settings
     if settings['outgoing'].get('using_tor_proxy'):
@@ -216,7 +210,9 @@ def get_engines_stats(preferences):
             if engine.stats['page_load_count'] != 0:
                 load_times = engine.stats['page_load_time'] / float(engine.stats['page_load_count'])  # noqa
             max_pageload = max(load_times, max_pageload)
-            pageloads.append({'avg': load_times, 'name': engine.name})
+            pageload = {'avg': load_times, 'name': engine.name}
+            pageload.update(get_percentiles(engine.name, 'http'))
+            pageloads.append(pageload)
 
         max_engine_times = max(this_engine_time, max_engine_times)
         max_results = max(results_num, max_results)
@@ -224,7 +220,10 @@ def get_engines_stats(preferences):
         max_score_per_result = max(score_per_result, max_score_per_result)
         max_errors = max(max_errors, engine.stats['errors'])
 
-        engine_times.append({'avg': this_engine_time, 'name': engine.name})
+        engine_time = {'avg': this_engine_time, 'name': engine.name}
+        # the average hides the slow responses
+        engine_time.update(get_percentiles(engine.name, 'total'))
+        engine_times.append(engine_time)
         results.append({'avg': results_num, 'name': engine.name})
         scores.append({'avg': score, 'name': engine.name})
         errors.append({'avg': engine.stats['errors'], 'name': engine.name})
@@ -268,8 +267,13 @@ def get_engines_stats(preferences):
     ]
 
 
+def get_engines_version():
+    return engines_version
+
+
 def load_engines(engine_list):
-    global engines, engine_shortcuts
+    global engines, engine_shortcuts, engines_version
+    engines_version += 1
     engines.clear()
     engine_shortcuts.clear()
     for engine_data in engine_list:
@@ -24,6 +24,8 @@ base_url = 'https://export.arxiv.org/api/query?search_query=all:'\
 
 # engine dependent config
 number_of_results = 10
+# cache the results during one hour
+cache_ttl = 3600
 
 
 def request(query, params):
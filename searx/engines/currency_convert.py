@@ -5,6 +5,8 @@ engine_type = 'online_currency'
 categories = []
 url = 'https://duckduckgo.com/js/spice/currency/1/{0}/{1}'
 weight = 100
+# cache the exchange rates during 10 minutes
+cache_ttl = 600
 
 https_support = True
 
@@ -18,6 +18,8 @@ engine_type = 'online_dictionnary'
 categories = ['general']
 url = 'https://dictzone.com/{from_lang}-{to_lang}-dictionary/{query}'
 weight = 100
+# cache the translations during one day
+cache_ttl = 86400
 
 results_xpath = './/table[@id="r"]/tr'
 https_support = True
@@ -25,6 +25,8 @@ categories = ['images']
 paging = True
 language_support = True
 safesearch = True
+# request() sends a blocking HTTP request (get_vqd)
+use_asyncio = False
 
 # search-url
 images_url = 'https://duckduckgo.com/i.js?{query}&s={offset}&p={safesearch}&o=json&vqd={vqd}'
@@ -26,6 +26,8 @@ base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'\
 # engine dependent config
 number_of_results = 10
 pubmed_url = 'https://www.ncbi.nlm.nih.gov/pubmed/'
+# response() sends a blocking HTTP request
+use_asyncio = False
 
 
 def request(query, params):
@@ -27,6 +27,9 @@ from searx.engines.wikipedia import _fetch_supported_languages, supported_langua
 
 logger = logger.getChild('wikidata')
 
+# the results rarely change: cache them during one hour
+cache_ttl = 3600
+
 # SPARQL
 SPARQL_ENDPOINT_URL = 'https://query.wikidata.org/sparql'
 SPARQL_EXPLAIN_URL = 'https://query.wikidata.org/bigdata/namespace/wdq/sparql?explain'
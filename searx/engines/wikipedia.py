@@ -20,6 +20,9 @@ from searx.raise_for_httperror import raise_for_httperror
 search_url = 'https://{language}.wikipedia.org/api/rest_v1/page/summary/{title}'
 supported_languages_url = 'https://meta.wikimedia.org/wiki/List_of_Wikipedias'
 
+# the summaries rarely change: cache the results during one hour
+cache_ttl = 3600
+
 
 # set language in base_url
 def url_lang(lang):
@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Counters shared by all the processes.
+
+The counters are stored in :py:data:`searx.shared.storage`: with uwsgi, the
+``/stats`` and ``/stats/errors`` pages and the preferences page show the
+numbers of the whole instance, not only the numbers of the worker which
+answers.  An increment is one atomic operation of the uwsgi cache, there is no
+lock in searx.
+
+The counters are integers: the durations are stored in microseconds, the
+scores in thousandths.
+"""
+
+from searx import shared
+
+
+ENGINE_STATS_SCALES = {
+    'engine_time': 1000000,
+    'page_load_time': 1000000,
+    'parse_time': 1000000,
+    'score_count': 1000,
+}
+
+
+class SharedCounters:
+    """Counters with a common prefix, ``counters[name]`` returns the value of a counter."""
+
+    __slots__ = 'prefix', 'scales'
+
+    def __init__(self, prefix, scales=None):
+        self.prefix = prefix
+        self.scales = scales or {}
+
+    def inc(self, name, value=1):
+        shared.storage.inc(self.prefix + name, int(round(value * self.scales.get(name, 1))))
+
+    def __getitem__(self, name):
+        value = shared.storage.get_counter(self.prefix + name)
+        scale = self.scales.get(name)
+        if scale:
+            return value / scale
+        return value
+
+
+def get_engine_stats(engine_name):
+    """Return the counters of the engine: sent_search_count, search_count, result_count, engine_time,
+    engine_time_count, page_load_time, page_load_count, parse_time, parse_count, score_count and errors."""
+    return SharedCounters('stats_' + engine_name + '_', ENGINE_STATS_SCALES)
@@ -1,66 +1,149 @@
+import sys
 import typing
-import inspect
 import logging
+import hashlib
+import linecache
+import pickle
+import threading
+from collections import OrderedDict
 from json import JSONDecodeError
 from urllib.parse import urlparse
 from requests.exceptions import RequestException
 from searx.exceptions import (SearxXPathSyntaxException, SearxEngineXPathException, SearxEngineAPIException,
                               SearxEngineAccessDeniedException)
 from searx import logger
+from searx import shared
 
 
 logging.basicConfig(level=logging.INFO)
 
-errors_per_engines = {}
+# The error contexts and their counts are stored in searx.shared.storage, so /stats/errors shows the errors
+# of all the processes:
+# * "error_contexts_<engine name>": the pickled {key: ErrorContext} of the engine, written once per new context.
+#   Only the last MAX_ERROR_CONTEXTS contexts of each engine are kept.
+# * "errors_<engine name>_<key>": the counter of one error context.
+# key is ErrorContext.get_key()
+#
+# The recording of an error only reads the code objects and the line numbers of the stack, the source code is
+# read when /stats/errors is displayed.
+
+MAX_ERROR_CONTEXTS = 100
+# size of _error_keys
+MAX_ERROR_KEYS = 1000
+
+# LRU cache {(engine_name, filename, function, line_no, exception_classname, log_message, log_parameters): key}
+# of the error contexts already in the shared storage
+_error_keys = OrderedDict()
+_error_keys_lock = threading.Lock()
 
 
 class ErrorContext:
 
-    __slots__ = 'filename', 'function', 'line_no', 'code', 'exception_classname', 'log_message', 'log_parameters'
+    __slots__ = 'filename', 'function', 'line_no', 'exception_classname', 'log_message', 'log_parameters'
 
-    def __init__(self, filename, function, line_no, code, exception_classname, log_message, log_parameters):
+    def __init__(self, filename, function, line_no, exception_classname, log_message, log_parameters):
         self.filename = filename
         self.function = function
         self.line_no = line_no
-        self.code = code
         self.exception_classname = exception_classname
         self.log_message = log_message
         self.log_parameters = log_parameters
 
+    @property
+    def code(self) -> str:
+        """The source code of the line, read when it is displayed"""
+        return linecache.getline(self.filename, self.line_no).strip()
+
     def __eq__(self, o) -> bool:
         if not isinstance(o, ErrorContext):
             return False
         return self.filename == o.filename and self.function == o.function and self.line_no == o.line_no\
-            and self.code == o.code and self.exception_classname == o.exception_classname\
+            and self.exception_classname == o.exception_classname\
             and self.log_message == o.log_message and self.log_parameters == o.log_parameters
 
     def __hash__(self):
-        return hash((self.filename, self.function, self.line_no, self.code, self.exception_classname, self.log_message,
+        return hash((self.filename, self.function, self.line_no, self.exception_classname, self.log_message,
                      self.log_parameters))
 
+    def get_key(self) -> str:
+        """Return a key which is the same in all the processes (unlike hash())"""
+        value = repr((self.filename, self.function, self.line_no, self.exception_classname,
+                      self.log_message, self.log_parameters))
+        return hashlib.sha1(value.encode()).hexdigest()
+
     def __repr__(self):
-        return "ErrorContext({!r}, {!r}, {!r}, {!r}, {!r}, {!r})".\
-            format(self.filename, self.line_no, self.code, self.exception_classname, self.log_message,
+        return "ErrorContext({!r}, {!r}, {!r}, {!r}, {!r})".\
+            format(self.filename, self.line_no, self.exception_classname, self.log_message,
                    self.log_parameters)
 
 
-def add_error_context(engine_name: str, error_context: ErrorContext) -> None:
-    errors_for_engine = errors_per_engines.setdefault(engine_name, {})
-    errors_for_engine[error_context] = errors_for_engine.get(error_context, 0) + 1
+def _get_error_contexts(engine_name: str) -> typing.Dict[str, ErrorContext]:
+    value = shared.storage.get_bytes('error_contexts_' + engine_name)
+    if value is None:
+        return {}
+    return pickle.loads(value)
+
+
+def _register_error_context(engine_name: str, error_context: ErrorContext) -> str:
+    key = error_context.get_key()
+    with shared.storage.lock():
+        error_contexts = _get_error_contexts(engine_name)
+        if key not in error_contexts:
+            error_contexts[key] = error_context
+            # ring buffer: forget the oldest error contexts
+            while len(error_contexts) > MAX_ERROR_CONTEXTS:
+                old_key = next(iter(error_contexts))
+                del error_contexts[old_key]
+                shared.storage.delete('errors_' + engine_name + '_' + old_key)
+            shared.storage.set_bytes('error_contexts_' + engine_name,
+                                     pickle.dumps(error_contexts, pickle.HIGHEST_PROTOCOL))
     logger.debug('%s: %s', engine_name, str(error_context))
-
-
-def get_trace(traces):
-    previous_trace = traces[-1]
-    for trace in reversed(traces):
-        if trace.filename.endswith('searx/search.py'):
-            if previous_trace.filename.endswith('searx/poolrequests.py'):
-                return trace
-            if previous_trace.filename.endswith('requests/models.py'):
-                return trace
-            return previous_trace
-        previous_trace = trace
-    return traces[-1]
+    return key
+
+
+def add_error_context(engine_name: str, filename: str, function: str, line_no: int,
+                      exception_classname: typing.Optional[str], log_message: typing.Optional[str],
+                      log_parameters: typing.Tuple) -> None:
+    error_id = (engine_name, filename, function, line_no, exception_classname, log_message, log_parameters)
+    with _error_keys_lock:
+        key = _error_keys.get(error_id)
+        if key is not None:
+            _error_keys.move_to_end(error_id)
+    if key is None:
+        error_context = ErrorContext(filename, function, line_no, exception_classname, log_message, log_parameters)
+        key = _register_error_context(engine_name, error_context)
+        with _error_keys_lock:
+            _error_keys[error_id] = key
+            while len(_error_keys) > MAX_ERROR_KEYS:
+                _error_keys.popitem(last=False)
+    shared.storage.inc('errors_' + engine_name + '_' + key)
+
+
+def get_errors_per_engines(engine_names: typing.Iterable[str]) -> typing.Dict[str, typing.Dict[ErrorContext, int]]:
+    """Return {engine_name: {ErrorContext: count}} for the engines with at least one error"""
+    result = {}
+    for engine_name in engine_names:
+        error_contexts = _get_error_contexts(engine_name)
+        if error_contexts:
+            result[engine_name] = {
+                error_context: shared.storage.get_counter('errors_' + engine_name + '_' + key)
+                for key, error_context in error_contexts.items()
+            }
+    return result
+
+
+def get_trace(frames):
+    """frames is a list of (code object, line number), the innermost frame is the last one"""
+    previous_frame = frames[-1]
+    for frame in reversed(frames):
+        if frame[0].co_filename.endswith('searx/search.py'):
+            if previous_frame[0].co_filename.endswith('searx/poolrequests.py'):
+                return frame
+            if previous_frame[0].co_filename.endswith('requests/models.py'):
+                return frame
+            return previous_frame
+        previous_frame = frame
+    return frames[-1]
 
 
 def get_hostname(exc: RequestException) -> typing.Optional[None]:
@@ -117,31 +200,42 @@ def get_exception_classname(exc: Exception) -> str:
     return exc_module + '.' + exc_name
 
 
-def get_error_context(framerecords, exception_classname, log_message, log_parameters) -> ErrorContext:
-    searx_frame = get_trace(framerecords)
-    filename = searx_frame.filename
-    function = searx_frame.function
-    line_no = searx_frame.lineno
-    code = searx_frame.code_context[0].strip()
-    del framerecords
-    return ErrorContext(filename, function, line_no, code, exception_classname, log_message, log_parameters)
+def get_traceback_frames(exc: Exception) -> typing.List[typing.Tuple[typing.Any, int]]:
+    """Return the (code object, line number) of the traceback of exc, the innermost frame is the last one"""
+    frames = []
+    tb = exc.__traceback__
+    while tb is not None:
+        frames.append((tb.tb_frame.f_code, tb.tb_lineno))
+        tb = tb.tb_next
+    return frames
+
+
+def get_stack_frames(frame) -> typing.List[typing.Tuple[typing.Any, int]]:
+    """Return the (code object, line number) of frame and its callers, the innermost frame is the last one"""
+    frames = []
+    while frame is not None:
+        frames.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def add_frame_error(engine_name: str, frames, exception_classname, log_message, log_parameters) -> None:
+    code, line_no = get_trace(frames)
+    add_error_context(engine_name, code.co_filename, code.co_name, line_no, exception_classname, log_message,
+                      log_parameters)
 
 
 def record_exception(engine_name: str, exc: Exception) -> None:
-    framerecords = inspect.trace()
-    try:
-        exception_classname = get_exception_classname(exc)
-        log_parameters = get_messages(exc, framerecords[-1][1])
-        error_context = get_error_context(framerecords, exception_classname, None, log_parameters)
-        add_error_context(engine_name, error_context)
-    finally:
-        del framerecords
+    frames = get_traceback_frames(exc)
+    if not frames:
+        # not raised
+        frames = get_stack_frames(sys._getframe(1))  # pylint: disable=protected-access
+    exception_classname = get_exception_classname(exc)
+    log_parameters = get_messages(exc, frames[-1][0].co_filename)
+    add_frame_error(engine_name, frames, exception_classname, None, log_parameters)
 
 
 def record_error(engine_name: str, log_message: str, log_parameters: typing.Optional[typing.Tuple] = None) -> None:
-    framerecords = list(reversed(inspect.stack()[1:]))
-    try:
-        error_context = get_error_context(framerecords, None, log_message, log_parameters or ())
-        add_error_context(engine_name, error_context)
-    finally:
-        del framerecords
+    frames = get_stack_frames(sys._getframe(1))  # pylint: disable=protected-access
+    add_frame_error(engine_name, frames, None, log_message, log_parameters or ())
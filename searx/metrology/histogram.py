@@ -0,0 +1,196 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Histograms of the response times of the engines.
+
+Three durations are recorded for each engine (see :py:data:`METRICS`):
+
+* ``total``: from the start of the search to the results of the engine.
+* ``http``: the HTTP requests.
+* ``parse``: the ``response`` function of the engine.
+
+The buckets are fixed (HDR-style): :py:data:`SUB_BUCKETS` buckets for each
+power of two, from :py:data:`MIN_VALUE` to about one minute; a percentile is
+known with a relative precision of 19 %.
+
+The histograms are kept for each window of :py:data:`WINDOW_DURATION` seconds,
+only the last :py:data:`WINDOW_COUNT` windows are read: the old response
+times are forgotten.  Each process adds the durations to its own histograms,
+then at most every :py:data:`FLUSH_INTERVAL` seconds, merges them into the
+histograms of :py:data:`searx.shared.storage`, shared by all the processes.
+All the windows of one engine and one metric are stored under one key: the
+uwsgi cache ``searxcache`` is not LRU, it must not be filled by the windows.
+"""
+
+import math
+import threading
+from array import array
+from time import time
+
+from searx import shared
+
+
+MIN_VALUE = 0.001  # seconds
+SUB_BUCKETS = 4
+BUCKET_COUNT = 66
+# upper bound of each bucket, the last bucket has no upper bound
+BUCKET_BOUNDS = tuple(MIN_VALUE * 2 ** (i / SUB_BUCKETS) for i in range(BUCKET_COUNT - 1))
+
+WINDOW_DURATION = 300  # seconds
+WINDOW_COUNT = 12
+FLUSH_INTERVAL = 10  # seconds
+
+METRICS = ('total', 'http', 'parse')
+
+# {(engine_name, metric, window): Histogram} not flushed yet
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush_time = 0
+
+
+class Histogram:
+
+    __slots__ = 'counts', 'sum'
+
+    def __init__(self, counts=None, sum_=0.0):
+        self.counts = counts or [0] * BUCKET_COUNT
+        self.sum = sum_
+
+    @staticmethod
+    def get_bucket(value):
+        if value <= MIN_VALUE:
+            return 0
+        return min(BUCKET_COUNT - 1, math.ceil(SUB_BUCKETS * math.log2(value / MIN_VALUE)))
+
+    def add(self, value):
+        self.counts[Histogram.get_bucket(value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def average(self):
+        count = self.count
+        return self.sum / count if count else None
+
+    def percentile(self, p):
+        """Return the p th percentile, or None if the histogram is empty.
+
+        The value is interpolated inside the bucket."""
+        count = self.count
+        if not count:
+            return None
+        rank = count * p / 100
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0
+                if i >= len(BUCKET_BOUNDS):
+                    return lower
+                return lower + (BUCKET_BOUNDS[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return BUCKET_BOUNDS[-1]
+
+    def to_bytes(self):
+        return array('d', [self.sum] + self.counts).tobytes()
+
+    @staticmethod
+    def from_bytes(value):
+        values = array('d')
+        values.frombytes(value)
+        return Histogram([int(count) for count in values[1:]], values[0])
+
+
+def _get_key(engine_name, metric):
+    return 'histogram_{0}_{1}'.format(engine_name, metric)
+
+
+def _windows_to_bytes(windows):
+    """Serialize {window: Histogram}"""
+    values = array('d')
+    for window, histogram in sorted(windows.items()):
+        values.append(window)
+        values.extend([histogram.sum] + histogram.counts)
+    return values.tobytes()
+
+
+def _windows_from_bytes(value):
+    """Deserialize the value of _windows_to_bytes(...)"""
+    values = array('d')
+    values.frombytes(value)
+    windows = {}
+    size = BUCKET_COUNT + 2
+    for i in range(0, len(values) - size + 1, size):
+        windows[int(values[i])] = Histogram([int(count) for count in values[i + 2:i + size]], values[i + 1])
+    return windows
+
+
+def flush():
+    """Merge the histograms of this process into the shared histograms"""
+    global _pending, _last_flush_time
+    with _pending_lock:
+        pending = _pending
+        _pending = {}
+        _last_flush_time = time()
+    if not pending:
+        return
+    # {(engine_name, metric): {window: Histogram}}
+    pending_windows = {}
+    for (engine_name, metric, window), histogram in pending.items():
+        pending_windows.setdefault((engine_name, metric), {})[window] = histogram
+    first_window = int(time() // WINDOW_DURATION) - WINDOW_COUNT + 1
+    expire = WINDOW_DURATION * (WINDOW_COUNT + 1)
+    with shared.storage.lock():
+        for (engine_name, metric), windows in pending_windows.items():
+            key = _get_key(engine_name, metric)
+            value = shared.storage.get_bytes(key)
+            if value is not None:
+                for window, histogram in _windows_from_bytes(value).items():
+                    if window in windows:
+                        windows[window].merge(histogram)
+                    else:
+                        windows[window] = histogram
+            # the old windows are removed
+            windows = {window: histogram for window, histogram in windows.items() if window >= first_window}
+            shared.storage.set_bytes(key, _windows_to_bytes(windows), expire)
+
+
+def record(engine_name, metric, duration):
+    now = time()
+    key = (engine_name, metric, int(now // WINDOW_DURATION))
+    with _pending_lock:
+        histogram = _pending.get(key)
+        if histogram is None:
+            histogram = _pending[key] = Histogram()
+        histogram.add(duration)
+    if now - _last_flush_time > FLUSH_INTERVAL:
+        flush()
+
+
+def get_histogram(engine_name, metric):
+    """Return the Histogram of the last WINDOW_COUNT windows"""
+    flush()
+    result = Histogram()
+    value = shared.storage.get_bytes(_get_key(engine_name, metric))
+    if value is not None:
+        first_window = int(time() // WINDOW_DURATION) - WINDOW_COUNT + 1
+        for window, histogram in _windows_from_bytes(value).items():
+            if window >= first_window:
+                result.merge(histogram)
+    return result
+
+
+def get_percentiles(engine_name, metric, percentiles=(50, 90, 99)):
+    """Return {'count': ..., 'p50': ..., 'p90': ..., 'p99': ...}"""
+    histogram = get_histogram(engine_name, metric)
+    result = {'count': histogram.count}
+    for p in percentiles:
+        result['p' + str(p)] = histogram.percentile(p)
+    return result
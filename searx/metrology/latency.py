@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Response times of the engines, and the timeouts derived from them.
+
+Each process keeps the last :py:data:`WINDOW_SIZE` response times of each engine.
+When ``outgoing.adaptive_timeout`` is enabled, the timeout of an engine is the
+:py:data:`PERCENTILE` th percentile of its response times plus :py:data:`MARGIN`,
+never above the timeout of the engine in the settings.
+"""
+
+import threading
+from collections import deque
+
+from searx import settings
+
+
+WINDOW_SIZE = 200
+PERCENTILE = 95
+MARGIN = 0.5  # seconds
+# below this count of response times, the timeout from the settings is used
+MIN_COUNT = 20
+
+adaptive_timeout = settings['outgoing'].get('adaptive_timeout', False)
+latencies_per_engines = {}
+_lock = threading.Lock()
+
+
+class RollingLatency:
+    """The last response times of one engine"""
+
+    __slots__ = 'durations', 'lock', '_sorted'
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.durations = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self._sorted = None
+
+    def add(self, duration):
+        with self.lock:
+            self.durations.append(duration)
+            self._sorted = None
+
+    def count(self):
+        return len(self.durations)
+
+    def percentile(self, p):
+        """Return the p th percentile (nearest rank), or None if there is no value"""
+        with self.lock:
+            if not self.durations:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self.durations)
+            sorted_durations = self._sorted
+        index = max(0, min(len(sorted_durations) - 1, -(-len(sorted_durations) * p // 100) - 1))
+        return sorted_durations[int(index)]
+
+
+def get_latency(engine_name):
+    latency = latencies_per_engines.get(engine_name)
+    if latency is None:
+        with _lock:
+            latency = latencies_per_engines.setdefault(engine_name, RollingLatency())
+    return latency
+
+
+def record_latency(engine_name, duration):
+    get_latency(engine_name).add(duration)
+
+
+def get_percentile(engine_name, p):
+    """Return the p th percentile of the response times of the engine, or None if they are not known yet"""
+    latency = latencies_per_engines.get(engine_name)
+    if latency is None or latency.count() < MIN_COUNT:
+        return None
+    return latency.percentile(p)
+
+
+def get_timeout(engine_name, configured_timeout):
+    """Return the timeout of the engine: configured_timeout or less when adaptive_timeout is enabled"""
+    if not adaptive_timeout:
+        return configured_timeout
+    percentile = get_percentile(engine_name, PERCENTILE)
+    if percentile is None:
+        return configured_timeout
+    return min(configured_timeout, percentile + MARGIN)
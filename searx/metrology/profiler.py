@@ -0,0 +1,104 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Profile some requests in production, see the ``profiler:`` section of the settings.
+
+One request in ``sample_rate`` (or the requests with the HTTP header
+``X-Searx-Profile: <secret>``) of the profiled endpoints is run with
+:py:mod:`cProfile`.  The profiles of each endpoint are aggregated in memory,
+then every ``dump_every`` profiles, written to ``directory`` as a
+:py:mod:`pstats` file ``<endpoint>-<pid>-<timestamp>.prof``; only the newest
+``max_files`` files are kept.
+
+Only the thread of the request is profiled: the engines run in other threads.
+:origin:`utils/profile_stats.py` merges the files and prints the top functions.
+"""
+
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import threading
+from time import time
+
+from searx import logger, settings
+
+
+logger = logger.getChild('profiler')
+
+HEADER = 'X-Searx-Profile'
+FILE_SUFFIX = '.prof'
+
+profiler_settings = settings.get('profiler') or {}
+# environment variables override the settings (no new deployment)
+sample_rate = int(os.environ.get('SEARX_PROFILER_SAMPLE_RATE', profiler_settings.get('sample_rate', 0)))
+secret = os.environ.get('SEARX_PROFILER_SECRET', profiler_settings.get('secret', ''))
+directory = os.environ.get('SEARX_PROFILER_DIRECTORY', profiler_settings.get('directory', '/tmp/searx_profiles'))
+endpoints = frozenset(profiler_settings.get('endpoints', ('search', 'autocompleter', 'image_proxy')))
+dump_every = profiler_settings.get('dump_every', 20)
+max_files = profiler_settings.get('max_files', 100)
+
+# {endpoint: [pstats.Stats, count of profiles]}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(sample_rate or secret)
+
+
+def should_profile(endpoint, headers):
+    if endpoint not in endpoints:
+        return False
+    # compare_digest accepts only ASCII str: compare the bytes
+    if secret and hmac.compare_digest(headers.get(HEADER, '').encode('utf-8', 'replace'), secret.encode('utf-8')):
+        return True
+    return sample_rate > 0 and random.randrange(sample_rate) == 0
+
+
+def start():
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def stop(profile, endpoint):
+    """Stop profile, add it to the stats of endpoint, write the stats every dump_every profiles"""
+    profile.disable()
+    with _stats_lock:
+        endpoint_stats = _stats.get(endpoint)
+        if endpoint_stats is None:
+            endpoint_stats = _stats[endpoint] = [pstats.Stats(profile), 0]
+        else:
+            endpoint_stats[0].add(profile)
+        endpoint_stats[1] += 1
+        if endpoint_stats[1] < dump_every:
+            return
+        del _stats[endpoint]
+    dump(endpoint, endpoint_stats[0])
+
+
+def dump(endpoint, stats):
+    try:
+        os.makedirs(directory, exist_ok=True)
+        filename = '{0}-{1}-{2}{3}'.format(endpoint, os.getpid(), int(time() * 1000000), FILE_SUFFIX)
+        stats.dump_stats(os.path.join(directory, filename))
+        rotate()
+    except OSError as e:
+        logger.error('can\'t write the profile of %s: %s', endpoint, e)
+
+
+def rotate():
+    """Remove the oldest files, keep max_files files"""
+    filenames = [os.path.join(directory, filename) for filename in os.listdir(directory)
+                 if filename.endswith(FILE_SUFFIX)]
+    if len(filenames) <= max_files:
+        return
+    filenames.sort(key=os.path.getmtime)
+    for filename in filenames[:len(filenames) - max_files]:
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            # removed by another process
+            pass
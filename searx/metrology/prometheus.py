@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Metrics in the Prometheus text format, see the ``/metrics`` URL.
+
+The engine statistics, the latency percentiles, the suspension of the engines,
+the cache statistics and the requests to searx are instance wide (see
+:py:mod:`searx.metrology.counters`).  The HTTP connection pools and the
+thread pool belong to the process which answers.
+
+The percentiles are computed over the last windows of
+:py:mod:`searx.metrology.histogram`: the latencies are exported as summaries,
+not as Prometheus histograms whose buckets must only increase.
+"""
+
+from searx import poolrequests
+from searx.metrology import histogram
+from searx.metrology.counters import SharedCounters
+from searx.search import cache, get_executor_stats
+from searx.search.circuit_breaker import CircuitBreaker, CLOSED
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+QUANTILES = (50, 90, 99)
+
+# name in the histograms of the requests to the webapp
+WEBAPP_NAME = '__webapp__'
+# endpoints with a latency summary
+TIMED_ENDPOINTS = ('search', )
+
+# (metric name, counter name, help)
+ENGINE_COUNTERS = (
+    ('searx_engine_requests_total', 'sent_search_count', 'Queries sent to the engine'),
+    ('searx_engine_responses_total', 'search_count', 'Successful responses of the engine'),
+    ('searx_engine_results_total', 'result_count', 'Results returned by the engine'),
+    ('searx_engine_errors_total', 'errors', 'Errors of the engine'),
+)
+
+# (metric label, sum counter, count counter)
+ENGINE_DURATIONS = (
+    ('total', 'engine_time', 'engine_time_count'),
+    ('http', 'page_load_time', 'page_load_count'),
+    ('parse', 'parse_time', 'parse_count'),
+)
+
+# requests to the webapp by endpoint, see record_request
+request_counters = SharedCounters('requests_', {'search_time': 1000000})
+
+
+def record_request(endpoint, duration):
+    request_counters.inc(endpoint)
+    if endpoint in TIMED_ENDPOINTS:
+        request_counters.inc(endpoint + '_time', duration)
+        histogram.record(WEBAPP_NAME, endpoint, duration)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(name, _escape(value)) for name, value in labels.items()) + '}'
+
+
+class MetricWriter:
+
+    __slots__ = 'lines',
+
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name, metric_type, help_text):
+        self.lines.append('# HELP {0} {1}'.format(name, help_text))
+        self.lines.append('# TYPE {0} {1}'.format(name, metric_type))
+
+    def sample(self, name, value, **labels):
+        if value is None:
+            return
+        self.lines.append('{0}{1} {2}'.format(name, _labels(labels), repr(float(value))))
+
+    def summary(self, name, histogram_name, metric, sum_value, count_value, **labels):
+        h = histogram.get_histogram(histogram_name, metric)
+        for p in QUANTILES:
+            self.sample(name, h.percentile(p), quantile=str(p / 100), **labels)
+        self.sample(name + '_sum', sum_value, **labels)
+        self.sample(name + '_count', count_value, **labels)
+
+    def get_text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+def write_engine_metrics(writer, engines):
+    # the engines which have never been used are skipped
+    engine_list = [(engine_name, engine) for engine_name, engine in sorted(engines.items())
+                   if engine.stats['sent_search_count']]
+
+    for metric_name, counter_name, help_text in ENGINE_COUNTERS:
+        writer.header(metric_name, 'counter', help_text)
+        for engine_name, engine in engine_list:
+            writer.sample(metric_name, engine.stats[counter_name], engine=engine_name)
+
+    writer.header('searx_engine_duration_seconds', 'summary',
+                  'Response time of the engine: total, HTTP requests, parsing of the response')
+    for engine_name, engine in engine_list:
+        for metric, sum_name, count_name in ENGINE_DURATIONS:
+            writer.summary('searx_engine_duration_seconds', engine_name, metric,
+                           engine.stats[sum_name], engine.stats[count_name], engine=engine_name, phase=metric)
+
+    writer.header('searx_engine_suspended', 'gauge', '1 if the engine is suspended after an error')
+    writer.header('searx_engine_continuous_errors', 'gauge', 'Errors since the last successful response')
+    for engine_name, engine in sorted(engines.items()):
+        circuit_breaker = CircuitBreaker(engine_name, engine.timeout)
+        writer.sample('searx_engine_suspended', int(circuit_breaker.get_state() != CLOSED), engine=engine_name)
+        writer.sample('searx_engine_continuous_errors', circuit_breaker.continuous_errors, engine=engine_name)
+
+
+def write_cache_metrics(writer):
+    writer.header('searx_cache_requests_total', 'counter', 'Lookups in the result cache and the engine cache')
+    for cache_name in ('results', 'engine'):
+        for result in ('hit', 'miss'):
+            writer.sample('searx_cache_requests_total', cache.counters[cache_name + '_' + result],
+                          cache=cache_name, result=result)
+
+
+def write_request_metrics(writer, endpoints):
+    writer.header('searx_http_requests_total', 'counter', 'Requests to searx')
+    for endpoint in endpoints:
+        count = request_counters[endpoint]
+        if count:
+            writer.sample('searx_http_requests_total', count, endpoint=endpoint)
+
+    writer.header('searx_http_request_duration_seconds', 'summary', 'Response time of searx')
+    for endpoint in TIMED_ENDPOINTS:
+        writer.summary('searx_http_request_duration_seconds', WEBAPP_NAME, endpoint,
+                       request_counters[endpoint + '_time'], request_counters[endpoint], endpoint=endpoint)
+
+
+def write_process_metrics(writer):
+    pool_stats = poolrequests.get_pool_stats()
+    writer.header('searx_http_pool_connections', 'gauge',
+                  'Connections to the engines of the process which answers: idle or active')
+    for host, stats in sorted(pool_stats.items()):
+        for state in ('idle', 'active'):
+            writer.sample('searx_http_pool_connections', stats[state], host=host, state=state)
+    writer.header('searx_http_pool_requests_total', 'counter',
+                  'Requests sent to the engines by the process which answers')
+    for host, stats in sorted(pool_stats.items()):
+        writer.sample('searx_http_pool_requests_total', stats['requests'], host=host)
+
+    executor_stats = get_executor_stats()
+    if executor_stats:
+        writer.header('searx_executor_threads', 'gauge', 'Threads sending the requests to the engines')
+        for name in ('max_workers', 'workers', 'active', 'queue'):
+            writer.sample('searx_executor_threads', executor_stats[name], state=name)
+
+
+def get_metrics(engines, endpoints):
+    """Return the metrics as text, engines is :py:data:`searx.engines.engines`, endpoints the Flask endpoints"""
+    writer = MetricWriter()
+    write_engine_metrics(writer, engines)
+    write_cache_metrics(writer)
+    write_request_metrics(writer, endpoints)
+    write_process_metrics(writer)
+    return writer.get_text()
@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Duration of the stages of a request to searx.
+
+:py:func:`start_trace` is called at the beginning of each request, then each
+stage is measured with :py:func:`span` (or :py:func:`add_span` for a duration
+measured elsewhere).  The durations of the spans with the same name are
+summed.  The webapp adds the spans to the ``Server-Timing`` header, and with
+``server.trace_log`` logs one JSON line per request.
+
+The trace is stored in a context variable: outside a request (for example in
+the threads of the engines), :py:func:`span` doesn't record anything.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+
+_trace = ContextVar('searx_trace', default=None)
+
+
+class Trace:
+    """Spans of one request: {name: [duration, count]} in the order of creation"""
+
+    __slots__ = 'spans', '_lock'
+
+    def __init__(self):
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration, count=1):
+        with self._lock:
+            span_values = self.spans.get(name)
+            if span_values is None:
+                self.spans[name] = [duration, count]
+            else:
+                span_values[0] += duration
+                span_values[1] += count
+
+    def get_server_timing(self):
+        """Return the spans in the format of the Server-Timing header"""
+        return [name + ';dur=' + str(round(duration * 1000, 3)) for name, (duration, _) in self.spans.items()]
+
+    def to_dict(self):
+        """Return {name: {'duration': seconds, 'count': count}}"""
+        return {name: {'duration': round(duration, 6), 'count': count}
+                for name, (duration, count) in self.spans.items()}
+
+
+def start_trace():
+    trace = Trace()
+    _trace.set(trace)
+    return trace
+
+
+def get_trace():
+    """Return the Trace of the current request, or None"""
+    return _trace.get()
+
+
+def add_span(name, duration, count=1):
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, duration, count)
+
+
+@contextmanager
+def span(name):
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, perf_counter() - start_time)
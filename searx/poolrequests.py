@@ -1,7 +1,10 @@
 import sys
+import http.cookiejar
+from contextlib import contextmanager
 from time import time
 from itertools import cycle
 from threading import RLock, local
+from contextvars import ContextVar
 
 import requests
 
@@ -12,6 +15,11 @@ from searx.raise_for_httperror import raise_for_httperror
 
 logger = logger.getChild('poolrequests')
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
 
 try:
     import ssl
@@ -67,31 +75,45 @@ class HTTPAdapterWithConnParams(requests.adapters.HTTPAdapter):
                               block=self._pool_block, **self._conn_params)
 
 
-threadLocal = local()
+# timeout and HTTP total time of the current thread or asyncio task
+_timeout = ContextVar('timeout', default=None)
+_start_time = ContextVar('start_time', default=None)
+_total_time = ContextVar('total_time', default=None)
+
 connect = settings['outgoing'].get('pool_connections', 100)  # Magic number kept from previous code
 maxsize = settings['outgoing'].get('pool_maxsize', requests.adapters.DEFAULT_POOLSIZE)  # Picked from constructor
 if settings['outgoing'].get('source_ips'):
-    http_adapters = cycle(HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize,
+    http_adapter_list = [HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize,
+                                                   source_address=(source_ip, 0))
+                         for source_ip in settings['outgoing']['source_ips']]
+    https_adapter_list = [HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize,
                                                     source_address=(source_ip, 0))
-                          for source_ip in settings['outgoing']['source_ips'])
-    https_adapters = cycle(HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize,
-                                                     source_address=(source_ip, 0))
-                           for source_ip in settings['outgoing']['source_ips'])
+                          for source_ip in settings['outgoing']['source_ips']]
 else:
-    http_adapters = cycle((HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize), ))
-    https_adapters = cycle((HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize), ))
+    http_adapter_list = [HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize)]
+    https_adapter_list = [HTTPAdapterWithConnParams(pool_connections=connect, pool_maxsize=maxsize)]
+http_adapters = cycle(http_adapter_list)
+https_adapters = cycle(https_adapter_list)
 
 
 class SessionSinglePool(requests.Session):
 
-    def __init__(self):
+    def __init__(self, source_ip_index=None):
         super().__init__()
 
         # reuse the same adapters
+        self.mount_adapters(source_ip_index)
+
+    def mount_adapters(self, source_ip_index=None):
+        """Mount the next global adapters, or the adapters of source_ips[source_ip_index]"""
         with RLock():
             self.adapters.clear()
-            self.mount('https://', next(https_adapters))
-            self.mount('http://', next(http_adapters))
+            if source_ip_index is None:
+                self.mount('https://', next(https_adapters))
+                self.mount('http://', next(http_adapters))
+            else:
+                self.mount('https://', https_adapter_list[source_ip_index])
+                self.mount('http://', http_adapter_list[source_ip_index])
 
     def close(self):
         """Call super, but clear adapters since there are managed globaly"""
@@ -99,17 +121,107 @@ class SessionSinglePool(requests.Session):
         super().close()
 
 
+# one long-lived session per thread
+_thread_local = local()
+
+
+def get_session(source_ip_index=None):
+    """Return the session of the current thread.
+
+    Before each request, the cookies are cleared and the adapters are mounted
+    again: the requests share nothing except the connection pools.
+    """
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = SessionSinglePool(source_ip_index)
+        _thread_local.session = session
+    else:
+        session.mount_adapters(source_ip_index)
+    session.cookies.clear()
+    return session
+
+
+def _get_urllib3_pool_stats(pool):
+    # pool.pool contains the idle connections and None for each connection which is not opened
+    queue = pool.pool
+    if queue is None:
+        return None
+    with queue.mutex:
+        idle = sum(1 for connection in queue.queue if connection is not None)
+        available = len(queue.queue)
+    return {
+        'idle': idle,
+        'active': pool.pool.maxsize - available,
+        'maxsize': pool.pool.maxsize,
+        'connections': pool.num_connections,
+        'requests': pool.num_requests,
+    }
+
+
+def get_pool_stats():
+    """Return the occupancy of the HTTP/1.1 connection pools of the current process, by host.
+
+    * ``idle``: number of opened connections waiting for a request.
+    * ``active``: number of connections sending a request.
+    * ``connections`` and ``requests``: number of connections opened and requests sent since the start.
+    """
+    result = {}
+    for adapter in http_adapter_list + https_adapter_list:
+        pool_managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+        for pool_manager in pool_managers:
+            for key in pool_manager.pools.keys():
+                pool = pool_manager.pools.get(key)
+                stats = _get_urllib3_pool_stats(pool) if pool is not None else None
+                if stats is None:
+                    continue
+                host = '{0}://{1}'.format(key.key_scheme, key.key_host)
+                if key.key_port:
+                    host += ':{0}'.format(key.key_port)
+                if host in result:
+                    for name, value in stats.items():
+                        result[host][name] += value
+                else:
+                    result[host] = stats
+    return result
+
+
 def set_timeout_for_thread(timeout, start_time=None):
-    threadLocal.timeout = timeout
-    threadLocal.start_time = start_time
+    _timeout.set(timeout)
+    _start_time.set(start_time)
+
+
+def get_remaining_time_for_thread():
+    """Return the time left before the timeout set by set_timeout_for_thread, or None"""
+    timeout = _timeout.get()
+    if timeout is None:
+        return None
+    start_time = _start_time.get()
+    if start_time is None:
+        return timeout
+    return timeout - (time() - start_time)
 
 
 def reset_time_for_thread():
-    threadLocal.total_time = 0
+    _total_time.set(0)
 
 
 def get_time_for_thread():
-    return threadLocal.total_time
+    return _total_time.get()
+
+
+def add_time_for_thread(request_time):
+    _add_total_time(request_time)
+
+
+class ProxyCycle(cycle):
+    """Same as itertools.cycle, the proxies are kept in the proxies attribute (see get_all_proxies)"""
+
+    def __new__(cls, proxies):
+        # get_proxy_cycles modifies the settings: they may already contain a ProxyCycle
+        proxies = proxies.proxies if isinstance(proxies, ProxyCycle) else tuple(proxies)
+        proxy_cycle = super().__new__(cls, proxies)
+        proxy_cycle.proxies = proxies
+        return proxy_cycle
 
 
 def get_proxy_cycles(proxy_settings):
@@ -121,7 +233,7 @@ def get_proxy_cycles(proxy_settings):
             proxy_settings[protocol] = [proxy]
 
     for protocol in proxy_settings:
-        proxy_settings[protocol] = cycle(proxy_settings[protocol])
+        proxy_settings[protocol] = ProxyCycle(proxy_settings[protocol])
     return proxy_settings
 
 
@@ -134,16 +246,35 @@ def get_proxies(proxy_cycles):
     return None
 
 
+def get_all_proxies(proxy_cycles):
+    """Return a list of proxies arguments where each proxy of each protocol appears at least once,
+    without advancing the cycles.  Return [None] without proxy."""
+    if not proxy_cycles:
+        return [None]
+    count = max(len(proxy_cycle.proxies) for proxy_cycle in proxy_cycles.values())
+    return [{protocol: proxy_cycle.proxies[i % len(proxy_cycle.proxies)]
+             for protocol, proxy_cycle in proxy_cycles.items()}
+            for i in range(count)]
+
+
 def get_global_proxies():
     return get_proxies(GLOBAL_PROXY_CYCLES)
 
 
-def request(method, url, **kwargs):
-    """same as requests/requests/api.py request(...)"""
+def request(method, url, http2=False, **kwargs):
+    """same as requests/requests/api.py request(...)
+
+    With http2=True and if httpx is installed, the request is sent with HTTP/2 (see request_http2).
+    With source_ip_index, the request is sent from source_ips[source_ip_index] instead of the next source IP.
+    """
+    source_ip_index = kwargs.pop('source_ip_index', None)
+    if http2 and http2_support:
+        return request_http2(method, url, source_ip_index=source_ip_index, **kwargs)
+
     time_before_request = time()
 
-    # session start
-    session = SessionSinglePool()
+    # session of the current thread
+    session = get_session(source_ip_index)
 
     # proxies
     if not kwargs.get('proxies'):
@@ -153,7 +284,7 @@ def request(method, url, **kwargs):
     if 'timeout' in kwargs:
         timeout = kwargs['timeout']
     else:
-        timeout = getattr(threadLocal, 'timeout', None)
+        timeout = _timeout.get()
         if timeout is not None:
             kwargs['timeout'] = timeout
 
@@ -169,19 +300,12 @@ def request(method, url, **kwargs):
     time_after_request = time()
 
     # is there a timeout for this engine ?
-    if timeout is not None:
-        timeout_overhead = 0.2  # seconds
-        # start_time = when the user request started
-        start_time = getattr(threadLocal, 'start_time', time_before_request)
-        search_duration = time_after_request - start_time
-        if search_duration > timeout + timeout_overhead:
-            raise requests.exceptions.Timeout(response=response)
+    _check_search_duration(timeout, time_before_request, time_after_request, response)
 
-    # session end
-    session.close()
+    # don't keep the cookies set by the response
+    session.cookies.clear()
 
-    if hasattr(threadLocal, 'total_time'):
-        threadLocal.total_time += time_after_request - time_before_request
+    _add_total_time(time_after_request - time_before_request)
 
     # raise an exception
     if check_for_httperror:
@@ -190,6 +314,22 @@ def request(method, url, **kwargs):
     return response
 
 
+def _check_search_duration(timeout, time_before_request, time_after_request, response):
+    if timeout is not None:
+        timeout_overhead = 0.2  # seconds
+        # start_time = when the user request started
+        start_time = _start_time.get() or time_before_request
+        search_duration = time_after_request - start_time
+        if search_duration > timeout + timeout_overhead:
+            raise requests.exceptions.Timeout(response=response)
+
+
+def _add_total_time(request_time):
+    total_time = _total_time.get()
+    if total_time is not None:
+        _total_time.set(total_time + request_time)
+
+
 def get(url, **kwargs):
     kwargs.setdefault('allow_redirects', True)
     return request('get', url, **kwargs)
@@ -219,3 +359,209 @@ def patch(url, data=None, **kwargs):
 
 def delete(url, **kwargs):
     return request('delete', url, **kwargs)
+
+
+# asyncio and HTTP/2: the requests are sent with httpx (optional dependency)
+
+_async_clients = {}
+_http2_clients = {}
+_http2_clients_lock = RLock()
+# the source IPs of the httpx clients, in the same order as the adapters (see outgoing.source_ips)
+source_ips = tuple(settings['outgoing'].get('source_ips') or (None, ))
+source_ips_cycle = cycle(source_ips)
+
+if httpx is not None:
+    try:
+        import h2  # pylint: disable=unused-import
+    except ImportError:
+        http2_support = False
+    else:
+        http2_support = True
+else:
+    http2_support = False
+
+if settings['outgoing'].get('enable_http2') and not http2_support:
+    logger.error('outgoing.enable_http2 requires the httpx[http2] package: HTTP/1.1 is used instead')
+
+
+def _get_client_key(verify, proxies, http2, source_ip_index=None):
+    if source_ip_index is None:
+        source_ip = next(source_ips_cycle)
+    else:
+        source_ip = source_ips[source_ip_index]
+    return verify, tuple(sorted((proxies or {}).items())), source_ip, http2
+
+
+def _new_client(client_class, transport_class, key):
+    verify, proxies, source_ip, http2 = key
+    limits = httpx.Limits(max_connections=connect * maxsize, max_keepalive_connections=connect * maxsize)
+
+    def get_transport(proxy=None):
+        return transport_class(verify=verify, http2=http2, limits=limits, local_address=source_ip, proxy=proxy)
+
+    mounts = {protocol + '://': get_transport(proxy) for protocol, proxy in proxies}
+    # don't store the cookies between requests: see _get_httpx_args
+    cookies = http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return client_class(transport=get_transport(), mounts=mounts, cookies=cookies, verify=verify)
+
+
+def get_async_client(verify=True, proxies=None, http2=False):
+    """Return the httpx.AsyncClient for these parameters.
+
+    The clients are created and used only from the thread running the event loop.
+    """
+    key = _get_client_key(verify, proxies, http2)
+    client = _async_clients.get(key)
+    if client is None:
+        client = _new_client(httpx.AsyncClient, httpx.AsyncHTTPTransport, key)
+        _async_clients[key] = client
+    return client
+
+
+def get_http2_client(verify=True, proxies=None, source_ip_index=None):
+    """Return the httpx.Client for these parameters, and the next source IP or source_ips[source_ip_index].
+
+    The client is shared by all the threads: the concurrent requests to one host
+    are multiplexed in one HTTP/2 connection.
+    """
+    key = _get_client_key(verify, proxies, True, source_ip_index)
+    client = _http2_clients.get(key)
+    if client is None:
+        with _http2_clients_lock:
+            client = _http2_clients.get(key)
+            if client is None:
+                client = _new_client(httpx.Client, httpx.HTTPTransport, key)
+                _http2_clients[key] = client
+    return client
+
+
+def _to_requests_response(response):
+    """Convert a httpx.Response to a requests.Response: the engines are unchanged"""
+    result = requests.models.Response()
+    result.status_code = response.status_code
+    result.reason = response.reason_phrase
+    result.url = str(response.url)
+    result.headers = requests.structures.CaseInsensitiveDict(response.headers)
+    result.encoding = requests.utils.get_encoding_from_headers(result.headers)
+    result.cookies = requests.cookies.cookiejar_from_dict(dict(response.cookies))
+    result.history = [_to_requests_response(r) for r in response.history]
+    try:
+        result._content = response.content
+    except httpx.ResponseNotRead:
+        # redirect
+        result._content = b''
+    # there is no raw response: Response.close() must not read it
+    result._content_consumed = True
+    try:
+        result.elapsed = response.elapsed
+    except RuntimeError:
+        # the response is not closed (redirect)
+        pass
+    request = requests.models.PreparedRequest()
+    request.method = response.request.method
+    request.url = str(response.request.url)
+    request.headers = requests.structures.CaseInsensitiveDict(response.request.headers)
+    result.request = request
+    return result
+
+
+def _get_httpx_args(kwargs):
+    """Convert the arguments of request(...) to the arguments of httpx.Client.request(...)
+
+    Return the arguments of the client, the arguments of the request and the searx options.
+    """
+    # proxies
+    proxies = kwargs.pop('proxies', None) or get_global_proxies()
+
+    # timeout
+    if 'timeout' in kwargs:
+        timeout = kwargs.pop('timeout')
+    else:
+        timeout = _timeout.get()
+
+    # raise_for_error
+    check_for_httperror = kwargs.pop('raise_for_httperror', True)
+
+    # cookies: send them in the header, the client doesn't keep them
+    headers = dict(kwargs.pop('headers', None) or {})
+    cookies = kwargs.pop('cookies', None)
+    if cookies:
+        headers['Cookie'] = '; '.join('{}={}'.format(name, value) for name, value in cookies.items())
+
+    # raw content
+    data = kwargs.get('data')
+    if isinstance(data, (str, bytes)):
+        kwargs['content'] = kwargs.pop('data')
+
+    max_redirects = kwargs.pop('max_redirects', None)
+    client_args = {'verify': kwargs.pop('verify', True), 'proxies': proxies}
+    kwargs['headers'] = headers
+    kwargs['timeout'] = timeout
+    kwargs['follow_redirects'] = kwargs.pop('allow_redirects', True)
+    return client_args, kwargs, (timeout, check_for_httperror, max_redirects)
+
+
+@contextmanager
+def _convert_httpx_exceptions():
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.TooManyRedirects as e:
+        raise requests.exceptions.TooManyRedirects(str(e)) from e
+    except httpx.HTTPError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+
+def _handle_httpx_response(response, options, time_before_request):
+    timeout, check_for_httperror, max_redirects = options
+    response = _to_requests_response(response)
+
+    if max_redirects is not None and len(response.history) > max_redirects:
+        raise requests.exceptions.TooManyRedirects('Exceeded {} redirects.'.format(max_redirects), response=response)
+
+    time_after_request = time()
+
+    # is there a timeout for this engine ?
+    _check_search_duration(timeout, time_before_request, time_after_request, response)
+
+    _add_total_time(time_after_request - time_before_request)
+
+    # raise an exception
+    if check_for_httperror:
+        raise_for_httperror(response)
+
+    return response
+
+
+def request_http2(method, url, source_ip_index=None, **kwargs):
+    """same as request(...) but send the request with HTTP/2"""
+    time_before_request = time()
+    client_args, kwargs, options = _get_httpx_args(kwargs)
+    client = get_http2_client(source_ip_index=source_ip_index, **client_args)
+
+    # do request
+    with _convert_httpx_exceptions():
+        response = client.request(method, url, **kwargs)
+    return _handle_httpx_response(response, options, time_before_request)
+
+
+async def request_async(method, url, http2=False, **kwargs):
+    """same as request(...) but send the request from the asyncio event loop"""
+    time_before_request = time()
+    client_args, kwargs, options = _get_httpx_args(kwargs)
+    client = get_async_client(http2=http2 and http2_support, **client_args)
+
+    # do request
+    with _convert_httpx_exceptions():
+        response = await client.request(method, url, **kwargs)
+    return _handle_httpx_response(response, options, time_before_request)
+
+
+async def get_async(url, **kwargs):
+    kwargs.setdefault('allow_redirects', True)
+    return await request_async('get', url, **kwargs)
+
+
+async def post_async(url, data=None, **kwargs):
+    return await request_async('post', url, data=data, **kwargs)
@@ -4,7 +4,10 @@
 
 # pylint: disable=useless-object-inheritance
 
+import copy
+import threading
 from base64 import urlsafe_b64encode, urlsafe_b64decode
+from collections import OrderedDict
 from zlib import compress, decompress
 from urllib.parse import parse_qs, urlencode
 
@@ -19,6 +22,10 @@ LANGUAGE_CODES.append('all')
 DISABLED = 0
 ENABLED = 1
 DOI_RESOLVERS = list(settings['doi_resolvers'])
+# attributes shared by the copies of a setting (see Setting.copy)
+SHARED_ATTRIBUTES = ('choices', 'map')
+# cookies of the engines, the plugins and the tokens (see Preferences.save)
+SWITCHABLE_COOKIES = ('disabled_engines', 'enabled_engines', 'disabled_plugins', 'enabled_plugins', 'tokens')
 
 
 class MissingArgumentException(Exception):
@@ -67,6 +74,16 @@ class Setting:
         If needed, its overwritten in the inheritance."""
         resp.set_cookie(name, self.value, max_age=COOKIE_MAX_AGE)
 
+    def copy(self):
+        """Returns a copy which can be modified without changing this setting
+
+        The choices are shared, the values (lists, sets) are copied."""
+        setting = copy.copy(self)
+        for name, value in self.__dict__.items():
+            if name not in SHARED_ATTRIBUTES and isinstance(value, (list, set, dict)):
+                setattr(setting, name, copy.copy(value))
+        return setting
+
 
 class StringSetting(Setting):
     """Setting of plain string values"""
@@ -413,6 +430,20 @@ class Preferences:
         self.tokens = SetSetting('tokens')
         self.unknown_params = {}
 
+    def copy(self):
+        """Returns a copy which can be modified without changing these preferences"""
+        preferences = Preferences.__new__(Preferences)
+        preferences.key_value_settings = {name: setting.copy() for name, setting in self.key_value_settings.items()}
+        preferences.engines = self.engines.copy()
+        preferences.plugins = self.plugins.copy()
+        preferences.tokens = self.tokens.copy()
+        preferences.unknown_params = dict(self.unknown_params)
+        return preferences
+
+    def get_cookie_names(self):
+        """Returns the names of the cookies read by :py:meth:`parse_dict`"""
+        return set(self.key_value_settings.keys()).union(SWITCHABLE_COOKIES)
+
     def get_as_url_params(self):
         """Return preferences as URL parameters"""
         settings_kv = {}
@@ -532,3 +563,42 @@ def is_locked(setting_name):
     if 'lock' not in settings['preferences']:
         return False
     return setting_name in settings['preferences']['lock']
+
+
+class PreferencesCache:
+    """LRU cache of the preferences parsed from the cookies.
+
+    Most of the users send the same few combinations of cookies: the preferences are built and parsed once for each
+    combination, then each request gets a copy (see :py:meth:`Preferences.copy`) to parse the form data.  Only the
+    cookies of the preferences are read: the other cookies of the domain (session, load balancer...) are ignored.
+    """
+
+    def __init__(self, create_preferences, max_size=1000):
+        self.create_preferences = create_preferences
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # {cookies: (Preferences, True if the cookies are invalid)}
+        self._entries = OrderedDict()
+        self._cookie_names = frozenset(create_preferences().get_cookie_names())
+
+    def get(self, cookies):
+        """Returns a copy of the preferences parsed from ``cookies`` and True if the cookies are invalid"""
+        cookies = {name: value for name, value in cookies.items() if name in self._cookie_names}
+        key = tuple(sorted(cookies.items()))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            preferences = self.create_preferences()
+            invalid_cookies = False
+            try:
+                preferences.parse_dict(cookies)
+            except Exception:  # pylint: disable=broad-except
+                invalid_cookies = True
+            entry = (preferences, invalid_cookies)
+            with self._lock:
+                self._entries[key] = entry
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return entry[0].copy(), entry[1]
@@ -1,10 +1,13 @@
 import re
+import pickle
 from operator import itemgetter
-from threading import RLock
+from threading import RLock, Lock
+from time import perf_counter
 from urllib.parse import urlparse, unquote
 from searx import logger
 from searx.engines import engines
 from searx.metrology.error_recorder import record_error
+from searx.metrology.spans import span
 
 
 CONTENT_LEN_IGNORED_CHARS_REGEX = re.compile(r'[,;:!?\./\\\\ ()-_]', re.M | re.U)
@@ -56,6 +59,23 @@ def compare_urls(url_a, url_b):
     return unquote(path_a) == unquote(path_b)
 
 
+def url_key(url):
+    """Key of an URL: two URLs have the same key if and only if
+    :py:func:`compare_urls` considers them equal.
+
+    Args:
+        url (ParseResult): URL
+
+    Returns:
+        tuple: host without "www.", query, fragment and unquoted path without the ending /
+    """
+    host = url.netloc
+    if host.startswith('www.'):
+        host = host.replace('www.', '', 1)
+    path = url.path[:-1] if url.path.endswith('/') else url.path
+    return host, url.query, url.fragment, unquote(path)
+
+
 def merge_two_infoboxes(infobox1, infobox2):
     # get engines weights
     if hasattr(engines[infobox1['engine']], 'weight'):
@@ -140,15 +160,30 @@ def result_score(result):
     return sum((occurences * weight) / position for position in result['positions'])
 
 
+def count_results_after(groups, index, limit):
+    """Number of results in the groups after groups[index], stop counting at limit."""
+    count = 0
+    for i in range(index + 1, len(groups)):
+        count += len(groups[i])
+        if count >= limit:
+            break
+    return count
+
+
 class ResultContainer:
     """docstring for ResultContainer"""
 
-    __slots__ = '_merged_results', 'infoboxes', 'suggestions', 'answers', 'corrections', '_number_of_results',\
-                '_ordered', 'paging', 'unresponsive_engines', 'timings', 'redirect_url'
+    __slots__ = '_merged_results', '_merged_urls', 'infoboxes', 'suggestions', 'answers', 'corrections',\
+                '_number_of_results', '_ordered', 'paging', 'unresponsive_engines', 'timings', 'redirect_url',\
+                'merge_time', '_result_engines', '_lock'
 
     def __init__(self):
         super().__init__()
+        # the engines add their results concurrently (see copy)
+        self._lock = Lock()
         self._merged_results = []
+        # key of the URL results (see __result_key) --> merged result
+        self._merged_urls = {}
         self.infoboxes = []
         self.suggestions = set()
         self.answers = {}
@@ -159,11 +194,52 @@ class ResultContainer:
         self.unresponsive_engines = set()
         self.timings = []
         self.redirect_url = None
+        # time spent in extend
+        self.merge_time = 0
+        # engines which have returned at least one result
+        self._result_engines = set()
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_lock'}
+
+    def __setstate__(self, state):
+        self._lock = Lock()
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def copy(self):
+        """Return a deep copy, the engines may still add results to this container.
+
+        The results must be picklable.
+        """
+        with self._lock:
+            return pickle.loads(pickle.dumps(self, pickle.HIGHEST_PROTOCOL))
 
     def extend(self, engine_name, results):
+        results = list(results)
+        with self._lock:
+            start_time = perf_counter()
+            standard_result_count, error_msgs = self._extend(engine_name, results)
+            self.merge_time += perf_counter() - start_time
+            if results and (standard_result_count or not error_msgs):
+                self._result_engines.add(engine_name)
+
+        if len(error_msgs) > 0:
+            for msg in error_msgs:
+                record_error(engine_name, 'some results are invalids: ' + msg)
+
+        if engine_name in engines:
+            engines[engine_name].stats.inc('search_count')
+            engines[engine_name].stats.inc('result_count', standard_result_count)
+
+        if not self.paging and standard_result_count > 0 and engine_name in engines\
+           and engines[engine_name].paging:
+            self.paging = True
+
+    def _extend(self, engine_name, results):
         standard_result_count = 0
         error_msgs = set()
-        for result in list(results):
+        for result in results:
             result['engine'] = engine_name
             if 'suggestion' in result:
                 self.suggestions.add(result['suggestion'])
@@ -189,19 +265,7 @@ class ResultContainer:
                 else:
                     self._merge_result(result, standard_result_count + 1)
                     standard_result_count += 1
-
-        if len(error_msgs) > 0:
-            for msg in error_msgs:
-                record_error(engine_name, 'some results are invalids: ' + msg)
-
-        if engine_name in engines:
-            with RLock():
-                engines[engine_name].stats['search_count'] += 1
-                engines[engine_name].stats['result_count'] += standard_result_count
-
-        if not self.paging and standard_result_count > 0 and engine_name in engines\
-           and engines[engine_name].paging:
-            self.paging = True
+        return standard_result_count, error_msgs
 
     def _merge_infobox(self, infobox):
         add_infobox = True
@@ -238,7 +302,8 @@ class ResultContainer:
         if result.get('content'):
             result['content'] = WHITESPACE_REGEX.sub(' ', result['content'])
 
-        duplicated = self.__find_duplicated_http_result(result)
+        result_key = self.__result_key(result)
+        duplicated = self._merged_urls.get(result_key)
         if duplicated:
             self.__merge_duplicated_http_result(duplicated, result, position)
             return
@@ -247,23 +312,16 @@ class ResultContainer:
         result['positions'] = [position]
         with RLock():
             self._merged_results.append(result)
+            self._merged_urls[result_key] = result
 
-    def __find_duplicated_http_result(self, result):
+    @staticmethod
+    def __result_key(result):
+        # same url (see compare_urls) and same template : it's a duplicate
         result_template = result.get('template')
-        for merged_result in self._merged_results:
-            if 'parsed_url' not in merged_result:
-                continue
-            if compare_urls(result['parsed_url'], merged_result['parsed_url'])\
-               and result_template == merged_result.get('template'):
-                if result_template != 'images.html':
-                    # not an image, same template, same url : it's a duplicate
-                    return merged_result
-                else:
-                    # it's an image
-                    # it's a duplicate if the parsed_url, template and img_src are differents
-                    if result.get('img_src', '') == merged_result.get('img_src', ''):
-                        return merged_result
-        return None
+        if result_template != 'images.html':
+            return url_key(result['parsed_url']), result_template
+        # it's an image: it's a duplicate only if the img_src is the same too
+        return url_key(result['parsed_url']), result_template, result.get('img_src', '')
 
     def __merge_duplicated_http_result(self, duplicated, result, position):
         # using content with more text
@@ -294,17 +352,21 @@ class ResultContainer:
             self._merged_results.append(result)
 
     def order_results(self):
+        # one increment of the shared counter per engine
+        score_per_engines = {}
         for result in self._merged_results:
             score = result_score(result)
             result['score'] = score
-            with RLock():
-                for result_engine in result['engines']:
-                    engines[result_engine].stats['score_count'] += score
+            for result_engine in result['engines']:
+                score_per_engines[result_engine] = score_per_engines.get(result_engine, 0) + score
+        for result_engine, score in score_per_engines.items():
+            engines[result_engine].stats.inc('score_count', score)
 
         results = sorted(self._merged_results, key=itemgetter('score'), reverse=True)
 
         # pass 2 : group results by category and template
-        gresults = []
+        # the groups are kept in the order of their creation: gresults is the concatenation of the groups.
+        groups = []
         categoryPositions = {}
 
         for res in results:
@@ -317,35 +379,28 @@ class ResultContainer:
                 + ':' + res.get('template', '')\
                 + ':' + ('img_src' if 'img_src' in res or 'thumbnail' in res else '')
 
-            current = None if category not in categoryPositions\
-                else categoryPositions[category]
+            current = categoryPositions.get(category)
 
             # group with previous results using the same category
             # if the group can accept more result and is not too far
             # from the current position
             if current is not None and (current['count'] > 0)\
-                    and (len(gresults) - current['index'] < 20):
+                    and (count_results_after(groups, current['index'], 20) < 20):
                 # group with the previous results using
                 # the same category with this one
-                index = current['index']
-                gresults.insert(index, res)
-
-                # update every index after the current one
-                # (including the current one)
-                for k in categoryPositions:
-                    v = categoryPositions[k]['index']
-                    if v >= index:
-                        categoryPositions[k]['index'] = v + 1
+                groups[current['index']].append(res)
 
                 # update this category
                 current['count'] -= 1
 
             else:
                 # same category
-                gresults.append(res)
+                groups.append([res])
 
                 # update categoryIndex
-                categoryPositions[category] = {'index': len(gresults), 'count': 8}
+                categoryPositions[category] = {'index': len(groups) - 1, 'count': 8}
+
+        gresults = [res for group in groups for res in group]
 
         # update _merged_results
         self._ordered = True
@@ -353,9 +408,29 @@ class ResultContainer:
 
     def get_ordered_results(self):
         if not self._ordered:
-            self.order_results()
+            with span('order_results'):
+                self.order_results()
         return self._merged_results
 
+    def get_unordered_results(self, start=0):
+        """Copy of the merged results from start, in the order of arrival (the scores are not computed).
+
+        The engines may still merge their results into these ones: each result is copied with the lock.
+        """
+        with self._lock:
+            results = []
+            for result in self._merged_results[start:]:
+                result = dict(result)
+                for key in ('engines', 'positions'):
+                    if key in result:
+                        result[key] = result[key].copy()
+                results.append(result)
+            return results
+
+    def has_results(self, engine_name):
+        """True if the engine has returned at least one result"""
+        return engine_name in self._result_engines
+
     def results_length(self):
         return len(self._merged_results)
 
@@ -367,14 +442,16 @@ class ResultContainer:
 
     def add_unresponsive_engine(self, engine_name, error_type, error_message=None):
         if engines[engine_name].display_error_messages:
-            self.unresponsive_engines.add((engine_name, error_type, error_message))
+            with self._lock:
+                self.unresponsive_engines.add((engine_name, error_type, error_message))
 
     def add_timing(self, engine_name, engine_time, page_load_time):
-        self.timings.append({
-            'engine': engines[engine_name].shortcut,
-            'total': engine_time,
-            'load': page_load_time
-        })
+        with self._lock:
+            self.timings.append({
+                'engine': engines[engine_name].shortcut,
+                'total': engine_time,
+                'load': page_load_time
+            })
 
     def get_timings(self):
         return self.timings
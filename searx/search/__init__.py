@@ -15,11 +15,13 @@ along with searx. If not, see < http://www.gnu.org/licenses/ >.
 (C) 2013- by Adam Tauber, <asciimoo@gmail.com>
 '''
 
+import os
 import typing
 import gc
+import asyncio
 import threading
 from time import time
-from uuid import uuid4
+from concurrent.futures import wait, FIRST_COMPLETED
 from _thread import start_new_thread
 
 from searx import settings
@@ -27,10 +29,16 @@ from searx.answerers import ask
 from searx.external_bang import get_bang_url
 from searx.results import ResultContainer
 from searx import logger
+from searx import poolrequests
 from searx.plugins import plugins
+from searx.metrology.latency import get_timeout
+from searx.metrology.spans import span, add_span
 from searx.search.models import EngineRef, SearchQuery
 from searx.search.processors import processors, initialize as initialize_processors
 from searx.search.checker import initialize as initialize_checker
+from searx.search.executor import EngineExecutor, start_event_loop
+from searx.search import cache
+from searx.search import prewarm
 
 
 logger = logger.getChild('search')
@@ -46,12 +54,62 @@ else:
         import sys
         sys.exit(1)
 
+# answer before all the engines have responded (see get_quorum)
+quorum_engines = settings['outgoing'].get('quorum_engines', 0)
+quorum_results = settings['outgoing'].get('quorum_results', 0)
+quorum_soft_timeout = settings['outgoing'].get('quorum_soft_timeout', 0)
 
-def initialize(settings_engines=None, enable_checker=False):
+executor = None
+use_asyncio = False
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+
+def initialize_executor(max_workers=None):
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False)
+    max_workers = max_workers or settings['outgoing'].get('engine_workers', 100)
+    executor = EngineExecutor(max_workers)
+
+
+def initialize_asyncio():
+    global use_asyncio
+    use_asyncio = settings['outgoing'].get('use_asyncio', False)
+    if use_asyncio and poolrequests.httpx is None:
+        logger.error('outgoing.use_asyncio requires the httpx package: the threads are used instead')
+        use_asyncio = False
+
+
+def get_event_loop():
+    """Return the event loop of the current process.
+
+    The loop is started on the first call, after the fork of the uwsgi workers.
+    """
+    global _event_loop
+    pid = os.getpid()
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop[0] != pid:
+            _event_loop = (pid, start_event_loop())
+        return _event_loop[1]
+
+
+def get_executor_stats():
+    if executor is None:
+        return None
+    return executor.get_stats()
+
+
+def initialize(settings_engines=None, enable_checker=False, enable_prewarm=False):
     settings_engines = settings_engines or settings['engines']
     initialize_processors(settings_engines)
+    initialize_executor()
+    initialize_asyncio()
+    cache.initialize()
     if enable_checker:
         initialize_checker()
+    if enable_prewarm:
+        prewarm.initialize()
 
 
 class Search:
@@ -86,7 +144,8 @@ class Search:
         Check if an answer return a result.
         If yes, update self.result_container and return True
         """
-        answerers_results = ask(self.search_query)
+        with span('answerers'):
+            answerers_results = ask(self.search_query)
 
         if answerers_results:
             for results in answerers_results:
@@ -111,14 +170,13 @@ class Search:
             if request_params is None:
                 continue
 
-            with threading.RLock():
-                processor.engine.stats['sent_search_count'] += 1
+            processor.engine.stats.inc('sent_search_count')
 
             # append request to list
             requests.append((engineref.name, self.search_query.query, request_params))
 
-            # update default_timeout
-            default_timeout = max(default_timeout, processor.engine.timeout)
+            # update default_timeout (see outgoing.adaptive_timeout)
+            default_timeout = max(default_timeout, get_timeout(engineref.name, processor.engine.timeout))
 
         # adjust timeout
         actual_timeout = default_timeout
@@ -143,50 +201,162 @@ class Search:
         return requests, actual_timeout
 
     def search_multiple_requests(self, requests):
-        search_id = uuid4().__str__()
+        for _ in self.iter_multiple_requests(requests):
+            pass
+
+    def iter_multiple_requests(self, requests):
+        """Send the requests, then yield the name of each engine as soon as it has answered.
 
+        The results of the engine are already in self.result_container.
+        Return False if the iteration stopped before all the engines have answered (see is_quorum_reached).
+        """
+        futures = {}
         for engine_name, query, request_params in requests:
-            th = threading.Thread(
-                target=processors[engine_name].search,
-                args=(query, request_params, self.result_container, self.start_time, self.actual_timeout),
-                name=search_id,
-            )
-            th._timeout = False
-            th._engine_name = engine_name
-            th.start()
-
-        for th in threading.enumerate():
-            if th.name == search_id:
-                remaining_time = max(0.0, self.actual_timeout - (time() - self.start_time))
-                th.join(remaining_time)
-                if th.is_alive():
-                    th._timeout = True
-                    self.result_container.add_unresponsive_engine(th._engine_name, 'timeout')
-                    logger.warning('engine timeout: {0}'.format(th._engine_name))
+            processor = processors[engine_name]
+            args = (query, request_params, self.result_container, self.start_time, self.actual_timeout)
+            if use_asyncio and processor.use_asyncio:
+                future = asyncio.run_coroutine_threadsafe(processor.search_async(*args), get_event_loop())
+            else:
+                future = executor.submit(processor.search, *args)
+            futures[future] = engine_name
+
+        end_time = self.start_time + self.actual_timeout
+        soft_end_time = self.start_time + quorum_soft_timeout if quorum_soft_timeout else end_time
+        pending = set(futures)
+        # engines which have returned results: the engines in error don't count for the quorum
+        result_engine_count = 0
+        try:
+            while pending:
+                now = time()
+                if now >= end_time:
+                    break
+                timeout = end_time - now if now >= soft_end_time else soft_end_time - now
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if self.result_container.has_results(futures[future]):
+                        result_engine_count += 1
+                    yield futures[future]
+                if pending and self.is_quorum_reached(result_engine_count):
+                    self._answer_before_late_engines(futures, pending)
+                    return False
+        except GeneratorExit:
+            # the iteration has been stopped by the caller
+            self._cancel_late_engines(self.result_container, futures, pending)
+            raise
+
+        self._cancel_late_engines(self.result_container, futures, pending)
+        return True
+
+    def is_quorum_reached(self, result_engine_count):
+        """True if the search can answer without the engines which have not responded yet.
+
+        result_engine_count is the number of engines which have returned results.
+        See the outgoing.quorum_* settings.
+        """
+        if quorum_engines and result_engine_count >= quorum_engines:
+            return True
+        if quorum_results and self.result_container.results_length() >= quorum_results:
+            return True
+        if quorum_soft_timeout and time() - self.start_time >= quorum_soft_timeout\
+           and self.result_container.results_length() > 0:
+            return True
+        return False
+
+    def _answer_before_late_engines(self, futures, pending):
+        # the late engines keep adding their results to the original container,
+        # which is cached once they have all answered.
+        late_result_container = self.result_container
+        try:
+            self.result_container = late_result_container.copy()
+        except Exception as e:  # pylint: disable=broad-except
+            # the results can't be copied: wait for all the engines
+            logger.warning('quorum: can\'t copy the results: %s', e)
+            wait(pending, timeout=max(0.0, self.actual_timeout - (time() - self.start_time)))
+            self._cancel_late_engines(late_result_container, futures, pending)
+            return
+
+        # the answer tells the user the results are partial
+        for future in pending:
+            self.result_container.add_unresponsive_engine(futures[future], 'timeout')
+
+        # no thread waits for the late engines: the last one to answer stores the results in the cache
+        search_query = self.search_query
+        end_time = self.start_time + self.actual_timeout
+        remaining = [len(pending)]
+        lock = threading.Lock()
+
+        def on_late_engine_done(future):
+            if future.cancelled() or time() > end_time:
+                late_result_container.add_unresponsive_engine(futures[future], 'timeout')
+                logger.warning('engine timeout: {0}'.format(futures[future]))
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last and not late_result_container.unresponsive_engines:
+                cache.store(search_query, late_result_container)
+
+        for future in pending:
+            future.add_done_callback(on_late_engine_done)
+
+    @staticmethod
+    def _cancel_late_engines(result_container, futures, pending):
+        for future in pending:
+            if not future.done():
+                engine_name = futures[future]
+                # the engine may still be in the queue: don't start it
+                # (asyncio: the task is cancelled)
+                future.cancel()
+                result_container.add_unresponsive_engine(engine_name, 'timeout')
+                logger.warning('engine timeout: {0}'.format(engine_name))
 
     def search_standard(self):
         """
         Update self.result_container, self.actual_timeout
         """
+        for _ in self.iter_search_standard():
+            pass
+
+        # return results, suggestions, answers and infoboxes
+        return True
+
+    def iter_search_standard(self):
+        result_container = cache.get(self.search_query)
+        if result_container is not None:
+            result_container.timings = []
+            result_container.merge_time = 0
+            self.result_container = result_container
+            return
+
         requests, self.actual_timeout = self._get_requests()
 
         # send all search-request
         if requests:
-            self.search_multiple_requests(requests)
+            with span('engines'):
+                complete = yield from self.iter_multiple_requests(requests)
+            # time spent by the engine threads to merge the results
+            add_span('merge', self.result_container.merge_time)
             start_new_thread(gc.collect, tuple())
 
-        # return results, suggestions, answers and infoboxes
-        return True
+            # cache only the complete answers
+            if complete and not self.result_container.unresponsive_engines:
+                cache.store(self.search_query, self.result_container)
 
     # do search-request
     def search(self):
+        for _ in self.search_iter():
+            pass
+        return self.result_container
+
+    def search_iter(self):
+        """Same as search(), but yield the name of each engine as soon as it has answered.
+
+        self.result_container is complete only at the end of the iteration.
+        """
         self.start_time = time()
 
         if not self.search_external_bang():
             if not self.search_answerers():
-                self.search_standard()
-
-        return self.result_container
+                yield from self.iter_search_standard()
 
 
 class SearchWithPlugins(Search):
@@ -199,15 +369,21 @@ class SearchWithPlugins(Search):
         self.ordered_plugin_list = ordered_plugin_list
         self.request = request
 
-    def search(self):
-        if plugins.call(self.ordered_plugin_list, 'pre_search', self.request, self):
-            super().search()
+    def search_iter(self):
+        with span('plugins_pre_search'):
+            continue_search = plugins.call(self.ordered_plugin_list, 'pre_search', self.request, self)
+        if continue_search:
+            yield from super().search_iter()
 
-        plugins.call(self.ordered_plugin_list, 'post_search', self.request, self)
+        with span('plugins_post_search'):
+            plugins.call(self.ordered_plugin_list, 'post_search', self.request, self)
 
         results = self.result_container.get_ordered_results()
 
-        for result in results:
-            plugins.call(self.ordered_plugin_list, 'on_result', self.request, self, result)
+        with span('plugins_on_result'):
+            for result in results:
+                self.on_result(result)
 
-        return self.result_container
+    def on_result(self, result):
+        """Call the on_result function of the plugins, the webapp calls it on the streamed results"""
+        return plugins.call(self.ordered_plugin_list, 'on_result', self.request, self, result)
@@ -0,0 +1,183 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Cache of the search results.
+
+The key is made of the parameters of the :py:class:`searx.search.models.SearchQuery`
+which change the results: query, engines, language, safe search, page number
+and time range.  The value is the pickled :py:class:`searx.results.ResultContainer`
+once all the engines have answered, before the plugins are called: the
+plugins run again on each cached answer.
+
+The engines with a ``cache_ttl`` attribute (in seconds) have their own cache:
+the key is the request sent by the engine (method, URL and data), the value is
+the list of results returned by the ``response`` function of the engine.
+
+Two backends:
+
+* ``memory``: one LRU cache per process.
+* ``shared``: the uwsgi cache ``searxresults`` (see :py:mod:`searx.shared`),
+  shared by all the uwsgi workers.  It is not the cache of the counters and
+  of the states of the engines: the results can't evict them.  Without this
+  uwsgi cache, the ``memory`` backend is used.
+"""
+
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from time import time
+
+from searx import logger, settings
+from searx import shared
+from searx.metrology.counters import SharedCounters
+
+
+logger = logger.getChild('search.cache')
+
+cache = None
+engine_cache = None
+# results_hit, results_miss, engine_hit, engine_miss
+counters = SharedCounters('cache_')
+
+
+class MemoryCache:
+    """LRU cache of the current process, the entries expire after ttl seconds."""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expire_time = entry
+            if expire_time < time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class SharedCache:
+    """Cache stored in :py:data:`searx.shared.results_storage`.
+
+    The size of the uwsgi cache is set in uwsgi.ini (``cache2 = name=searxresults,...`` option).
+    """
+
+    prefix = 'result_cache_'
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def get(self, key):
+        return shared.results_storage.get_bytes(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        shared.results_storage.set_bytes(self.prefix + key, value, int(ttl or self.ttl))
+
+
+def get_backend(backend, ttl, max_size):
+    if backend == 'shared' and shared.results_storage is None:
+        logger.info('result_cache: no uwsgi cache %s, use the memory backend', shared.RESULTS_CACHE_NAME)
+        backend = 'memory'
+
+    if backend == 'shared':
+        return SharedCache(int(ttl))
+    if backend == 'memory':
+        return MemoryCache(ttl, max_size)
+    logger.error('result_cache: unknown backend "%s", the cache is disabled', backend)
+    return None
+
+
+def initialize(ttl=None, max_size=None, backend=None):
+    global cache, engine_cache
+    cache_settings = settings.get('result_cache') or {}
+    ttl = ttl if ttl is not None else cache_settings.get('ttl', 0)
+    max_size = max_size or cache_settings.get('max_size', 1000)
+    backend = backend or cache_settings.get('backend', 'memory')
+
+    if not ttl or ttl <= 0:
+        cache = None
+    else:
+        cache = get_backend(backend, ttl, max_size)
+
+    # the TTL is set by each engine
+    engine_cache = get_backend(backend, 0, max_size)
+
+
+def get_key(search_query):
+    engines = sorted((engineref.name, engineref.category) for engineref in search_query.engineref_list)
+    key = (search_query.query, engines, search_query.lang, search_query.safesearch,
+           search_query.pageno, search_query.time_range)
+    return hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def get(search_query):
+    """Return a copy of the cached ResultContainer for search_query, or None"""
+    if cache is None:
+        return None
+    value = cache.get(get_key(search_query))
+    if value is None:
+        counters.inc('results_miss')
+        return None
+    counters.inc('results_hit')
+    try:
+        return pickle.loads(value)
+    except Exception:
+        logger.exception('result_cache: invalid entry')
+        return None
+
+
+def store(search_query, result_container):
+    if cache is None:
+        return
+    try:
+        value = pickle.dumps(result_container, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.warning('result_cache: results of "%s" not cached: %s', search_query.query, e)
+        return
+    cache.set(get_key(search_query), value)
+
+
+def get_engine_key(engine_name, params):
+    key = (engine_name, params['method'], params['url'], params['data'])
+    return 'engine_' + hashlib.sha256(repr(key).encode()).hexdigest()
+
+
+def get_engine_results(engine_name, params):
+    """Return a copy of the cached results of the request params, or None"""
+    if engine_cache is None:
+        return None
+    value = engine_cache.get(get_engine_key(engine_name, params))
+    if value is None:
+        counters.inc('engine_miss')
+        return None
+    counters.inc('engine_hit')
+    try:
+        return pickle.loads(value)
+    except Exception:
+        logger.exception('result_cache: invalid entry')
+        return None
+
+
+def store_engine_results(engine_name, params, results, ttl):
+    if engine_cache is None:
+        return
+    try:
+        value = pickle.dumps(results, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.warning('result_cache: results of %s not cached: %s', engine_name, e)
+        return
+    engine_cache.set(get_engine_key(engine_name, params), value, ttl)
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Suspension of the engines after an error, shared by all the processes.
+
+The state of each engine is stored in :py:data:`searx.shared.storage`: when an
+engine is banned (CAPTCHA, too many requests, HTTP errors), all the uwsgi
+workers stop sending requests to it at once.
+
+* ``closed``: the requests are sent.
+* ``open``: the engine is suspended until the end of the ban, no request is sent.
+* ``half-open``: the ban has expired, one process sends the next request (the
+  probe) while the other processes still skip the engine.  If the probe
+  succeeds the circuit is closed, otherwise the engine is suspended again for
+  a longer time (see ``search.ban_time_on_fail`` and
+  ``search.max_ban_time_on_fail``).  When the probe doesn't end (for example
+  the process is stopped), another process sends a probe after the timeout of
+  the engine.
+"""
+
+from time import time
+
+from searx import logger, settings
+from searx import shared
+
+
+logger = logger.getChild('search.circuit_breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# added to the timeout of the engine, see CircuitBreaker.allow_request
+PROBE_MARGIN = 1.0
+
+
+class CircuitBreaker:
+    """Suspension state of one engine.
+
+    The value stored in the shared storage is ``"<continuous errors> <suspend end time> <probe end time>"``.
+    """
+
+    __slots__ = 'engine_name', 'key', 'timeout'
+
+    prefix = 'circuit_breaker_'
+
+    def __init__(self, engine_name, timeout):
+        self.engine_name = engine_name
+        self.key = self.prefix + engine_name
+        self.timeout = timeout
+
+    def _get(self):
+        value = shared.storage.get_str(self.key)
+        if not value:
+            return 0, 0.0, 0.0
+        continuous_errors, suspend_end_time, probe_end_time = value.split(' ')
+        return int(continuous_errors), float(suspend_end_time), float(probe_end_time)
+
+    def _set(self, continuous_errors, suspend_end_time, probe_end_time):
+        shared.storage.set_str(self.key, '{0} {1} {2}'.format(continuous_errors, suspend_end_time, probe_end_time))
+
+    @property
+    def continuous_errors(self):
+        return self._get()[0]
+
+    @property
+    def suspend_end_time(self):
+        return self._get()[1]
+
+    def get_state(self, now=None):
+        _, suspend_end_time, _ = self._get()
+        if not suspend_end_time:
+            return CLOSED
+        if (now or time()) < suspend_end_time:
+            return OPEN
+        return HALF_OPEN
+
+    def allow_request(self):
+        """Return True if a request can be sent to the engine.
+
+        In the half-open state, only the process which calls this function first sends a request.
+        """
+        now = time()
+        _, suspend_end_time, probe_end_time = self._get()
+        if not suspend_end_time:
+            return True
+        if now < suspend_end_time or now < probe_end_time:
+            return False
+        with shared.storage.lock():
+            # read again: another process may have started the probe
+            continuous_errors, suspend_end_time, probe_end_time = self._get()
+            if not suspend_end_time:
+                return True
+            if now < suspend_end_time or now < probe_end_time:
+                return False
+            self._set(continuous_errors, suspend_end_time, now + self.timeout + PROBE_MARGIN)
+        logger.debug('%s: probe request', self.engine_name)
+        return True
+
+    def record_success(self):
+        # most of the time the circuit is closed: read before any write to the shared storage
+        if not self._get()[1]:
+            return
+        with shared.storage.lock():
+            self._set(0, 0, 0)
+        logger.info('%s: suspension ended', self.engine_name)
+
+    def record_failure(self, suspended_time=None):
+        """Suspend the engine for suspended_time seconds, or according to the number of continuous errors"""
+        with shared.storage.lock():
+            continuous_errors = self._get()[0] + 1
+            if suspended_time is None:
+                suspended_time = min(settings['search']['max_ban_time_on_fail'],
+                                     continuous_errors * settings['search']['ban_time_on_fail'])
+            self._set(continuous_errors, time() + suspended_time, 0)
+        logger.debug('%s: suspended for %s seconds', self.engine_name, suspended_time)
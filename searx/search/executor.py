@@ -0,0 +1,80 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Long-lived pool of threads sending the requests to the engines.
+
+One pool exists per process (so per uwsgi worker): the threads are started on
+demand and reused by the following queries instead of starting one thread per
+engine and per query.
+
+When ``outgoing.use_asyncio`` is enabled, the online engines are run as
+coroutines by one event loop per process (see :py:func:`start_event_loop`).
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from searx import logger
+
+
+logger = logger.getChild('search.executor')
+
+
+class EngineExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor which keeps some counters about its usage.
+
+    * ``active``: number of tasks currently running.
+    * ``queue``: number of tasks waiting for a free thread.
+    * ``saturated_count``: number of tasks submitted while all threads were busy.
+    """
+
+    def __init__(self, max_workers):
+        super().__init__(max_workers=max_workers, thread_name_prefix='searx_engine')
+        self._stats_lock = threading.Lock()
+        self.active = 0
+        self.submitted_count = 0
+        self.saturated_count = 0
+        self.max_queue = 0
+
+    def _run(self, fn, args, kwargs):
+        with self._stats_lock:
+            self.active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._stats_lock:
+                self.active -= 1
+
+    def submit(self, fn, *args, **kwargs):  # pylint: disable=arguments-differ
+        with self._stats_lock:
+            self.submitted_count += 1
+            if self.active >= self._max_workers:
+                self.saturated_count += 1
+            queue = self._work_queue.qsize()
+            if queue > self.max_queue:
+                self.max_queue = queue
+                logger.debug('queue depth: %i', queue)
+        return super().submit(self._run, fn, args, kwargs)
+
+    def get_stats(self):
+        return {
+            'max_workers': self._max_workers,
+            'workers': len(self._threads),
+            'active': self.active,
+            'queue': self._work_queue.qsize(),
+            'max_queue': self.max_queue,
+            'submitted_count': self.submitted_count,
+            'saturated_count': self.saturated_count,
+        }
+
+
+def start_event_loop():
+    """Start an asyncio event loop in a daemon thread and return it.
+
+    Use :py:func:`asyncio.run_coroutine_threadsafe` to run a coroutine in this loop.
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name='searx_asyncio', daemon=True)
+    thread.start()
+    return loop
@@ -0,0 +1,90 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Open and keep alive the connections to the engines.
+
+Every ``outgoing.prewarm_interval`` seconds, each process sends a ``HEAD``
+request to the host of each enabled online engine (taken from the
+``base_url``, ``search_url`` or ``url`` attribute of the engine): the first
+queries after a start or an idle period don't pay the DNS resolution, the TCP
+and the TLS handshakes.  The occupancy of the connection pools is available
+from :py:func:`searx.poolrequests.get_pool_stats`.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests.exceptions
+
+from searx import logger, settings
+from searx import poolrequests
+from searx.engines import engines
+from searx.shared import schedule
+
+
+logger = logger.getChild('search.prewarm')
+
+URL_ATTRIBUTES = ('base_url', 'search_url', 'url')
+
+
+def get_engine_origin(engine):
+    """Return the scheme and the host of the engine, or None if it can't be found.
+
+    The URLs where the host depends on the query (e.g. ``https://{language}.wikipedia.org``)
+    are ignored.
+    """
+    for attribute in URL_ATTRIBUTES:
+        url = getattr(engine, attribute, None)
+        if not isinstance(url, str):
+            continue
+        parsed_url = urlparse(url)
+        if parsed_url.scheme in ('http', 'https') and parsed_url.netloc and '{' not in parsed_url.netloc:
+            return parsed_url.scheme + '://' + parsed_url.netloc + '/'
+    return None
+
+
+def get_engine_origins():
+    """Return {origin: (request arguments, list of proxies)} for the engines enabled by default"""
+    origins = {}
+    for engine in engines.values():
+        if engine.disabled or engine.engine_type == 'offline':
+            continue
+        origin = get_engine_origin(engine)
+        if origin is None or origin in origins:
+            continue
+        request_args = {'timeout': engine.timeout, 'raise_for_httperror': False}
+        if engine.enable_http2:
+            request_args['http2'] = True
+        proxy_cycles = getattr(engine, 'proxies', None) or poolrequests.GLOBAL_PROXY_CYCLES
+        origins[origin] = (request_args, poolrequests.get_all_proxies(proxy_cycles))
+    return origins
+
+
+def _prewarm_origin(origin, request_args, proxies_list):
+    # one request for each source IP and each proxy: each one has its own connection pool.
+    # The source IPs and the proxies are given: the cycles shared with the queries are not advanced.
+    for source_ip_index in range(len(poolrequests.source_ips)):
+        for proxies in proxies_list:
+            try:
+                poolrequests.head(origin, source_ip_index=source_ip_index, proxies=proxies, **request_args)
+            except requests.exceptions.RequestException as e:
+                logger.debug('%s: %s', origin, e)
+
+
+def prewarm():
+    origins = get_engine_origins()
+    with ThreadPoolExecutor(max_workers=10, thread_name_prefix='searx_prewarm') as executor:
+        for origin, (request_args, proxies_list) in origins.items():
+            executor.submit(_prewarm_origin, origin, request_args, proxies_list)
+    logger.debug('connection pools: %s', poolrequests.get_pool_stats())
+
+
+def initialize():
+    interval = settings['outgoing'].get('prewarm_interval', 0)
+    if not interval:
+        return
+    # the connection pools are local to each process
+    if schedule(interval, prewarm, all_workers=True):
+        logger.info('Open the connections to the engines every %i seconds', interval)
+        threading.Thread(target=prewarm, name='searx_prewarm', daemon=True).start()
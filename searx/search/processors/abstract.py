@@ -9,6 +9,9 @@ logger = logger.getChild('searx.search.processor')
 
 class EngineProcessor:
 
+    # True if the processor implements search_async
+    use_asyncio = False
+
     def __init__(self, engine, engine_name):
         self.engine = engine
         self.engine_name = engine_name
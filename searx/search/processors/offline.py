@@ -1,9 +1,9 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
-import threading
 from time import time
 from searx import logger
 from searx.metrology.error_recorder import record_exception, record_error
+from searx.metrology import histogram
 from searx.search.processors.abstract import EngineProcessor
 
 
@@ -18,8 +18,7 @@ class OfflineProcessor(EngineProcessor):
         engine_time = time() - start_time
         result_container.add_timing(self.engine_name, engine_time, engine_time)
 
-        with threading.RLock():
-            self.engine.stats['errors'] += 1
+        self.engine.stats.inc('errors')
 
     def _search_basic(self, query, params):
         return self.engine.search(query, params)
@@ -33,9 +32,9 @@ class OfflineProcessor(EngineProcessor):
 
                 engine_time = time() - start_time
                 result_container.add_timing(self.engine_name, engine_time, engine_time)
-                with threading.RLock():
-                    self.engine.stats['engine_time'] += engine_time
-                    self.engine.stats['engine_time_count'] += 1
+                histogram.record(self.engine_name, 'total', engine_time)
+                self.engine.stats.inc('engine_time', engine_time)
+                self.engine.stats.inc('engine_time_count')
 
         except ValueError as e:
             record_exception(self.engine_name, e)
@@ -47,5 +46,6 @@ class OfflineProcessor(EngineProcessor):
             result_container.add_unresponsive_engine(self.engine_name, 'unexpected crash', str(e))
             logger.exception('engine {0} : exception : {1}'.format(self.engine_name, e))
         else:
-            if getattr(threading.current_thread(), '_timeout', False):
+            if time() - start_time > timeout_limit:
+                # the engine has answered after the end of the search
                 record_error(self.engine_name, 'Timeout')
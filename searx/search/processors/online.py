@@ -2,6 +2,10 @@
 
 from urllib.parse import urlparse
 from time import time
+from copy import deepcopy
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import asyncio
 import threading
 
 import requests.exceptions
@@ -13,12 +17,33 @@ from searx.utils import gen_useragent
 from searx.exceptions import (SearxEngineAccessDeniedException, SearxEngineCaptchaException,
                               SearxEngineTooManyRequestsException,)
 from searx.metrology.error_recorder import record_exception, record_error
+from searx.metrology.latency import record_latency, get_percentile
+from searx.metrology import histogram
+from searx.search import cache
+from searx.search.circuit_breaker import CircuitBreaker
 
 from searx.search.processors.abstract import EngineProcessor
 
 
 logger = logger.getChild('search.processor.online')
 
+# the hedged requests (see OnlineProcessor.get_hedge_delay)
+HEDGE_PERCENTILE = 90
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+# set in the context of a hedged request once the other request has answered
+_hedge_abandoned = ContextVar('hedge_abandoned', default=None)
+
+
+def get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=settings['outgoing'].get('engine_workers', 100),
+                                                     thread_name_prefix='searx_hedge')
+    return _hedge_executor
+
 
 def default_request_params():
     return {
@@ -36,13 +61,20 @@ class OnlineProcessor(EngineProcessor):
 
     engine_type = 'online'
 
+    def __init__(self, engine, engine_name):
+        super().__init__(engine, engine_name)
+        # engines calling blocking functions (see searx.poolrequests.get) can't run in the event loop
+        self.use_asyncio = getattr(engine, 'use_asyncio', True)
+        # the suspension of the engine is shared by all the processes
+        self.circuit_breaker = CircuitBreaker(engine_name, getattr(engine, 'timeout', 0))
+
     def get_params(self, search_query, engine_category):
         params = super().get_params(search_query, engine_category)
         if params is None:
             return None
 
         # skip suspended engines
-        if self.engine.suspend_end_time >= time():
+        if not self.circuit_breaker.allow_request():
             logger.debug('Engine currently suspended: %s', self.engine_name)
             return None
 
@@ -54,7 +86,7 @@ class OnlineProcessor(EngineProcessor):
 
         return params
 
-    def _send_http_request(self, params):
+    def _get_request_args(self, params):
         # create dictionary which contain all
         # informations about the request
         request_args = dict(
@@ -73,22 +105,20 @@ class OnlineProcessor(EngineProcessor):
         if max_redirects:
             request_args['max_redirects'] = max_redirects
 
-        # soft_max_redirects
-        soft_max_redirects = params.get('soft_max_redirects', max_redirects or 0)
-
         # raise_for_status
         request_args['raise_for_httperror'] = params.get('raise_for_httperror', False)
 
-        # specific type of request (GET or POST)
-        if params['method'] == 'GET':
-            req = poolrequests.get
-        else:
-            req = poolrequests.post
-
         request_args['data'] = params['data']
 
-        # send the request
-        response = req(params['url'], **request_args)
+        # HTTP/2 (see outgoing.enable_http2)
+        if self.engine.enable_http2:
+            request_args['http2'] = True
+
+        return request_args
+
+    def _check_redirects(self, params, response):
+        # soft_max_redirects
+        soft_max_redirects = params.get('soft_max_redirects', params.get('max_redirects') or 0)
 
         # check soft limit of the redirect count
         if len(response.history) > soft_max_redirects:
@@ -101,6 +131,34 @@ class OnlineProcessor(EngineProcessor):
                          '{} redirects, maximum: {}'.format(len(response.history), soft_max_redirects),
                          (status_code, reason, hostname))
 
+    def _send_http_request(self, params):
+        request_args = self._get_request_args(params)
+
+        # specific type of request (GET or POST)
+        if params['method'] == 'GET':
+            req = poolrequests.get
+        else:
+            req = poolrequests.post
+
+        # send the request
+        response = req(params['url'], **request_args)
+
+        self._check_redirects(params, response)
+        return response
+
+    async def _send_http_request_async(self, params):
+        request_args = self._get_request_args(params)
+
+        # specific type of request (GET or POST)
+        if params['method'] == 'GET':
+            req = poolrequests.get_async
+        else:
+            req = poolrequests.post_async
+
+        # send the request
+        response = await req(params['url'], **request_args)
+
+        self._check_redirects(params, response)
         return response
 
     def _search_basic(self, query, params):
@@ -115,12 +173,186 @@ class OnlineProcessor(EngineProcessor):
         if not params['url']:
             return None
 
+        # the same request has been sent recently
+        search_results = self._get_cached_results(params)
+        if search_results is not None:
+            return search_results
+
         # send request
         response = self._send_http_request(params)
 
+        # hedged request: the other request has already answered
+        abandoned = _hedge_abandoned.get()
+        if abandoned is not None and abandoned.is_set():
+            response.close()
+            return None
+
         # parse the response
+        return self._parse_response(params, response)
+
+    async def _search_basic_async(self, query, params):
+        # same as _search_basic, the engine functions are called from the event loop
+        self.engine.request(query, params)
+
+        if not params['url']:
+            return None
+
+        search_results = self._get_cached_results(params)
+        if search_results is not None:
+            return search_results
+
+        response = await self._send_http_request_async(params)
+
+        return self._parse_response(params, response)
+
+    def _get_cached_results(self, params):
+        if not self.engine.cache_ttl:
+            return None
+        return cache.get_engine_results(self.engine_name, params)
+
+    def _parse_response(self, params, response):
         response.search_params = params
-        return self.engine.response(response)
+        parse_start_time = time()
+        search_results = self.engine.response(response)
+        parse_time = time() - parse_start_time
+        histogram.record(self.engine_name, 'parse', parse_time)
+        self.engine.stats.inc('parse_time', parse_time)
+        self.engine.stats.inc('parse_count')
+
+        # the engine declares how long its results are valid
+        if self.engine.cache_ttl and search_results:
+            search_results = list(search_results)
+            cache.store_engine_results(self.engine_name, params, search_results, self.engine.cache_ttl)
+        return search_results
+
+    def get_hedge_delay(self):
+        """Return the delay before a second request is sent, or None if the engine doesn't hedge.
+
+        The delay is the 90th percentile of the response times of the engine: the second request
+        may use another instance (engines with several backends like searx_engine), another proxy
+        or another source IP.
+        """
+        if not self.engine.hedging:
+            return None
+        return get_percentile(self.engine_name, HEDGE_PERCENTILE)
+
+    def _search_hedged(self, query, params):
+        hedge_delay = self.get_hedge_delay()
+        if hedge_delay is None:
+            return self._search_basic(query, params)
+
+        # engine.request modifies params
+        hedge_params = deepcopy(params)
+        executor = get_hedge_executor()
+        contexts = {}
+        abandoned_events = {}
+
+        def submit(request_params):
+            # copy_context: the HTTP timeout of this thread (see poolrequests)
+            context = copy_context()
+            # the HTTP timeout of the request is the time left, not the whole timeout of the engine
+            remaining_time = poolrequests.get_remaining_time_for_thread()
+            if remaining_time is not None:
+                context.run(poolrequests.set_timeout_for_thread, max(remaining_time, 0), time())
+            abandoned = threading.Event()
+            context.run(_hedge_abandoned.set, abandoned)
+            future = executor.submit(context.run, self._search_basic, query, request_params)
+            contexts[future] = context
+            abandoned_events[future] = abandoned
+            return future
+
+        def get_result(future):
+            # HTTP total time of the request which has answered
+            poolrequests.add_time_for_thread(contexts[future].run(poolrequests.get_time_for_thread) or 0)
+            return future.result()
+
+        def get_wait_timeout(delay=None):
+            remaining_time = poolrequests.get_remaining_time_for_thread()
+            if remaining_time is None:
+                return delay
+            remaining_time = max(remaining_time, 0)
+            return remaining_time if delay is None else min(delay, remaining_time)
+
+        first = submit(params)
+        pending = {first}
+        try:
+            done, pending = wait(pending, timeout=get_wait_timeout(hedge_delay))
+            if done:
+                return get_result(first)
+            if get_wait_timeout() == 0:
+                raise requests.exceptions.Timeout()
+
+            logger.debug('%s: hedged request after %.3f seconds', self.engine_name, hedge_delay)
+            pending.add(submit(hedge_params))
+            while pending:
+                done, pending = wait(pending, timeout=get_wait_timeout(), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise requests.exceptions.Timeout()
+                for future in done:
+                    if future.exception() is None or not pending:
+                        return get_result(future)
+        finally:
+            # a request already sent can't be interrupted: its HTTP timeout is the time left,
+            # and its response is closed without being parsed
+            for future in pending:
+                abandoned_events[future].set()
+                future.cancel()
+
+    async def _search_hedged_async(self, query, params):
+        hedge_delay = self.get_hedge_delay()
+        if hedge_delay is None:
+            return await self._search_basic_async(query, params)
+
+        hedge_params = deepcopy(params)
+        # {task: request parameters}, {id(request parameters): HTTP time}
+        tasks = {}
+        http_times = {}
+
+        async def search_basic(request_params):
+            # the task has its own copy of the context: its HTTP time is sent back with http_times
+            try:
+                return await self._search_basic_async(query, request_params)
+            finally:
+                http_times[id(request_params)] = poolrequests.get_time_for_thread() or 0
+
+        def get_result(task):
+            # HTTP total time of the request which has answered
+            poolrequests.add_time_for_thread(http_times.get(id(tasks[task]), 0))
+            return task.result()
+
+        def create_task(request_params):
+            task = asyncio.ensure_future(search_basic(request_params))
+            tasks[task] = request_params
+            return task
+
+        first = create_task(params)
+        pending = {first}
+        try:
+            remaining_time = poolrequests.get_remaining_time_for_thread()
+            if remaining_time is not None:
+                hedge_delay = min(hedge_delay, max(remaining_time, 0))
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return get_result(first)
+            remaining_time = poolrequests.get_remaining_time_for_thread()
+            if remaining_time is not None and remaining_time <= 0:
+                raise requests.exceptions.Timeout()
+
+            logger.debug('%s: hedged request after %.3f seconds', self.engine_name, hedge_delay)
+            pending.add(create_task(hedge_params))
+            while pending:
+                remaining_time = poolrequests.get_remaining_time_for_thread()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED,
+                                                   timeout=None if remaining_time is None else max(remaining_time, 0))
+                if not done:
+                    raise requests.exceptions.Timeout()
+                for task in done:
+                    if task.exception() is None or not pending:
+                        return get_result(task)
+        finally:
+            # cancel the slowest request, or both when the search is cancelled
+            for task in pending:
+                task.cancel()
 
     def search(self, query, params, result_container, start_time, timeout_limit):
         # set timeout for all HTTP requests
@@ -128,89 +360,113 @@ class OnlineProcessor(EngineProcessor):
         # reset the HTTP total time
         poolrequests.reset_time_for_thread()
 
-        # suppose everything will be alright
-        requests_exception = False
-        suspended_time = None
-
         try:
             # send requests and parse the results
-            search_results = self._search_basic(query, params)
-
-            # check if the engine accepted the request
-            if search_results is not None:
-                # yes, so add results
-                result_container.extend(self.engine_name, search_results)
-
-                # update engine time when there is no exception
-                engine_time = time() - start_time
-                page_load_time = poolrequests.get_time_for_thread()
-                result_container.add_timing(self.engine_name, engine_time, page_load_time)
-                with threading.RLock():
-                    self.engine.stats['engine_time'] += engine_time
-                    self.engine.stats['engine_time_count'] += 1
-                    # update stats with the total HTTP time
-                    self.engine.stats['page_load_time'] += page_load_time
-                    self.engine.stats['page_load_count'] += 1
+            search_results = self._search_hedged(query, params)
+            self._handle_results(search_results, result_container, start_time, timeout_limit)
         except Exception as e:
-            record_exception(self.engine_name, e)
+            self._handle_exception(e, result_container, start_time, timeout_limit)
 
-            # Timing
+    async def search_async(self, query, params, result_container, start_time, timeout_limit):
+        # the timeout and the HTTP total time are local to the asyncio task
+        poolrequests.set_timeout_for_thread(timeout_limit, start_time=start_time)
+        poolrequests.reset_time_for_thread()
+
+        try:
+            search_results = await self._search_hedged_async(query, params)
+            self._handle_results(search_results, result_container, start_time, timeout_limit)
+        except asyncio.CancelledError:
+            # the search has ended before this engine
+            record_error(self.engine_name, 'Timeout')
+            record_latency(self.engine_name, time() - start_time)
+            raise
+        except Exception as e:
+            self._handle_exception(e, result_container, start_time, timeout_limit)
+
+    def _handle_results(self, search_results, result_container, start_time, timeout_limit):
+        # check if the engine accepted the request
+        if search_results is not None:
+            # yes, so add results
+            result_container.extend(self.engine_name, search_results)
+
+            # update engine time when there is no exception
             engine_time = time() - start_time
             page_load_time = poolrequests.get_time_for_thread()
             result_container.add_timing(self.engine_name, engine_time, page_load_time)
+            histogram.record(self.engine_name, 'total', engine_time)
+            if page_load_time:
+                # not a result from the cache: the adaptive timeout and the hedge delay
+                # only take the requests sent to the engine
+                record_latency(self.engine_name, engine_time)
+                histogram.record(self.engine_name, 'http', page_load_time)
+            self.engine.stats.inc('engine_time', engine_time)
+            self.engine.stats.inc('engine_time_count')
+            # update stats with the total HTTP time
+            self.engine.stats.inc('page_load_time', page_load_time)
+            self.engine.stats.inc('page_load_count')
+
+        if time() - start_time > timeout_limit:
+            # the engine has answered after the end of the search
+            record_error(self.engine_name, 'Timeout')
+
+        # end the suspension
+        self.circuit_breaker.record_success()
+
+    def _handle_exception(self, e, result_container, start_time, timeout_limit):
+        # suppose everything will be alright
+        requests_exception = False
+        suspended_time = None
 
-            # Record the errors
-            with threading.RLock():
-                self.engine.stats['errors'] += 1
-
-            if (issubclass(e.__class__, requests.exceptions.Timeout)):
-                result_container.add_unresponsive_engine(self.engine_name, 'HTTP timeout')
-                # requests timeout (connect or read)
-                logger.error("engine {0} : HTTP requests timeout"
+        record_exception(self.engine_name, e)
+
+        # Timing
+        engine_time = time() - start_time
+        page_load_time = poolrequests.get_time_for_thread()
+        result_container.add_timing(self.engine_name, engine_time, page_load_time)
+
+        # Record the errors
+        self.engine.stats.inc('errors')
+
+        if (issubclass(e.__class__, requests.exceptions.Timeout)):
+            result_container.add_unresponsive_engine(self.engine_name, 'HTTP timeout')
+            # the engine has not answered within engine_time
+            record_latency(self.engine_name, engine_time)
+            histogram.record(self.engine_name, 'total', engine_time)
+            # requests timeout (connect or read)
+            logger.error("engine {0} : HTTP requests timeout"
+                         "(search duration : {1} s, timeout: {2} s) : {3}"
+                         .format(self.engine_name, engine_time, timeout_limit, e.__class__.__name__))
+            requests_exception = True
+        elif (issubclass(e.__class__, requests.exceptions.RequestException)):
+            result_container.add_unresponsive_engine(self.engine_name, 'HTTP error')
+            # other requests exception
+            logger.exception("engine {0} : requests exception"
                              "(search duration : {1} s, timeout: {2} s) : {3}"
-                             .format(self.engine_name, engine_time, timeout_limit, e.__class__.__name__))
-                requests_exception = True
-            elif (issubclass(e.__class__, requests.exceptions.RequestException)):
-                result_container.add_unresponsive_engine(self.engine_name, 'HTTP error')
-                # other requests exception
-                logger.exception("engine {0} : requests exception"
-                                 "(search duration : {1} s, timeout: {2} s) : {3}"
-                                 .format(self.engine_name, engine_time, timeout_limit, e))
-                requests_exception = True
-            elif (issubclass(e.__class__, SearxEngineCaptchaException)):
-                result_container.add_unresponsive_engine(self.engine_name, 'CAPTCHA required')
-                logger.exception('engine {0} : CAPTCHA'.format(self.engine_name))
-                suspended_time = e.suspended_time  # pylint: disable=no-member
-            elif (issubclass(e.__class__, SearxEngineTooManyRequestsException)):
-                result_container.add_unresponsive_engine(self.engine_name, 'too many requests')
-                logger.exception('engine {0} : Too many requests'.format(self.engine_name))
-                suspended_time = e.suspended_time  # pylint: disable=no-member
-            elif (issubclass(e.__class__, SearxEngineAccessDeniedException)):
-                result_container.add_unresponsive_engine(self.engine_name, 'blocked')
-                logger.exception('engine {0} : Searx is blocked'.format(self.engine_name))
-                suspended_time = e.suspended_time  # pylint: disable=no-member
-            else:
-                result_container.add_unresponsive_engine(self.engine_name, 'unexpected crash')
-                # others errors
-                logger.exception('engine {0} : exception : {1}'.format(self.engine_name, e))
+                             .format(self.engine_name, engine_time, timeout_limit, e))
+            requests_exception = True
+        elif (issubclass(e.__class__, SearxEngineCaptchaException)):
+            result_container.add_unresponsive_engine(self.engine_name, 'CAPTCHA required')
+            logger.exception('engine {0} : CAPTCHA'.format(self.engine_name))
+            suspended_time = e.suspended_time  # pylint: disable=no-member
+        elif (issubclass(e.__class__, SearxEngineTooManyRequestsException)):
+            result_container.add_unresponsive_engine(self.engine_name, 'too many requests')
+            logger.exception('engine {0} : Too many requests'.format(self.engine_name))
+            suspended_time = e.suspended_time  # pylint: disable=no-member
+        elif (issubclass(e.__class__, SearxEngineAccessDeniedException)):
+            result_container.add_unresponsive_engine(self.engine_name, 'blocked')
+            logger.exception('engine {0} : Searx is blocked'.format(self.engine_name))
+            suspended_time = e.suspended_time  # pylint: disable=no-member
         else:
-            if getattr(threading.current_thread(), '_timeout', False):
-                record_error(self.engine_name, 'Timeout')
+            result_container.add_unresponsive_engine(self.engine_name, 'unexpected crash')
+            # others errors
+            logger.exception('engine {0} : exception : {1}'.format(self.engine_name, e))
 
         # suspend the engine if there is an HTTP error
         # or suspended_time is defined
-        with threading.RLock():
-            if requests_exception or suspended_time:
-                # update continuous_errors / suspend_end_time
-                self.engine.continuous_errors += 1
-                if suspended_time is None:
-                    suspended_time = min(settings['search']['max_ban_time_on_fail'],
-                                         self.engine.continuous_errors * settings['search']['ban_time_on_fail'])
-                self.engine.suspend_end_time = time() + suspended_time
-            else:
-                # reset the suspend variables
-                self.engine.continuous_errors = 0
-                self.engine.suspend_end_time = 0
+        if requests_exception or suspended_time:
+            self.circuit_breaker.record_failure(suspended_time)
+        else:
+            self.circuit_breaker.record_success()
 
     def get_default_tests(self):
         tests = {}
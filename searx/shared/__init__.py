@@ -4,6 +4,11 @@ import logging
 
 logger = logging.getLogger('searx.shared')
 
+# uwsgi cache of the search results (see searx.search.cache), separated from the counters and the states
+RESULTS_CACHE_NAME = 'searxresults'
+# SharedDict of the search results, None without this uwsgi cache
+results_storage = None
+
 try:
     import uwsgi
 except:
@@ -18,14 +23,20 @@ else:
     except:
         # uwsgi.ini configuration problem: disable all scheduling
         logger.error('uwsgi.ini configuration error, add this line to your uwsgi.ini\n'
-                     'cache2 = name=searxcache,items=2000,blocks=2000,blocksize=4096,bitmap=1')
+                     'cache2 = name=searxcache,items=16000,blocks=24000,blocksize=1024,bitmap=1')
         from .shared_simple import SimpleSharedDict as SharedDict
 
-        def schedule(delay, func, *args):
+        def schedule(delay, func, *args, all_workers=False):
             return False
     else:
         # uwsgi
         from .shared_uwsgi import UwsgiCacheSharedDict as SharedDict, schedule
         logger.info('Use shared_uwsgi implementation')
+        try:
+            uwsgi.cache_update('dummy', b'dummy', 0, RESULTS_CACHE_NAME)
+        except:
+            logger.info('no uwsgi cache %s: the result cache is local to each worker', RESULTS_CACHE_NAME)
+        else:
+            results_storage = SharedDict(RESULTS_CACHE_NAME)
 
 storage = SharedDict()
@@ -19,3 +19,31 @@ class SharedDict(ABC):
     @abstractmethod
     def set_str(self, key, value):
         pass
+
+    @abstractmethod
+    def get_bytes(self, key):
+        pass
+
+    @abstractmethod
+    def set_bytes(self, key, value, expire=0):
+        """Store value, remove it after expire seconds (0: never)"""
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def inc(self, key, value=1):
+        """Atomically add value (an int) to the counter key, create the counter if needed"""
+        pass
+
+    @abstractmethod
+    def get_counter(self, key):
+        """Return the value of the counter key, 0 if it doesn't exist"""
+        pass
+
+    @abstractmethod
+    def lock(self):
+        """Return a context manager: one process (and one thread) at a time holds the lock"""
+        pass
@@ -1,16 +1,18 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
 import threading
+import time
 
 from . import shared_abstract
 
 
 class SimpleSharedDict(shared_abstract.SharedDict):
 
-    __slots__ = 'd',
+    __slots__ = 'd', '_lock'
 
     def __init__(self):
         self.d = {}
+        self._lock = threading.RLock()
 
     def get_int(self, key):
         return self.d.get(key, None)
@@ -24,8 +26,31 @@ class SimpleSharedDict(shared_abstract.SharedDict):
     def set_str(self, key, value):
         self.d[key] = value
 
+    def get_bytes(self, key):
+        value, expire_time = self.d.get(key, (None, None))
+        if expire_time and expire_time < time.time():
+            self.d.pop(key, None)
+            return None
+        return value
 
-def schedule(delay, func, *args):
+    def set_bytes(self, key, value, expire=0):
+        self.d[key] = (value, time.time() + expire if expire else None)
+
+    def delete(self, key):
+        self.d.pop(key, None)
+
+    def inc(self, key, value=1):
+        with self._lock:
+            self.d[key] = self.d.get(key, 0) + value
+
+    def get_counter(self, key):
+        return self.d.get(key, 0)
+
+    def lock(self):
+        return self._lock
+
+
+def schedule(delay, func, *args, all_workers=False):  # pylint: disable=unused-argument
     def call_later():
         t = threading.Timer(delay, wrapper)
         t.daemon = True
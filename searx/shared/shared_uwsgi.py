@@ -1,8 +1,9 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
 import time
+from contextlib import contextmanager
 import uwsgi  # pylint: disable=E0401
-from . import shared_abstract
+from . import shared_abstract, shared_simple
 
 
 _last_signal = 10
@@ -10,8 +11,14 @@ _last_signal = 10
 
 class UwsgiCacheSharedDict(shared_abstract.SharedDict):
 
+    __slots__ = '_cache_args',
+
+    def __init__(self, cache_name=None):
+        # no cache_name: the first cache2 of uwsgi.ini
+        self._cache_args = (cache_name, ) if cache_name else ()
+
     def get_int(self, key):
-        value = uwsgi.cache_get(key)
+        value = uwsgi.cache_get(key, *self._cache_args)
         if value is None:
             return value
         else:
@@ -19,10 +26,10 @@ class UwsgiCacheSharedDict(shared_abstract.SharedDict):
 
     def set_int(self, key, value):
         b = value.to_bytes(4, 'big')
-        uwsgi.cache_update(key, b)
+        uwsgi.cache_update(key, b, 0, *self._cache_args)
 
     def get_str(self, key):
-        value = uwsgi.cache_get(key)
+        value = uwsgi.cache_get(key, *self._cache_args)
         if value is None:
             return value
         else:
@@ -30,18 +37,49 @@ class UwsgiCacheSharedDict(shared_abstract.SharedDict):
 
     def set_str(self, key, value):
         b = value.encode('utf-8')
-        uwsgi.cache_update(key, b)
+        uwsgi.cache_update(key, b, 0, *self._cache_args)
+
+    def get_bytes(self, key):
+        return uwsgi.cache_get(key, *self._cache_args)
+
+    def set_bytes(self, key, value, expire=0):
+        uwsgi.cache_update(key, value, expire, *self._cache_args)
+
+    def delete(self, key):
+        uwsgi.cache_del(key, *self._cache_args)
+
+    def inc(self, key, value=1):
+        # the value is a 64 bits integer, the uwsgi cache locks itself
+        uwsgi.cache_inc(key, value, 0, *self._cache_args)
+
+    def get_counter(self, key):
+        return uwsgi.cache_num(key, *self._cache_args) or 0
 
+    @contextmanager
+    def lock(self):
+        uwsgi.lock()
+        try:
+            yield
+        finally:
+            uwsgi.unlock()
 
-def schedule(delay, func, *args):
+
+def schedule(delay, func, *args, all_workers=False):
     """
     Can be implemented using a spooler.
     https://uwsgi-docs.readthedocs.io/en/latest/PythonDecorators.html
 
     To make the uwsgi configuration simple, use the alternative implementation.
+
+    all_workers=True: func is called in each worker (for example to maintain a state
+    local to the process), not in one worker of the instance.  Since the application
+    is loaded by each worker (lazy-apps), a thread of each worker calls func.
     """
     global _last_signal
 
+    if all_workers:
+        return shared_simple.schedule(delay, func, *args)
+
     def sighandler(signum):
         now = int(time.time())
         key = 'scheduler_call_time_signal_' + str(signum)
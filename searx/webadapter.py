@@ -5,6 +5,7 @@ from searx.query import RawTextQuery
 from searx.engines import categories, engines
 from searx.search import SearchQuery, EngineRef
 from searx.preferences import Preferences, is_locked
+from searx.metrology.spans import span
 
 
 # remove duplicate queries.
@@ -207,7 +208,8 @@ def get_search_query_from_webapp(preferences: Preferences, form: Dict[str, str])
 
     # parse query, if tags are set, which change
     # the serch engine or search-language
-    raw_text_query = RawTextQuery(form['q'], disabled_engines)
+    with span('raw_text_query'):
+        raw_text_query = RawTextQuery(form['q'], disabled_engines)
 
     # set query
     query = raw_text_query.getQuery()
@@ -29,6 +29,7 @@ if __name__ == '__main__':
 import hashlib
 import hmac
 import json
+import mimetypes
 import os
 
 import requests
@@ -36,6 +37,7 @@ import requests
 from searx import logger
 logger = logger.getChild('webapp')
 
+from collections import namedtuple
 from datetime import datetime, timedelta
 from time import time
 from html import escape
@@ -49,7 +51,7 @@ from pygments.formatters import HtmlFormatter  # pylint: disable=no-name-in-modu
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask import (
     Flask, request, render_template, url_for, Response, make_response,
-    redirect, send_from_directory
+    redirect, send_from_directory, stream_with_context
 )
 from babel.support import Translations
 import flask_babel
@@ -60,27 +62,34 @@ from searx import brand, static_path
 from searx import settings, searx_dir, searx_debug
 from searx.exceptions import SearxParameterException
 from searx.engines import (
-    categories, engines, engine_shortcuts, get_engines_stats
+    categories, engines, engine_shortcuts, get_engines_stats, get_engines_version
 )
 from searx.webutils import (
     UnicodeWriter, highlight_content, get_resources_directory,
-    get_static_files, get_result_templates, get_themes,
+    get_static_files, get_result_templates, get_themes, SharedFileSystemBytecodeCache, precompile_templates,
+    get_hashed_static_files, get_precompressed_static_files,
     prettify_url, new_hmac, is_flask_run_cmdline
 )
 from searx.webadapter import get_search_query_from_webapp, get_selected_categories
 from searx.utils import html_to_text, gen_useragent, dict_subset, match_language
 from searx.version import VERSION_STRING
 from searx.languages import language_codes as languages
-from searx.search import SearchWithPlugins, initialize as search_initialize
+from searx.search import SearchWithPlugins, initialize as search_initialize, get_executor_stats
 from searx.search.checker import get_result as checker_get_result
+from searx.results import ResultContainer
 from searx.query import RawTextQuery
 from searx.autocomplete import searx_bang, backends as autocomplete_backends
 from searx.plugins import plugins
 from searx.plugins.oa_doi_rewrite import get_doi_resolver
-from searx.preferences import Preferences, ValidationException, LANGUAGE_CODES
+from searx.preferences import Preferences, PreferencesCache, ValidationException, LANGUAGE_CODES
 from searx.answerers import answerers
-from searx.poolrequests import get_global_proxies
-from searx.metrology.error_recorder import errors_per_engines
+from searx.poolrequests import get_global_proxies, get_pool_stats
+from searx.metrology.error_recorder import get_errors_per_engines
+from searx.metrology.histogram import get_percentiles, METRICS as LATENCY_METRICS
+from searx.metrology import prometheus
+from searx.metrology.spans import span, start_trace, get_trace
+from searx.metrology import profiler
+from searx import compression
 
 # serve pages with HTTP/1.1
 from werkzeug.serving import WSGIRequestHandler
@@ -95,6 +104,18 @@ if not searx_debug and settings['server']['secret_key'] == 'ultrasecretkey':
 static_path = get_resources_directory(searx_dir, 'static', settings['ui']['static_path'])
 logger.debug('static directory is %s', static_path)
 static_files = get_static_files(static_path)
+# {filename: filename with the hash of the content} and the reverse
+if settings['ui'].get('static_use_hash', False):
+    static_hashed_files = get_hashed_static_files(static_path, static_files)
+else:
+    static_hashed_files = {}
+static_original_files = {hashed: filename for filename, hashed in static_hashed_files.items()}
+# {filename: [(Content-Encoding, suffix), ...]}, see utils/compress_static.py
+static_precompressed_files = get_precompressed_static_files(static_path, static_files)
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# send the head of the result page before the search (see stream_render)
+stream_html = settings['ui'].get('stream_html', False)
 
 # about templates
 default_theme = settings['ui']['default_theme']
@@ -119,6 +140,10 @@ app = Flask(
 app.jinja_env.trim_blocks = True
 app.jinja_env.lstrip_blocks = True
 app.jinja_env.add_extension('jinja2.ext.loopcontrols')  # pylint: disable=no-member
+templates_cache_directory = settings['ui'].get('templates_cache_directory')
+if templates_cache_directory:
+    os.makedirs(templates_cache_directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = SharedFileSystemBytecodeCache(templates_cache_directory)
 app.secret_key = settings['server']['secret_key']
 
 # see https://flask.palletsprojects.com/en/1.1.x/cli/
@@ -136,10 +161,16 @@ werkzeug_reloader = flask_run_development or (searx_debug and __name__ == "__mai
 # initialize the engines except on the first run of the werkzeug server.
 if not werkzeug_reloader\
    or (werkzeug_reloader and os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
-    search_initialize(enable_checker=True)
+    search_initialize(enable_checker=True, enable_prewarm=True)
 
 babel = Babel(app)
 
+# the preferences parsed from the cookies
+preferences_cache = PreferencesCache(lambda: Preferences(themes, list(categories.keys()), engines, plugins))
+
+# one JSON line per request with the duration of each stage
+trace_logger = logger.getChild('trace') if settings['server'].get('trace_log', False) else None
+
 rtl_locales = ['ar', 'arc', 'bcc', 'bqi', 'ckb', 'dv', 'fa', 'fa_IR', 'glk', 'he',
                'ku', 'mzn', 'pnb', 'ps', 'sd', 'ug', 'ur', 'yi']
 
@@ -306,6 +337,7 @@ def url_for_theme(endpoint, override_theme=None, **values):
         filename_with_theme = "themes/{}/{}".format(theme_name, values['filename'])
         if filename_with_theme in static_files:
             values['filename'] = filename_with_theme
+        values['filename'] = static_hashed_files.get(values['filename'], values['filename'])
     url = url_for(endpoint, **values)
     if settings['server']['base_url']:
         if url.startswith('/'):
@@ -359,17 +391,52 @@ def image_proxify(url):
                             urlencode(dict(url=url.encode(), h=h)))
 
 
-def render(template_name, override_theme=None, **kwargs):
-    disabled_engines = request.preferences.engines.get_disabled()
+# the part of the template context which depends only on the preferences, see get_render_context
+RenderContext = namedtuple('RenderContext', ['categories', 'scripts', 'styles', 'opensearch_url'])
+RENDER_CONTEXT_CACHE_SIZE = 1000
+# {(engines version, script root, method, autocomplete, engines, plugins): RenderContext}
+_render_contexts = {}
 
+
+def get_render_context(preferences, user_plugins):
+    """Return the RenderContext of the preferences and the plugins of the user.
+
+    The enabled categories go through all the engines: the context is computed once for each combination of
+    preferences, then read from a cache which is cleared when the engines are loaded again.
+    """
+    method = preferences.get_value('method')
+    autocomplete = preferences.get_value('autocomplete')
+    key = (get_engines_version(), request.script_root, method, autocomplete,
+           frozenset(preferences.engines.disabled), frozenset(preferences.engines.enabled),
+           tuple(plugin.id for plugin in user_plugins))
+    render_context = _render_contexts.get(key)
+    if render_context is not None:
+        return render_context
+
+    disabled_engines = set(preferences.engines.get_disabled())
     enabled_categories = set(category for engine_name in engines
                              for category in engines[engine_name].categories
                              if (engine_name, category) not in disabled_engines)
+    categories_list = tuple(x for x in _get_ordered_categories() if x in enabled_categories)
+
+    scripts = tuple(dict.fromkeys(script for plugin in user_plugins for script in plugin.js_dependencies))
+    styles = tuple(dict.fromkeys(css for plugin in user_plugins for css in plugin.css_dependencies))
+
+    opensearch_url = url_for('opensearch') + '?' + urlencode({'method': method, 'autocomplete': autocomplete})
+
+    render_context = RenderContext(categories_list, scripts, styles, opensearch_url)
+    if len(_render_contexts) >= RENDER_CONTEXT_CACHE_SIZE:
+        _render_contexts.clear()
+    _render_contexts[key] = render_context
+    return render_context
+
+
+def _get_render_args(template_name, override_theme=None, **kwargs):
+    """Return the path of the template and its arguments (see render)"""
+    render_context = get_render_context(request.preferences, request.user_plugins)
 
     if 'categories' not in kwargs:
-        kwargs['categories'] = [x for x in
-                                _get_ordered_categories()
-                                if x in enabled_categories]
+        kwargs['categories'] = render_context.categories
 
     if 'autocomplete' not in kwargs:
         kwargs['autocomplete'] = request.preferences.get_value('autocomplete')
@@ -397,8 +464,7 @@ def render(template_name, override_theme=None, **kwargs):
 
     kwargs['proxify'] = proxify if settings.get('result_proxy', {}).get('url') else None
 
-    kwargs['opensearch_url'] = url_for('opensearch') + '?' \
-        + urlencode({'method': kwargs['method'], 'autocomplete': kwargs['autocomplete']})
+    kwargs['opensearch_url'] = render_context.opensearch_url
 
     kwargs['get_result_template'] = get_result_template
 
@@ -418,19 +484,52 @@ def render(template_name, override_theme=None, **kwargs):
 
     kwargs['brand'] = brand
 
-    kwargs['scripts'] = set()
+    kwargs['scripts'] = render_context.scripts
+    kwargs['styles'] = render_context.styles
     kwargs['endpoint'] = 'results' if 'q' in kwargs else request.endpoint
-    for plugin in request.user_plugins:
-        for script in plugin.js_dependencies:
-            kwargs['scripts'].add(script)
 
-    kwargs['styles'] = set()
-    for plugin in request.user_plugins:
-        for css in plugin.css_dependencies:
-            kwargs['styles'].add(css)
+    return '{}/{}'.format(kwargs['theme'], template_name), kwargs
 
-    return render_template(
-        '{}/{}'.format(kwargs['theme'], template_name), **kwargs)
+
+def render(template_name, override_theme=None, **kwargs):
+    template_path, kwargs = _get_render_args(template_name, override_theme, **kwargs)
+    with span('render'):
+        return render_template(template_path, **kwargs)
+
+
+# the streamed page is sent until this tag before the search (see stream_render)
+STREAM_HTML_MARKER = '<body'
+
+
+def stream_render(template_name, get_late_args, **kwargs):
+    """Same as render(...), but the page is streamed: the beginning of the page until
+    STREAM_HTML_MARKER is sent, then get_late_args() is called and returns the other
+    arguments of the template (the results).  The browser loads the CSS and the
+    JavaScript files meanwhile.
+
+    The template must not use the arguments of get_late_args() before STREAM_HTML_MARKER.
+    """
+    template_path, kwargs = _get_render_args(template_name, **kwargs)
+    app.update_template_context(kwargs)
+    template = app.jinja_env.get_template(template_path)
+    # Jinja reads the arguments from the context when they are used:
+    # the late arguments are added once the head of the page is rendered.
+    context = template.new_context(kwargs)
+
+    def generate():
+        events = template.root_render_func(context)
+        head = []
+        for event in events:
+            head.append(event)
+            if STREAM_HTML_MARKER in event:
+                break
+        yield ''.join(head)
+        context.parent.update(get_late_args())
+        with span('render'):
+            body = ''.join(events)
+        yield body
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
 
 
 def _get_ordered_categories():
@@ -439,26 +538,61 @@ def _get_ordered_categories():
         ordered_categories = ['general']
         ordered_categories.extend(x for x in sorted(categories.keys()) if x != 'general')
         return ordered_categories
-    ordered_categories = settings['ui']['categories_order']
+    ordered_categories = list(settings['ui']['categories_order'])
     ordered_categories.extend(x for x in sorted(categories.keys()) if x not in ordered_categories)
     return ordered_categories
 
 
+@app.endpoint('static')
+def static(filename):
+    """Static files: the precompressed version if the browser accepts it, forever in the cache if the URL
+    contains the hash of the content"""
+    original_filename = static_original_files.get(filename)
+    if original_filename is not None:
+        filename = original_filename
+
+    response = None
+    precompressed_encodings = static_precompressed_files.get(filename)
+    if precompressed_encodings:
+        for encoding, suffix in precompressed_encodings:
+            if encoding in request.accept_encodings:
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_from_directory(static_path, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+    if response is None:
+        response = send_from_directory(static_path, filename)
+    if precompressed_encodings:
+        response.vary.add('Accept-Encoding')
+
+    if original_filename is not None:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
 @app.before_request
 def pre_request():
     request.start_time = time()
     request.timings = []
     request.errors = []
+    start_trace()
+    if profiler.is_enabled() and profiler.should_profile(request.endpoint, request.headers):
+        request.profile = profiler.start()
+
+    with span('preferences'):
+        _parse_preferences()
+
 
-    preferences = Preferences(themes, list(categories.keys()), engines, plugins)
+def _parse_preferences():
+    preferences, invalid_cookies = preferences_cache.get(request.cookies)
+    if invalid_cookies:
+        request.errors.append(gettext('Invalid settings, please edit your preferences'))
     user_agent = request.headers.get('User-Agent', '').lower()
     if 'webkit' in user_agent and 'android' in user_agent:
         preferences.key_value_settings['method'].value = 'GET'
     request.preferences = preferences
-    try:
-        preferences.parse_dict(request.cookies)
-    except:
-        request.errors.append(gettext('Invalid settings, please edit your preferences'))
 
     # merge GET, POST vars
     # request.form
@@ -513,10 +647,33 @@ def post_request(response):
         timings_load = ['load_' + str(i) + '_' + v['engine'] +
                         ';dur=' + str(round(v['load'] * 1000, 3)) for i, v in enumerate(timings)]
         timings_all = timings_all + timings_total + timings_load
+    trace = get_trace()
+    if trace is not None:
+        timings_all += trace.get_server_timing()
+        if trace_logger is not None:
+            trace_logger.info(json.dumps({
+                'endpoint': request.endpoint,
+                'path': request.path,
+                'status': response.status_code,
+                'total': round(total_time, 6),
+                'spans': trace.to_dict(),
+                'engines': {timing['engine']: {'total': round(timing['total'], 6), 'load': round(timing['load'], 6)}
+                            for timing in request.timings},
+            }))
     response.headers.add('Server-Timing', ', '.join(timings_all))
+    prometheus.record_request(request.endpoint or 'unknown', total_time)
+    if compression.enabled:
+        response = compression.compress_response(response, request.accept_encodings)
     return response
 
 
+@app.teardown_request
+def stop_profile(exception):  # pylint: disable=unused-argument
+    profile = getattr(request, 'profile', None)
+    if profile is not None:
+        profiler.stop(profile, request.endpoint)
+
+
 def index_error(output_format, error_message):
     if output_format == 'json':
         return Response(json.dumps({'error': error_message}),
@@ -565,11 +722,119 @@ def index():
     )
 
 
+# streamed output of format=json, selected with the Accept header
+stream_mimetypes = {
+    'application/x-ndjson': 'ndjson',
+    'text/event-stream': 'sse',
+}
+
+
+def _get_stream_mimetype(output_format):
+    if output_format != 'json':
+        return None
+    mimetype = request.accept_mimetypes.best_match(list(stream_mimetypes) + ['application/json'])
+    return mimetype if mimetype in stream_mimetypes else None
+
+
+def _json_default(item):
+    return list(item) if isinstance(item, set) else item
+
+
+def _format_result(result, output_format, search_query):
+    if output_format == 'html':
+        if 'content' in result and result['content']:
+            result['content'] = highlight_content(escape(result['content'][:1024]), search_query.query)
+        if 'title' in result and result['title']:
+            result['title'] = highlight_content(escape(result['title'] or ''), search_query.query)
+    else:
+        if result.get('content'):
+            result['content'] = html_to_text(result['content']).strip()
+        # removing html content and whitespace duplications
+        result['title'] = ' '.join(html_to_text(result['title']).strip().split())
+
+    if 'url' in result:
+        result['pretty_url'] = prettify_url(result['url'])
+
+    # TODO, check if timezone is calculated right
+    if 'publishedDate' in result:
+        try:  # test if publishedDate >= 1900 (datetime module bug)
+            result['pubdate'] = result['publishedDate'].strftime('%Y-%m-%d %H:%M:%S%z')
+        except ValueError:
+            result['publishedDate'] = None
+        else:
+            if result['publishedDate'].replace(tzinfo=None) >= datetime.now() - timedelta(days=1):
+                timedifference = datetime.now() - result['publishedDate'].replace(tzinfo=None)
+                minutes = int((timedifference.seconds / 60) % 60)
+                hours = int(timedifference.seconds / 60 / 60)
+                if hours == 0:
+                    result['publishedDate'] = gettext('{minutes} minute(s) ago').format(minutes=minutes)
+                else:
+                    result['publishedDate'] = gettext('{hours} hour(s), {minutes} minute(s) ago').format(hours=hours, minutes=minutes)  # noqa
+            else:
+                result['publishedDate'] = format_date(result['publishedDate'])
+
+
+def _get_number_of_results(result_container):
+    number_of_results = result_container.results_number()
+    if number_of_results < result_container.results_length():
+        number_of_results = 0
+    return number_of_results
+
+
+def _get_json_response(search_query, result_container, results, number_of_results):
+    return {'query': search_query.query,
+            'number_of_results': number_of_results,
+            'results': results,
+            'answers': list(result_container.answers),
+            'corrections': list(result_container.corrections),
+            'infoboxes': result_container.infoboxes,
+            'suggestions': list(result_container.suggestions),
+            'unresponsive_engines': __get_translated_errors(result_container.unresponsive_engines)}
+
+
+def _stream_frame(stream_format, frame_type, frame):
+    frame['type'] = frame_type
+    data = json.dumps(frame, default=_json_default)
+    if stream_format == 'sse':
+        return 'event: {0}\ndata: {1}\n\n'.format(frame_type, data)
+    return data + '\n'
+
+
+def _stream_search(search, stream_format):
+    """Yield one frame for each engine with its new results (not ordered, processed by the plugins),
+    then the final frame which is the same as the JSON output."""
+    search_query = search.search_query
+    sent_count = 0
+    try:
+        for engine_name in search.search_iter():
+            # copies: the plugins are called again on the merged results before the final frame
+            results = search.result_container.get_unordered_results(sent_count)
+            sent_count += len(results)
+            for result in results:
+                search.on_result(result)
+                _format_result(result, 'json', search_query)
+            yield _stream_frame(stream_format, 'engine', {'engine': engine_name, 'results': results})
+
+        result_container = search.result_container
+        results = result_container.get_ordered_results()
+        for result in results:
+            _format_result(result, 'json', search_query)
+        number_of_results = _get_number_of_results(result_container)
+        yield _stream_frame(stream_format, 'final',
+                            _get_json_response(search_query, result_container, results, number_of_results))
+    except Exception:
+        logger.exception('search error')
+        yield _stream_frame(stream_format, 'error', {'error': gettext('search error')})
+
+
 @app.route('/search', methods=['GET', 'POST'])
 def search():
     """Search query in q and return results.
 
     Supported outputs: html, json, csv, rss.
+
+    The json output is streamed when the Accept header is application/x-ndjson
+    or text/event-stream.
     """
 
     # output_format
@@ -593,10 +858,19 @@ def search():
     raw_text_query = None
     result_container = None
     try:
-        search_query, raw_text_query, _, _ = get_search_query_from_webapp(request.preferences, request.form)
+        with span('search_query'):
+            search_query, raw_text_query, _, _ = get_search_query_from_webapp(request.preferences, request.form)
         # search = Search(search_query) #  without plugins
         search = SearchWithPlugins(search_query, request.user_plugins, request)
 
+        # an external bang is a redirect, not a stream
+        stream_mimetype = _get_stream_mimetype(output_format)
+        if stream_mimetype and not search_query.external_bang:
+            return Response(stream_with_context(_stream_search(search, stream_mimetypes[stream_mimetype])),
+                            mimetype=stream_mimetype)
+        if output_format == 'html' and stream_html and not search_query.external_bang:
+            return _stream_html_search(search, raw_text_query)
+
         result_container = search.search()
 
     except SearxParameterException as e:
@@ -606,63 +880,25 @@ def search():
         logger.exception('search error')
         return index_error(output_format, gettext('search error')), 500
 
-    # results
-    results = result_container.get_ordered_results()
-    number_of_results = result_container.results_number()
-    if number_of_results < result_container.results_length():
-        number_of_results = 0
-
     # checkin for a external bang
     if result_container.redirect_url:
         return redirect(result_container.redirect_url)
 
+    # results
+    results = result_container.get_ordered_results()
+    number_of_results = _get_number_of_results(result_container)
+
     # Server-Timing header
     request.timings = result_container.get_timings()
 
     # output
-    for result in results:
-        if output_format == 'html':
-            if 'content' in result and result['content']:
-                result['content'] = highlight_content(escape(result['content'][:1024]), search_query.query)
-            if 'title' in result and result['title']:
-                result['title'] = highlight_content(escape(result['title'] or ''), search_query.query)
-        else:
-            if result.get('content'):
-                result['content'] = html_to_text(result['content']).strip()
-            # removing html content and whitespace duplications
-            result['title'] = ' '.join(html_to_text(result['title']).strip().split())
-
-        if 'url' in result:
-            result['pretty_url'] = prettify_url(result['url'])
-
-        # TODO, check if timezone is calculated right
-        if 'publishedDate' in result:
-            try:  # test if publishedDate >= 1900 (datetime module bug)
-                result['pubdate'] = result['publishedDate'].strftime('%Y-%m-%d %H:%M:%S%z')
-            except ValueError:
-                result['publishedDate'] = None
-            else:
-                if result['publishedDate'].replace(tzinfo=None) >= datetime.now() - timedelta(days=1):
-                    timedifference = datetime.now() - result['publishedDate'].replace(tzinfo=None)
-                    minutes = int((timedifference.seconds / 60) % 60)
-                    hours = int(timedifference.seconds / 60 / 60)
-                    if hours == 0:
-                        result['publishedDate'] = gettext('{minutes} minute(s) ago').format(minutes=minutes)
-                    else:
-                        result['publishedDate'] = gettext('{hours} hour(s), {minutes} minute(s) ago').format(hours=hours, minutes=minutes)  # noqa
-                else:
-                    result['publishedDate'] = format_date(result['publishedDate'])
+    with span('format'):
+        for result in results:
+            _format_result(result, output_format, search_query)
 
     if output_format == 'json':
-        return Response(json.dumps({'query': search_query.query,
-                                    'number_of_results': number_of_results,
-                                    'results': results,
-                                    'answers': list(result_container.answers),
-                                    'corrections': list(result_container.corrections),
-                                    'infoboxes': result_container.infoboxes,
-                                    'suggestions': list(result_container.suggestions),
-                                    'unresponsive_engines': __get_translated_errors(result_container.unresponsive_engines)},  # noqa
-                                   default=lambda item: list(item) if isinstance(item, set) else item),
+        return Response(json.dumps(_get_json_response(search_query, result_container, results, number_of_results),
+                                   default=_json_default),
                         mimetype='application/json')
     elif output_format == 'csv':
         csv = UnicodeWriter(StringIO())
@@ -702,7 +938,32 @@ def search():
         return Response(response_rss, mimetype='text/xml')
 
     # HTML output format
+    return render(
+        'results.html',
+        **_get_html_query_args(search_query),
+        **_get_html_results_args(raw_text_query, result_container, results, number_of_results)
+    )
 
+
+def _get_html_query_args(search_query):
+    """Arguments of results.html known before the search"""
+    return {
+        'q': request.form['q'],
+        'selected_categories': search_query.categories,
+        'pageno': search_query.pageno,
+        'time_range': search_query.time_range,
+        'current_language': match_language(search_query.lang,
+                                           LANGUAGE_CODES,
+                                           fallback=request.preferences.get_value("language")),
+        'base_url': get_base_url(),
+        'theme': get_current_theme_name(),
+        'favicons': global_favicons[themes.index(get_current_theme_name())],
+        'timeout_limit': request.form.get('timeout_limit', None),
+    }
+
+
+def _get_html_results_args(raw_text_query, result_container, results, number_of_results):
+    """Arguments of results.html from the search"""
     # suggestions: use RawTextQuery to get the suggestion URLs with the same bang
     suggestion_urls = list(map(lambda suggestion: {
                                'url': raw_text_query.changeQuery(suggestion).getFullQuery(),
@@ -715,29 +976,41 @@ def search():
                                'title': correction
                                },
                                result_container.corrections))
-    #
-    return render(
-        'results.html',
-        results=results,
-        q=request.form['q'],
-        selected_categories=search_query.categories,
-        pageno=search_query.pageno,
-        time_range=search_query.time_range,
-        number_of_results=format_decimal(number_of_results),
-        suggestions=suggestion_urls,
-        answers=result_container.answers,
-        corrections=correction_urls,
-        infoboxes=result_container.infoboxes,
-        paging=result_container.paging,
-        unresponsive_engines=__get_translated_errors(result_container.unresponsive_engines),
-        current_language=match_language(search_query.lang,
-                                        LANGUAGE_CODES,
-                                        fallback=request.preferences.get_value("language")),
-        base_url=get_base_url(),
-        theme=get_current_theme_name(),
-        favicons=global_favicons[themes.index(get_current_theme_name())],
-        timeout_limit=request.form.get('timeout_limit', None)
-    )
+
+    return {
+        'results': results,
+        'number_of_results': format_decimal(number_of_results),
+        'suggestions': suggestion_urls,
+        'answers': result_container.answers,
+        'corrections': correction_urls,
+        'infoboxes': result_container.infoboxes,
+        'paging': result_container.paging,
+        'unresponsive_engines': __get_translated_errors(result_container.unresponsive_engines),
+    }
+
+
+def _stream_html_search(search, raw_text_query):
+    """Stream results.html: the head of the page is sent before the search (see stream_render).
+
+    The results are sent once all the engines have answered (they are ordered at the end): the
+    response status is 200 even if the search fails, the error is displayed in the page."""
+    search_query = search.search_query
+
+    def get_results_args():
+        try:
+            result_container = search.search()
+        except Exception:
+            logger.exception('search error')
+            request.errors.append(gettext('search error'))
+            result_container = ResultContainer()
+        results = result_container.get_ordered_results()
+        with span('format'):
+            for result in results:
+                _format_result(result, 'html', search_query)
+        return _get_html_results_args(raw_text_query, result_container, results,
+                                      _get_number_of_results(result_container))
+
+    return stream_render('results.html', get_results_args, **_get_html_query_args(search_query))
 
 
 def __get_translated_errors(unresponsive_engines):
@@ -952,6 +1225,7 @@ def stats():
 @app.route('/stats/errors', methods=['GET'])
 def stats_errors():
     result = {}
+    errors_per_engines = get_errors_per_engines(engines.keys())
     engine_names = list(errors_per_engines.keys())
     engine_names.sort()
     for engine_name in engine_names:
@@ -977,6 +1251,30 @@ def stats_errors():
     return jsonify(result)
 
 
+@app.route('/stats/latency', methods=['GET'])
+def stats_latency():
+    result = {}
+    for engine_name in sorted(engines.keys()):
+        engine_latency = {metric: get_percentiles(engine_name, metric) for metric in LATENCY_METRICS}
+        if any(percentiles['count'] for percentiles in engine_latency.values()):
+            result[engine_name] = engine_latency
+    return jsonify(result)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(prometheus.get_metrics(engines, list(app.view_functions.keys()) + ['unknown']),
+                    content_type=prometheus.CONTENT_TYPE)
+
+
+@app.route('/stats/connections', methods=['GET'])
+def stats_connections():
+    return jsonify({
+        'pools': get_pool_stats(),
+        'executor': get_executor_stats(),
+    })
+
+
 @app.route('/stats/checker', methods=['GET'])
 def stats_checker():
     result = checker_get_result()
@@ -1147,6 +1445,11 @@ class ReverseProxyPathFix:
         return self.app(environ, start_response)
 
 
+if settings['ui'].get('precompile_templates', False):
+    start_time = time()
+    count = precompile_templates(app.jinja_env, themes)
+    logger.info('%d templates compiled in %.3f seconds', count, time() - start_time)
+
 application = app
 # patch app to handle non root url-s behind proxy & wsgi
 app.wsgi_app = ReverseProxyPathFix(ProxyFix(application.wsgi_app))
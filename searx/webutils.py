@@ -5,15 +5,21 @@ import hashlib
 import hmac
 import re
 import inspect
+import threading
 
 from io import StringIO
 from codecs import getincrementalencoder
 
+from jinja2 import FileSystemBytecodeCache
+
 from searx import logger
 
 
 VALID_LANGUAGE_CODE = re.compile(r'^[a-z]{2,3}(-[a-zA-Z]{2})?$')
 
+# precompressed siblings of the static files (see utils/compress_static.py): (Content-Encoding, suffix)
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
 logger = logger.getChild('webutils')
 
 
@@ -73,6 +79,43 @@ def get_static_files(static_path):
     return static_files
 
 
+def get_hashed_static_files(static_path, static_files):
+    """Returns {filename: filename with the hash of the content}, for example
+    ``css/searx.min.css`` becomes ``css/searx.min.0123456789ab.css``.
+
+    The precompressed files (``.gz`` and ``.br``) are skipped: they are found from the original filename.
+    """
+    suffixes = tuple(suffix for _, suffix in STATIC_ENCODINGS)
+    hashed_static_files = {}
+    for filename in static_files:
+        if filename.endswith(suffixes):
+            continue
+        with open(os.path.join(static_path, filename), 'rb') as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()[:12]
+        root, ext = os.path.splitext(filename)
+        hashed_static_files[filename] = '{0}.{1}{2}'.format(root, content_hash, ext)
+    return hashed_static_files
+
+
+def get_precompressed_static_files(static_path, static_files):
+    """Returns {filename: [(Content-Encoding, suffix), ...]}, the precompressed versions of the static files.
+
+    A precompressed file older than its source is skipped: it was written before the last change of the source,
+    ``make static.compress`` has to be run again.
+    """
+    precompressed_files = {}
+    for filename in static_files:
+        for encoding, suffix in STATIC_ENCODINGS:
+            if filename + suffix not in static_files:
+                continue
+            path = os.path.join(static_path, filename)
+            if os.path.getmtime(path + suffix) < os.path.getmtime(path):
+                logger.warning('%s is older than %s, it is ignored', filename + suffix, filename)
+                continue
+            precompressed_files.setdefault(filename, []).append((encoding, suffix))
+    return precompressed_files
+
+
 def get_result_templates(templates_path):
     result_templates = set()
     templates_path_length = len(templates_path) + 1
@@ -84,6 +127,54 @@ def get_result_templates(templates_path):
     return result_templates
 
 
+class SharedFileSystemBytecodeCache(FileSystemBytecodeCache):
+    """Bytecode cache of the templates in a directory shared by all the workers.
+
+    A file is written under a temporary name then renamed: a worker never reads
+    a file partially written by another worker.  The cache is optional, if the
+    directory is not writable the templates are compiled as without cache.
+    """
+
+    def dump_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        tmp_filename = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp_filename, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            logger.warning('can\'t write the template cache %s: %s', filename, e)
+        finally:
+            # the temporary file remains only if the write or the rename has failed
+            if os.path.exists(tmp_filename):
+                try:
+                    os.remove(tmp_filename)
+                except OSError:
+                    pass
+
+
+def precompile_templates(jinja_env, themes):
+    """Compile the templates of the themes and the common templates, return the number of templates.
+
+    The compiled templates are kept by jinja_env, the first requests don't wait
+    for the compilation.  With ``lazy-apps = true`` (the uwsgi.ini files of
+    searx), each worker loads the webapp and compiles the templates when it
+    starts: use ``templates_cache_directory`` to compile them only once.
+    """
+    prefixes = tuple(theme + '/' for theme in themes) + ('__common__/', )
+    count = 0
+    for template_name in jinja_env.list_templates(extensions=('html', 'xml', 'tpl')):
+        if not template_name.startswith(prefixes):
+            continue
+        try:
+            jinja_env.get_template(template_name)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('can\'t compile the template %s', template_name)
+        else:
+            count += 1
+    return count
+
+
 def new_hmac(secret_key, url):
     try:
         secret_key_bytes = bytes(secret_key, 'utf-8')
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import zlib
+from unittest import skipIf
+
+from flask import Response
+from werkzeug.datastructures import Accept
+
+from searx import compression
+from searx.testing import SearxTestCase
+
+
+def accept(*encodings):
+    return Accept([(encoding, 1) for encoding in encodings])
+
+
+class CompressionTestCase(SearxTestCase):
+
+    def setUp(self):
+        self.setattr4test(compression, 'min_size', 100)
+        self.setattr4test(compression, 'encodings', ['br', 'gzip'])
+        self.data = '{"results": [' + ', '.join('{"url": "https://example.com/%d"}' % i for i in range(100)) + ']}'
+
+    def test_gzip(self):
+        response = compression.compress_response(Response(self.data, mimetype='application/json'),
+                                                 accept('gzip', 'deflate'))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertLess(len(response.get_data()), len(self.data))
+        self.assertEqual(int(response.headers['Content-Length']), len(response.get_data()))
+        self.assertEqual(gzip.decompress(response.get_data()).decode(), self.data)
+
+    @skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        response = compression.compress_response(Response(self.data, mimetype='text/html'), accept('gzip', 'br'))
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.get_data()).decode(), self.data)
+
+    def test_not_compressed(self):
+        # the client doesn't accept any encoding
+        response = compression.compress_response(Response(self.data, mimetype='text/html'), accept())
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        # too small
+        response = compression.compress_response(Response('{}', mimetype='application/json'), accept('gzip'))
+        self.assertNotIn('Content-Encoding', response.headers)
+        # not text
+        response = compression.compress_response(Response(self.data, mimetype='image/png'), accept('gzip'))
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertNotIn('Vary', response.headers)
+        # already compressed
+        response = Response(self.data, mimetype='text/css', headers={'Content-Encoding': 'br'})
+        response = compression.compress_response(response, accept('gzip'))
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertEqual(response.get_data().decode(), self.data)
+
+    def test_streamed(self):
+        chunks = []
+        closed = []
+
+        def generate():
+            try:
+                for i in range(3):
+                    yield 'data: {"frame": %d}\n\n' % i
+            finally:
+                closed.append(True)
+
+        response = compression.compress_response(Response(generate(), mimetype='text/event-stream'),
+                                                 accept('gzip'))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for chunk in response.iter_encoded():
+            # each frame can be decompressed as soon as it is received
+            chunks.append(decompressor.decompress(chunk).decode())
+        response.close()
+        self.assertEqual(chunks[:3], ['data: {"frame": %d}\n\n' % i for i in range(3)])
+        self.assertEqual(''.join(chunks), ''.join('data: {"frame": %d}\n\n' % i for i in range(3)))
+        self.assertEqual(closed, [True])
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+from collections import OrderedDict
+import searx.shared
+from searx.shared.shared_simple import SimpleSharedDict
+from searx.metrology.counters import SharedCounters, get_engine_stats
+from searx.metrology import error_recorder, histogram, prometheus, spans, profiler
+from searx.metrology.histogram import Histogram
+from searx.testing import SearxTestCase
+
+
+class SharedCountersTestCase(SearxTestCase):
+
+    def setUp(self):
+        self.setattr4test(searx.shared, 'storage', SimpleSharedDict())
+
+    def test_inc(self):
+        counters = SharedCounters('test_', {'time': 1000000})
+        self.assertEqual(counters['count'], 0)
+        counters.inc('count')
+        counters.inc('count', 2)
+        counters.inc('time', 0.25)
+        counters.inc('time', 0.5)
+        self.assertEqual(counters['count'], 3)
+        self.assertEqual(counters['time'], 0.75)
+
+    def test_engine_stats(self):
+        # one instance per process: the values are shared
+        get_engine_stats('engine').inc('engine_time', 1.5)
+        get_engine_stats('engine').inc('engine_time_count')
+        self.assertEqual(get_engine_stats('engine')['engine_time'], 1.5)
+        self.assertEqual(get_engine_stats('engine')['engine_time_count'], 1)
+        self.assertEqual(get_engine_stats('other engine')['engine_time_count'], 0)
+
+
+class ErrorRecorderTestCase(SearxTestCase):
+
+    def setUp(self):
+        self.setattr4test(searx.shared, 'storage', SimpleSharedDict())
+        self.setattr4test(error_recorder, '_error_keys', OrderedDict())
+
+    def test_record_error(self):
+        for _ in range(3):
+            error_recorder.record_error('engine', 'some results are invalids: test')
+        error_recorder.record_error('engine', 'another error')
+
+        # another process has not recorded these errors
+        self.setattr4test(error_recorder, '_error_keys', OrderedDict())
+        errors = error_recorder.get_errors_per_engines(['engine', 'other engine'])
+        self.assertEqual(list(errors.keys()), ['engine'])
+        counts = {error_context.log_message: count for error_context, count in errors['engine'].items()}
+        self.assertEqual(counts, {'some results are invalids: test': 3, 'another error': 1})
+
+    def test_record_exception(self):
+        try:
+            raise ValueError('test')
+        except ValueError as e:
+            error_recorder.record_exception('engine', e)
+        errors = error_recorder.get_errors_per_engines(['engine'])
+        error_context, count = list(errors['engine'].items())[0]
+        self.assertEqual(error_context.exception_classname, 'ValueError')
+        self.assertEqual(error_context.function, 'test_record_exception')
+        self.assertEqual(error_context.code, "raise ValueError('test')")
+        self.assertEqual(count, 1)
+
+    def test_max_error_contexts(self):
+        self.setattr4test(error_recorder, 'MAX_ERROR_CONTEXTS', 3)
+        for i in (0, 1, 2, 3, 4, 4):
+            error_recorder.record_error('engine', 'error {0}'.format(i))
+        errors = error_recorder.get_errors_per_engines(['engine'])
+        counts = {error_context.log_message: count for error_context, count in errors['engine'].items()}
+        self.assertEqual(counts, {'error 2': 1, 'error 3': 1, 'error 4': 2})
+
+
+class HistogramTestCase(SearxTestCase):
+
+    def setUp(self):
+        self.setattr4test(searx.shared, 'storage', SimpleSharedDict())
+        self.setattr4test(histogram, '_pending', {})
+
+    def test_percentile(self):
+        h = Histogram()
+        self.assertIsNone(h.percentile(50))
+        for i in range(1, 1001):
+            h.add(i / 1000)
+        self.assertEqual(h.count, 1000)
+        self.assertAlmostEqual(h.average, 0.5005)
+        for p in (50, 90, 99):
+            # relative precision of the buckets
+            self.assertAlmostEqual(h.percentile(p), p / 100, delta=0.2 * p / 100)
+
+    def test_outliers(self):
+        h = Histogram()
+        for _ in range(95):
+            h.add(0.2)
+        for _ in range(5):
+            h.add(10)
+        self.assertLess(h.percentile(50), 0.25)
+        self.assertGreater(h.percentile(99), 8)
+        # above the last bucket
+        h.add(3600)
+        self.assertEqual(h.percentile(100), histogram.BUCKET_BOUNDS[-1])
+
+    def test_to_bytes(self):
+        h = Histogram()
+        h.add(0.5)
+        h.add(1.5)
+        h2 = Histogram.from_bytes(h.to_bytes())
+        self.assertEqual(h2.counts, h.counts)
+        self.assertEqual(h2.sum, 2.0)
+
+    def test_windows(self):
+        now = 1000000.0
+        self.setattr4test(histogram, 'time', lambda: now)
+        histogram.record('engine', 'total', 0.5)
+        histogram.record('engine', 'total', 1.0)
+        histogram.record('engine', 'http', 0.4)
+        self.assertEqual(histogram.get_histogram('engine', 'total').count, 2)
+        self.assertEqual(histogram.get_percentiles('engine', 'http')['count'], 1)
+        self.assertEqual(histogram.get_percentiles('other engine', 'http'),
+                         {'count': 0, 'p50': None, 'p90': None, 'p99': None})
+
+        # the window is still read
+        now += histogram.WINDOW_DURATION * (histogram.WINDOW_COUNT - 1)
+        histogram.record('engine', 'total', 2.0)
+        self.assertEqual(histogram.get_histogram('engine', 'total').count, 3)
+
+        # the first window is forgotten
+        now += histogram.WINDOW_DURATION
+        self.assertEqual(histogram.get_histogram('engine', 'total').count, 1)
+
+    def test_one_key(self):
+        now = 1000000.0
+        self.setattr4test(histogram, 'time', lambda: now)
+        for _ in range(histogram.WINDOW_COUNT + 3):
+            histogram.record('engine', 'total', 0.5)
+            histogram.flush()
+            now += histogram.WINDOW_DURATION
+        # all the windows in one key, only the last windows are kept
+        self.assertEqual(list(searx.shared.storage.d), ['histogram_engine_total'])
+        value = searx.shared.storage.get_bytes('histogram_engine_total')
+        self.assertEqual(len(histogram._windows_from_bytes(value)), histogram.WINDOW_COUNT)
+        now -= histogram.WINDOW_DURATION
+        self.assertEqual(histogram.get_histogram('engine', 'total').count, histogram.WINDOW_COUNT)
+
+
+class PrometheusTestCase(SearxTestCase):
+
+    def test_writer(self):
+        writer = prometheus.MetricWriter()
+        writer.header('searx_test_total', 'counter', 'Test')
+        writer.sample('searx_test_total', 2, engine='a "quoted"\\name')
+        writer.sample('searx_test_total', None, engine='no value')
+        self.assertEqual(writer.get_text(), '# HELP searx_test_total Test\n'
+                                            '# TYPE searx_test_total counter\n'
+                                            'searx_test_total{engine="a \\"quoted\\"\\\\name"} 2.0\n')
+
+
+class SpansTestCase(SearxTestCase):
+
+    def test_no_trace(self):
+        self.setattr4test(spans, '_trace', spans.ContextVar('test_trace', default=None))
+        with spans.span('stage'):
+            pass
+        spans.add_span('stage', 1.0)
+        self.assertIsNone(spans.get_trace())
+
+    def test_trace(self):
+        self.setattr4test(spans, '_trace', spans.ContextVar('test_trace', default=None))
+        trace = spans.start_trace()
+        with spans.span('stage'):
+            pass
+        with spans.span('stage'):
+            pass
+        spans.add_span('other', 0.5, count=3)
+        self.assertIs(spans.get_trace(), trace)
+        self.assertEqual(list(trace.to_dict().keys()), ['stage', 'other'])
+        self.assertEqual(trace.to_dict()['stage']['count'], 2)
+        self.assertEqual(trace.to_dict()['other'], {'duration': 0.5, 'count': 3})
+        self.assertEqual(trace.get_server_timing()[1], 'other;dur=500.0')
+
+
+class ProfilerTestCase(SearxTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.setattr4test(profiler, 'directory', self.directory.name)
+        self.setattr4test(profiler, '_stats', {})
+
+    def test_should_profile(self):
+        self.setattr4test(profiler, 'sample_rate', 0)
+        self.setattr4test(profiler, 'secret', 'secret')
+        self.assertTrue(profiler.should_profile('search', {profiler.HEADER: 'secret'}))
+        self.assertFalse(profiler.should_profile('search', {profiler.HEADER: 'other'}))
+        self.assertFalse(profiler.should_profile('search', {profiler.HEADER: 'caf\xe9'}))
+        self.assertFalse(profiler.should_profile('search', {}))
+        self.assertFalse(profiler.should_profile('stats', {profiler.HEADER: 'secret'}))
+        self.setattr4test(profiler, 'sample_rate', 1)
+        self.assertTrue(profiler.should_profile('search', {}))
+
+    def test_dump_and_rotate(self):
+        self.setattr4test(profiler, 'dump_every', 2)
+        self.setattr4test(profiler, 'max_files', 2)
+        for _ in range(7):
+            profile = profiler.start()
+            sorted(range(100))
+            profiler.stop(profile, 'search')
+        filenames = os.listdir(self.directory.name)
+        # 3 files written, the oldest is removed
+        self.assertEqual(len(filenames), 2)
+        self.assertTrue(all(filename.startswith('search-') for filename in filenames))
+        # one profile is not written yet
+        self.assertEqual(profiler._stats['search'][1], 1)
@@ -1,10 +1,17 @@
+import asyncio
+from datetime import timedelta
+from itertools import cycle
+from time import time
+from unittest import skipIf
 from unittest.mock import patch
+
+import requests
 from requests.models import Response
 
 from searx.testing import SearxTestCase
 
 import searx.poolrequests
-from searx.poolrequests import get_proxy_cycles, get_proxies
+from searx.poolrequests import get_proxy_cycles, get_proxies, get_all_proxies, httpx
 
 
 CONFIG = {'http': ['http://localhost:9090', 'http://localhost:9092'],
@@ -65,6 +72,16 @@ class TestProxy(SearxTestCase):
             'https': 'http://localhost:9093'
         })
 
+    def test_get_all_proxies(self):
+        self.assertEqual(get_all_proxies(None), [None])
+        cycles = get_proxy_cycles({'http': ['http://localhost:9090'],
+                                   'https': ['http://localhost:9091', 'http://localhost:9093']})
+        expected = [{'http': 'http://localhost:9090', 'https': 'http://localhost:9091'},
+                    {'http': 'http://localhost:9090', 'https': 'http://localhost:9093'}]
+        self.assertEqual(get_all_proxies(cycles), expected)
+        # the cycles are not advanced
+        self.assertEqual(next(cycles['https']), 'http://localhost:9091')
+
     @patch('searx.poolrequests.get_global_proxies')
     def test_request(self, mock_get_global_proxies):
         method = 'GET'
@@ -87,3 +104,171 @@ class TestProxy(SearxTestCase):
         with patch.object(searx.poolrequests.SessionSinglePool, 'request', return_value=Response()) as mock_method:
             searx.poolrequests.request(method, url, proxies=custom_proxies)
         mock_method.assert_called_once_with(method=method, url=url, proxies=custom_proxies)
+
+
+class FakeAdapter(requests.adapters.BaseAdapter):
+
+    def __init__(self):
+        super().__init__()
+        self.cookies = []
+
+    def send(self, request, **kwargs):
+        self.cookies.append(request.headers.get('Cookie'))
+        response = Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+class TestSession(SearxTestCase):
+
+    def setUp(self):
+        self.adapter = FakeAdapter()
+        self.setattr4test(searx.poolrequests, 'http_adapters', cycle((self.adapter, )))
+        self.setattr4test(searx.poolrequests, 'https_adapters', cycle((self.adapter, )))
+
+    def test_cookies(self):
+        searx.poolrequests.request('GET', 'https://localhost/', cookies={'a': 'b'})
+        # a cookie set by a previous response
+        searx.poolrequests.get_session().cookies.set('c', 'd')
+        searx.poolrequests.request('GET', 'https://localhost/')
+        self.assertEqual(self.adapter.cookies, ['a=b', None])
+
+    def test_source_ip_index(self):
+        adapters = [FakeAdapter(), FakeAdapter()]
+        self.setattr4test(searx.poolrequests, 'https_adapter_list', adapters)
+        self.setattr4test(searx.poolrequests, 'http_adapter_list', [FakeAdapter(), FakeAdapter()])
+        for source_ip_index in (1, 0, 1):
+            searx.poolrequests.request('GET', 'https://localhost/', source_ip_index=source_ip_index)
+        self.assertEqual(len(adapters[0].cookies), 1)
+        self.assertEqual(len(adapters[1].cookies), 2)
+        # the shared cycle is not advanced
+        searx.poolrequests.request('GET', 'https://localhost/')
+        self.assertEqual(len(self.adapter.cookies), 1)
+
+    def test_benchmark(self):
+        # the setup of the session before each request: the time of the request itself
+        # is dominated by requests.Session.merge_environment_settings, the same in both cases
+        count = 2000
+
+        def new_session():
+            session = searx.poolrequests.SessionSinglePool()
+            session.close()
+
+        def thread_session():
+            searx.poolrequests.get_session()
+
+        durations = {}
+        for f in (new_session, thread_session):
+            start_time = time()
+            for _ in range(count):
+                f()
+            durations[f.__name__] = time() - start_time
+
+        self.assertLess(durations['thread_session'], durations['new_session'],
+                        'sessions/sec: new session {0:.0f}, thread session {1:.0f}'
+                        .format(count / durations['new_session'], count / durations['thread_session']))
+
+
+@skipIf(searx.poolrequests.httpx is None, 'httpx is not installed')
+class TestRequestAsync(SearxTestCase):
+
+    def request(self, handler, method, url, **kwargs):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch('searx.poolrequests.get_async_client', return_value=client):
+            return asyncio.run(searx.poolrequests.request_async(method, url, **kwargs))
+
+    def test_response(self):
+        def handler(request):
+            self.assertEqual(request.headers['Cookie'], 'a=b')
+            return httpx.Response(200, headers={'Content-Type': 'text/html'}, content=b'<html></html>')
+
+        response = self.request(handler, 'GET', 'http://localhost/path', cookies={'a': 'b'})
+        self.assertIsInstance(response, Response)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.url, 'http://localhost/path')
+        self.assertEqual(response.text, '<html></html>')
+        self.assertEqual(response.encoding, 'ISO-8859-1')
+        self.assertTrue(response.ok)
+
+    def test_close(self):
+        def handler(request):
+            return httpx.Response(200, content=b'<html></html>')
+
+        response = self.request(handler, 'GET', 'http://localhost/')
+        self.assertIsInstance(response.elapsed, timedelta)
+        # the abandoned hedged requests are closed (see OnlineProcessor._search_basic)
+        response.close()
+        self.assertEqual(response.content, b'<html></html>')
+
+    def test_http_error(self):
+        def handler(request):
+            return httpx.Response(404)
+
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.request(handler, 'GET', 'http://localhost/')
+        response = self.request(handler, 'GET', 'http://localhost/', raise_for_httperror=False)
+        self.assertEqual(response.status_code, 404)
+
+    def test_timeout(self):
+        def handler(request):
+            raise httpx.ReadTimeout('timeout', request=request)
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.request(handler, 'GET', 'http://localhost/')
+
+
+@skipIf(searx.poolrequests.httpx is None, 'httpx is not installed')
+class TestRequestHTTP2(SearxTestCase):
+
+    def request(self, handler, method, url, **kwargs):
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch('searx.poolrequests.get_http2_client', return_value=client) as get_http2_client:
+            response = searx.poolrequests.request_http2(method, url, **kwargs)
+        get_http2_client.assert_called_once_with(verify=True, proxies=None, source_ip_index=None)
+        return response
+
+    def test_response(self):
+        def handler(request):
+            self.assertEqual(request.headers['Cookie'], 'a=b')
+            self.assertEqual(request.content, b'c=d')
+            return httpx.Response(200, content=b'{}')
+
+        response = self.request(handler, 'POST', 'http://localhost/', data={'c': 'd'}, cookies={'a': 'b'})
+        self.assertIsInstance(response, Response)
+        self.assertEqual(response.json(), {})
+
+    def test_timeout(self):
+        def handler(request):
+            raise httpx.ConnectTimeout('timeout', request=request)
+
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.request(handler, 'GET', 'http://localhost/')
+
+    def test_request(self):
+        with patch('searx.poolrequests.request_http2', return_value=Response()) as request_http2:
+            self.setattr4test(searx.poolrequests, 'http2_support', True)
+            searx.poolrequests.get('http://localhost/', http2=True)
+            request_http2.assert_called_once_with('get', 'http://localhost/', source_ip_index=None,
+                                                  allow_redirects=True)
+
+            self.setattr4test(searx.poolrequests, 'http2_support', False)
+            with patch.object(searx.poolrequests.SessionSinglePool, 'request', return_value=Response()):
+                searx.poolrequests.get('http://localhost/', http2=True)
+            request_http2.assert_called_once()
+
+    def test_source_ip_index(self):
+        self.setattr4test(searx.poolrequests, 'source_ips', ('192.168.0.1', '192.168.0.2'))
+        self.setattr4test(searx.poolrequests, 'source_ips_cycle', cycle(('192.168.0.1', '192.168.0.2')))
+        self.setattr4test(searx.poolrequests, '_http2_clients', {})
+        with patch('searx.poolrequests._new_client') as new_client:
+            searx.poolrequests.get_http2_client(source_ip_index=1)
+            searx.poolrequests.get_http2_client(source_ip_index=0)
+        self.assertEqual([call[0][2][2] for call in new_client.call_args_list], ['192.168.0.2', '192.168.0.1'])
+        # the cycle used by the queries is not advanced
+        self.assertEqual(next(searx.poolrequests.source_ips_cycle), '192.168.0.1')
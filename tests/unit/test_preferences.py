@@ -138,3 +138,75 @@ class TestPreferences(SearxTestCase):
         self.assertEqual(
             vars(pref.key_value_settings['categories']),
             {'value': ['general'], 'locked': False, 'choices': ['general', 'none']})
+
+    def test_copy(self):
+        from searx.preferences import Preferences
+        pref = Preferences(['oscar'], ['general'], {}, [])
+        pref.parse_dict({'language': 'fr-FR', 'tokens': 'a'})
+        pref_copy = pref.copy()
+        self.assertEqual(pref_copy.get_as_url_params(), pref.get_as_url_params())
+
+        pref_copy.parse_dict({'language': 'de-DE', 'categories': 'none', 'tokens': 'b'})
+        self.assertEqual(pref.get_value('language'), 'fr-FR')
+        self.assertEqual(pref.get_value('categories'), ['general'])
+        self.assertEqual(pref.tokens.get_value(), 'a')
+        self.assertEqual(pref_copy.get_value('language'), 'de-DE')
+        self.assertIs(pref_copy.key_value_settings['categories'].choices,
+                      pref.key_value_settings['categories'].choices)
+
+
+class TestPreferencesCache(SearxTestCase):
+
+    def get_cache(self, max_size=1000):
+        from searx.preferences import Preferences, PreferencesCache
+        self.created = 0
+
+        def create_preferences():
+            self.created += 1
+            return Preferences(['oscar'], ['general'], {}, [])
+
+        cache = PreferencesCache(create_preferences, max_size)
+        self.created = 0
+        return cache
+
+    def test_get(self):
+        cache = self.get_cache()
+        pref1, invalid_cookies = cache.get({'language': 'fr-FR', 'autocomplete': 'google'})
+        self.assertFalse(invalid_cookies)
+        self.assertEqual(pref1.get_value('language'), 'fr-FR')
+        pref1.parse_dict({'language': 'de-DE'})
+
+        pref2, invalid_cookies = cache.get({'autocomplete': 'google', 'language': 'fr-FR'})
+        self.assertFalse(invalid_cookies)
+        self.assertIsNot(pref1, pref2)
+        self.assertEqual(pref2.get_value('language'), 'fr-FR')
+        self.assertEqual(self.created, 1)
+
+    def test_foreign_cookies(self):
+        cache = self.get_cache()
+        pref, _ = cache.get({'language': 'fr-FR', 'session': 'a'})
+        self.assertNotIn('session', pref.unknown_params)
+        pref, _ = cache.get({'language': 'fr-FR', 'session': 'b', '_ga': 'GA1.2.3'})
+        self.assertEqual(pref.get_value('language'), 'fr-FR')
+        self.assertEqual(self.created, 1)
+
+    def test_invalid_cookies(self):
+        cache = self.get_cache()
+        for _ in range(2):
+            pref, invalid_cookies = cache.get({'safesearch': 'invalid'})
+            self.assertTrue(invalid_cookies)
+            self.assertEqual(pref.get_value('safesearch'), 0)
+        self.assertEqual(self.created, 1)
+
+    def test_max_size(self):
+        cache = self.get_cache(max_size=2)
+        cache.get({'language': 'fr-FR'})
+        cache.get({'language': 'de-DE'})
+        cache.get({'language': 'fr-FR'})
+        cache.get({'language': 'en-US'})
+        self.assertEqual(self.created, 3)
+        # de-DE is the least recently used
+        cache.get({'language': 'fr-FR'})
+        self.assertEqual(self.created, 3)
+        cache.get({'language': 'de-DE'})
+        self.assertEqual(self.created, 4)
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 
-from searx.results import ResultContainer
+import random
+from time import time
+from urllib.parse import urlparse
+from types import SimpleNamespace
+import searx.results
+from searx.results import ResultContainer, compare_urls, url_key
+from searx.metrology.counters import get_engine_stats
 from searx.testing import SearxTestCase
 
 
@@ -16,6 +22,37 @@ def fake_result(url='https://aa.bb/cc?dd=ee#ff',
     return result
 
 
+def order_results_reference(results):
+    """Grouping of order_results before the groups were introduced, quadratic."""
+    gresults = []
+    categoryPositions = {}
+
+    for res in results:
+        engine = searx.results.engines[res['engine']]
+        res['category'] = engine.categories[0] if len(engine.categories) > 0 else ''
+        category = res['category']\
+            + ':' + res.get('template', '')\
+            + ':' + ('img_src' if 'img_src' in res or 'thumbnail' in res else '')
+
+        current = None if category not in categoryPositions\
+            else categoryPositions[category]
+
+        if current is not None and (current['count'] > 0)\
+                and (len(gresults) - current['index'] < 20):
+            index = current['index']
+            gresults.insert(index, res)
+            for k in categoryPositions:
+                v = categoryPositions[k]['index']
+                if v >= index:
+                    categoryPositions[k]['index'] = v + 1
+            current['count'] -= 1
+        else:
+            gresults.append(res)
+            categoryPositions[category] = {'index': len(gresults), 'count': 8}
+
+    return gresults
+
+
 #  TODO
 class ResultContainerTestCase(SearxTestCase):
 
@@ -39,3 +76,83 @@ class ResultContainerTestCase(SearxTestCase):
         c.extend('wikipedia', [fake_result()])
         c.extend('wikidata', [fake_result(), fake_result(url='https://example.com/')])
         self.assertEqual(c.results_length(), 2)
+
+    def test_result_merge_url_key(self):
+        c = ResultContainer()
+        c.extend('wikipedia', [fake_result(url='https://www.example.com/a%20b/?q=1#f')])
+        c.extend('wikidata', [fake_result(url='http://example.com/a b?q=1#f'),
+                              fake_result(url='http://example.com/a b?q=2#f'),
+                              fake_result(url='http://example.com/a b/?q=1#f', template='videos.html')])
+        self.assertEqual(c.results_length(), 3)
+        self.assertEqual(c.get_unordered_results()[0]['engines'], set(['wikipedia', 'wikidata']))
+
+    def test_unordered_results_copy(self):
+        c = ResultContainer()
+        c.extend('wikipedia', [fake_result()])
+        results = c.get_unordered_results()
+        # the engines still merge their results: the copies are not modified
+        c.extend('wikidata', [fake_result(), fake_result(url='https://example.com/')])
+        self.assertEqual(results[0]['engines'], set(['wikipedia']))
+        self.assertEqual(results[0]['positions'], [1])
+        self.assertEqual([result['url'] for result in c.get_unordered_results(1)], ['https://example.com/'])
+
+    def test_result_merge_images(self):
+        c = ResultContainer()
+        c.extend('wikipedia', [fake_result(template='images.html', img_src='https://aa.bb/1.png')])
+        c.extend('wikidata', [fake_result(template='images.html', img_src='https://aa.bb/1.png'),
+                              fake_result(template='images.html', img_src='https://aa.bb/2.png')])
+        self.assertEqual(c.results_length(), 2)
+
+    def test_url_key(self):
+        urls = ['https://example.com/', 'http://www.example.com', 'https://www.example.com/path/',
+                'https://example.com/path', 'https://example.com/pa%74h', 'https://example.com/path?a=1',
+                'https://example.com/path#a', 'https://www.www.example.com/', 'https://example.com/path//']
+        for url_a in urls:
+            for url_b in urls:
+                parsed_a, parsed_b = urlparse(url_a), urlparse(url_b)
+                self.assertEqual(url_key(parsed_a) == url_key(parsed_b), compare_urls(parsed_a, parsed_b),
+                                 (url_a, url_b))
+
+
+class ResultContainerOrderTestCase(SearxTestCase):
+
+    def setUp(self):
+        categories = ['general', 'images', 'videos', 'it', 'news', 'science', 'files', 'music']
+        fake_engines = {}
+        for i, category in enumerate(categories * 4):
+            engine_name = 'engine{0}'.format(i)
+            fake_engines[engine_name] = SimpleNamespace(categories=[category],
+                                                        weight=1 + i % 3,
+                                                        stats=get_engine_stats(engine_name))
+        self.setattr4test(searx.results, 'engines', fake_engines)
+
+    def get_container(self, count, seed):
+        rnd = random.Random(seed)
+        engine_names = sorted(searx.results.engines)
+        container = ResultContainer()
+        for i in range(count):
+            result = {'url': 'https://example.com/{0}'.format(i),
+                      'engine': rnd.choice(engine_names),
+                      'positions': [rnd.randint(1, 20) for _ in range(rnd.randint(1, 3))]}
+            result['engines'] = set([result['engine']] + rnd.sample(engine_names, rnd.randint(0, 2)))
+            if rnd.random() < 0.3:
+                result['template'] = rnd.choice(['images.html', 'videos.html', 'map.html'])
+            if rnd.random() < 0.3:
+                result['img_src'] = 'https://example.com/{0}.png'.format(i)
+            container._merged_results.append(result)
+        return container
+
+    def test_order_results(self):
+        for count in (100, 500, 1000, 5000):
+            container = self.get_container(count, count)
+            merged_results = list(container._merged_results)
+            start_time = time()
+            results = container.get_ordered_results()
+            duration = time() - start_time
+
+            sorted_results = sorted(merged_results, key=lambda r: r['score'], reverse=True)
+            expected = order_results_reference(sorted_results)
+
+            self.assertEqual([r['url'] for r in results], [r['url'] for r in expected])
+            # linear: far below one second even on a slow CI
+            self.assertLess(duration, 1.0)
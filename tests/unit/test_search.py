@@ -1,8 +1,23 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+from types import SimpleNamespace
+from unittest import skipIf
+from mock import Mock, patch
+from time import sleep, time
+import requests.exceptions
 from searx.testing import SearxTestCase
+from searx.search.processors.online import OnlineProcessor, default_request_params
 from searx.search import SearchQuery, EngineRef
 import searx.search
+import searx.results
+import searx.search.circuit_breaker
+import searx.metrology.latency
+import searx.shared
+import searx.poolrequests
+from searx.metrology.counters import get_engine_stats
+from searx.shared.shared_simple import SimpleSharedDict
+from searx.search.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
 
 
 SAFESEARCH = 0
@@ -98,3 +113,460 @@ class SearchTestCase(SearxTestCase):
         results = search.search()
         # This should not redirect
         self.assertTrue(results.redirect_url is None)
+
+    def test_executor_reuse_threads(self):
+        searx.search.max_request_timeout = None
+        searx.search.initialize_executor(2)
+        self.addCleanup(searx.search.initialize_executor)
+        search_query = SearchQuery('test', [EngineRef(PUBLIC_ENGINE_NAME, 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        for _ in range(10):
+            searx.search.Search(search_query).search()
+        stats = searx.search.get_executor_stats()
+        self.assertEqual(stats['max_workers'], 2)
+        self.assertEqual(stats['submitted_count'], 10)
+        self.assertLessEqual(stats['workers'], 2)
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['queue'], 0)
+
+    def test_asyncio(self):
+        searx.search.max_request_timeout = None
+        self.setattr4test(searx.search, 'use_asyncio', True)
+        search_query = SearchQuery('test', [EngineRef(PUBLIC_ENGINE_NAME, 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        search = searx.search.Search(search_query)
+        search.search()
+        self.assertEqual(search.result_container.unresponsive_engines, set())
+        self.assertEqual(searx.search.get_event_loop(), searx.search.get_event_loop())
+
+    @skipIf(searx.poolrequests.httpx is None, 'httpx is not installed')
+    def test_asyncio_http(self):
+        searx.search.max_request_timeout = None
+        self.setattr4test(searx.search, 'use_asyncio', True)
+        httpx = searx.poolrequests.httpx
+        requested_urls = []
+
+        def handler(request):
+            requested_urls.append(str(request.url))
+            return httpx.Response(200, content=b'https://example.com/asyncio')
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.setattr4test(searx.poolrequests, 'get_async_client', lambda **kwargs: client)
+
+        def request(query, params):
+            params['url'] = 'https://dummy.example.com/?q=' + query
+
+        def response(resp):
+            return [{'url': resp.text, 'title': 'title', 'content': 'content'}]
+
+        engine = searx.search.processors[PUBLIC_ENGINE_NAME].engine
+        self.setattr4test(engine, 'request', request)
+        self.setattr4test(engine, 'response', response)
+        search_query = SearchQuery('asyncio', [EngineRef(PUBLIC_ENGINE_NAME, 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        result_container = searx.search.Search(search_query).search()
+
+        # the request is sent by request_async, the response is parsed by the engine
+        self.assertEqual(requested_urls, ['https://dummy.example.com/?q=asyncio'])
+        self.assertEqual(result_container.unresponsive_engines, set())
+        self.assertEqual([result['url'] for result in result_container.get_ordered_results()],
+                         ['https://example.com/asyncio'])
+        timings = result_container.get_timings()
+        self.assertEqual(len(timings), 1)
+        self.assertGreater(timings[0]['load'], 0)
+
+    def test_result_cache(self):
+        searx.search.max_request_timeout = None
+        searx.search.cache.initialize(ttl=60, backend='memory')
+        self.addCleanup(searx.search.cache.initialize, 0)
+        engine_stats = searx.search.processors[PUBLIC_ENGINE_NAME].engine.stats
+        search_query = SearchQuery('cached', [EngineRef(PUBLIC_ENGINE_NAME, 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        sent_search_count = engine_stats['sent_search_count']
+        first_container = searx.search.Search(search_query).search()
+        second_container = searx.search.Search(search_query).search()
+        self.assertEqual(engine_stats['sent_search_count'], sent_search_count + 1)
+        self.assertIsNot(first_container, second_container)
+
+        search_query.lang = 'fr-FR'
+        searx.search.Search(search_query).search()
+        self.assertEqual(engine_stats['sent_search_count'], sent_search_count + 2)
+
+    def test_result_cache_shared(self):
+        self.setattr4test(searx.shared, 'results_storage', None)
+        self.assertIsInstance(searx.search.cache.get_backend('shared', 60, 10), searx.search.cache.MemoryCache)
+
+        results_storage = SimpleSharedDict()
+        self.setattr4test(searx.shared, 'results_storage', results_storage)
+        backend = searx.search.cache.get_backend('shared', 60, 10)
+        self.assertIsInstance(backend, searx.search.cache.SharedCache)
+        backend.set('key', b'value')
+        self.assertEqual(backend.get('key'), b'value')
+        # the results are not in the storage of the counters and of the circuit breakers
+        self.assertIsNotNone(results_storage.get_bytes(backend.prefix + 'key'))
+        self.assertIsNone(searx.shared.storage.get_bytes(backend.prefix + 'key'))
+
+    def test_engine_cache(self):
+        searx.search.cache.initialize(ttl=0, backend='memory')
+
+        def request(query, params):
+            params['url'] = 'https://example.com/?q=' + query
+
+        engine = Mock(request=request,
+                      response=lambda resp: [{'url': 'https://example.com/', 'title': 'a', 'content': 'b'}],
+                      cache_ttl=60)
+        processor = OnlineProcessor(engine, 'cached engine')
+        send_http_request = Mock(return_value=Mock(history=[]))
+        self.setattr4test(processor, '_send_http_request', send_http_request)
+
+        first_results = processor._search_basic('test', default_request_params())
+        second_results = processor._search_basic('test', default_request_params())
+        self.assertEqual(send_http_request.call_count, 1)
+        self.assertEqual(first_results, second_results)
+        self.assertIsNot(first_results[0], second_results[0])
+
+        processor._search_basic('other', default_request_params())
+        self.assertEqual(send_http_request.call_count, 2)
+
+        engine.cache_ttl = 0
+        processor._search_basic('test', default_request_params())
+        self.assertEqual(send_http_request.call_count, 3)
+
+    def test_engine_results_error(self):
+        engine = Mock(stats=get_engine_stats('crash engine'), cache_ttl=0, hedging=False)
+        processor = OnlineProcessor(engine, 'crash engine')
+        self.setattr4test(processor, '_search_basic', lambda query, params: [{'url': 'https://example.com/'}])
+        result_container = Mock(extend=Mock(side_effect=ValueError()))
+        # the exception is recorded, not lost in the future of the executor
+        processor.search('test', default_request_params(), result_container, time(), 3.0)
+        result_container.add_unresponsive_engine.assert_called_once_with('crash engine', 'unexpected crash')
+
+    def test_engine_cache_latency(self):
+        self.setattr4test(searx.metrology.latency, 'latencies_per_engines', {})
+        engine = Mock(stats=get_engine_stats('cached engine'), cache_ttl=60)
+        processor = OnlineProcessor(engine, 'cached engine')
+        results = [{'url': 'https://example.com/', 'title': 'a', 'content': 'b'}]
+
+        # results from the engine cache: no HTTP request
+        searx.poolrequests.reset_time_for_thread()
+        processor._handle_results(results, Mock(), time() - 0.001, 3.0)
+        self.assertNotIn('cached engine', searx.metrology.latency.latencies_per_engines)
+
+        searx.poolrequests.reset_time_for_thread()
+        searx.poolrequests.add_time_for_thread(0.5)
+        processor._handle_results(results, Mock(), time() - 0.6, 3.0)
+        self.assertEqual(searx.metrology.latency.latencies_per_engines['cached engine'].count(), 1)
+
+    def set_quorum_processors(self, *engines):
+        """engines: (engine name, delay, URL of the result or None for an engine in error)"""
+        def processor(engine_name, delay, url):
+            def search(query, params, result_container, start_time, timeout_limit):
+                sleep(delay)
+                if url is None:
+                    result_container.add_unresponsive_engine(engine_name, 'unexpected crash')
+                else:
+                    result_container.extend(engine_name, [{'url': url, 'title': 'title', 'content': 'content'}])
+            return Mock(search=search, use_asyncio=False)
+
+        self.setattr4test(searx.search, 'processors', {engine[0]: processor(*engine) for engine in engines})
+        self.setattr4test(searx.results, 'engines', {engine[0]: SimpleNamespace(display_error_messages=True)
+                                                     for engine in engines})
+
+    def test_quorum(self):
+        searx.search.cache.initialize(ttl=60, backend='memory')
+        self.addCleanup(searx.search.cache.initialize, 0)
+        self.setattr4test(searx.search, 'quorum_engines', 1)
+        self.set_quorum_processors(('fast', 0, 'https://fast.example.com/'),
+                                   ('slow', 0.3, 'https://slow.example.com/'))
+        search_query = SearchQuery('quorum', [EngineRef('fast', 'general'), EngineRef('slow', 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        search = searx.search.Search(search_query)
+        search.start_time = time()
+        search.actual_timeout = 3.0
+        requests = [('fast', 'quorum', {}), ('slow', 'quorum', {})]
+        self.assertEqual(list(search.iter_multiple_requests(requests)), ['fast'])
+        self.assertEqual(search.result_container.results_length(), 1)
+        self.assertLess(time() - search.start_time, 0.3)
+        # the answer is partial: the late engine is listed
+        self.assertEqual(search.result_container.unresponsive_engines, {('slow', 'timeout', None)})
+
+        # the slow engine fills the cache
+        sleep(0.5)
+        cached_result_container = searx.search.cache.get(search_query)
+        self.assertEqual(cached_result_container.results_length(), 2)
+        self.assertEqual(cached_result_container.unresponsive_engines, set())
+        self.assertEqual(search.result_container.results_length(), 1)
+
+    def test_quorum_errors(self):
+        self.setattr4test(searx.search, 'quorum_engines', 1)
+        self.set_quorum_processors(('error', 0, None), ('slow', 0.2, 'https://slow.example.com/'))
+        search_query = SearchQuery('quorum errors', [EngineRef('error', 'general'), EngineRef('slow', 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        search = searx.search.Search(search_query)
+        search.start_time = time()
+        search.actual_timeout = 3.0
+        requests = [('error', 'quorum errors', {}), ('slow', 'quorum errors', {})]
+        # the engine in error doesn't count: the search waits for the slow engine
+        self.assertEqual(list(search.iter_multiple_requests(requests)), ['error', 'slow'])
+        self.assertEqual(search.result_container.results_length(), 1)
+
+    def test_quorum_late_engine_timeout(self):
+        searx.search.cache.initialize(ttl=60, backend='memory')
+        self.addCleanup(searx.search.cache.initialize, 0)
+        self.setattr4test(searx.search, 'quorum_engines', 1)
+        self.set_quorum_processors(('fast', 0, 'https://fast.example.com/'),
+                                   ('slow', 0.3, 'https://slow.example.com/'))
+        search_query = SearchQuery('quorum timeout', [EngineRef('fast', 'general'), EngineRef('slow', 'general')],
+                                   'en-US', SAFESEARCH, PAGENO, None, None)
+        search = searx.search.Search(search_query)
+        search.start_time = time()
+        search.actual_timeout = 0.1
+        requests = [('fast', 'quorum timeout', {}), ('slow', 'quorum timeout', {})]
+        self.assertEqual(list(search.iter_multiple_requests(requests)), ['fast'])
+
+        # the slow engine has answered after the timeout: the results are not cached
+        sleep(0.5)
+        self.assertIsNone(searx.search.cache.get(search_query))
+
+    def test_hedging(self):
+        self.setattr4test(searx.metrology.latency, 'latencies_per_engines', {})
+        for _ in range(50):
+            searx.metrology.latency.record_latency('hedged engine', 0.05)
+        backends = iter(['https://slow.example.com/', 'https://fast.example.com/'])
+
+        def request(query, params):
+            params['url'] = next(backends)
+
+        def send_http_request(params):
+            if params['url'] == 'https://slow.example.com/':
+                sleep(0.5)
+            return Mock(history=[], url=params['url'])
+
+        engine = Mock(request=request, response=lambda resp: [{'url': resp.url}], cache_ttl=0, hedging=True)
+        processor = OnlineProcessor(engine, 'hedged engine')
+        self.setattr4test(processor, '_send_http_request', send_http_request)
+
+        start_time = time()
+        results = processor._search_hedged('test', default_request_params())
+        self.assertEqual(results, [{'url': 'https://fast.example.com/'}])
+        self.assertLess(time() - start_time, 0.4)
+
+        engine.hedging = False
+        self.assertIsNone(processor.get_hedge_delay())
+
+    @skipIf(searx.poolrequests.httpx is None, 'httpx is not installed')
+    def test_hedging_asyncio(self):
+        self.setattr4test(searx.metrology.latency, 'latencies_per_engines', {})
+        for _ in range(50):
+            searx.metrology.latency.record_latency('hedged engine', 0.05)
+        backends = iter(['https://slow.example.com/', 'https://fast.example.com/'])
+
+        def request(query, params):
+            params['url'] = next(backends)
+
+        async def handler(request):
+            if request.url.host == 'slow.example.com':
+                await asyncio.sleep(0.5)
+            return searx.poolrequests.httpx.Response(200, content=b'')
+
+        client = searx.poolrequests.httpx.AsyncClient(transport=searx.poolrequests.httpx.MockTransport(handler))
+        self.setattr4test(searx.poolrequests, 'get_async_client', lambda **kwargs: client)
+        engine = Mock(request=request, response=lambda resp: [{'url': resp.url}], cache_ttl=0, hedging=True,
+                      stats=get_engine_stats('hedged engine'), proxies=None)
+        processor = OnlineProcessor(engine, 'hedged engine')
+        result_container = Mock()
+
+        asyncio.run(processor.search_async('test', default_request_params(), result_container, time(), 2.0))
+        result_container.extend.assert_called_once_with('hedged engine', [{'url': 'https://fast.example.com/'}])
+        # the HTTP time of the task which has answered
+        page_load_time = result_container.add_timing.call_args[0][2]
+        self.assertGreater(page_load_time, 0)
+        self.assertEqual(searx.metrology.latency.latencies_per_engines['hedged engine'].count(), 51)
+
+    def test_hedging_timeout(self):
+        self.setattr4test(searx.metrology.latency, 'latencies_per_engines', {})
+        for _ in range(50):
+            searx.metrology.latency.record_latency('hedged engine', 0.05)
+        backends = iter(['https://slow.example.com/', 'https://fast.example.com/'])
+        responses = []
+
+        def request(query, params):
+            params['url'] = next(backends)
+
+        def send_http_request(params):
+            sleep(0.3 if params['url'] == 'https://slow.example.com/' else 0.1)
+            response = Mock(history=[], url=params['url'])
+            responses.append(response)
+            return response
+
+        engine = Mock(request=request, response=lambda resp: [{'url': resp.url}], cache_ttl=0, hedging=True)
+        processor = OnlineProcessor(engine, 'hedged engine')
+        self.setattr4test(processor, '_send_http_request', send_http_request)
+        self.addCleanup(searx.poolrequests.set_timeout_for_thread, None)
+
+        # the slowest request is abandoned: its response is closed, not parsed
+        searx.poolrequests.set_timeout_for_thread(1.0, start_time=time())
+        results = processor._search_hedged('test', default_request_params())
+        self.assertEqual(results, [{'url': 'https://fast.example.com/'}])
+        sleep(0.3)
+        self.assertEqual([response.url for response in responses],
+                         ['https://fast.example.com/', 'https://slow.example.com/'])
+        responses[0].close.assert_not_called()
+        responses[1].close.assert_called_once_with()
+
+        # no request answers before the timeout of the engine
+        backends = iter(['https://slow.example.com/', 'https://slow.example.com/'])
+        start_time = time()
+        searx.poolrequests.set_timeout_for_thread(0.15, start_time=start_time)
+        with self.assertRaises(requests.exceptions.Timeout):
+            processor._search_hedged('test', default_request_params())
+        self.assertLess(time() - start_time, 0.25)
+
+
+class MemoryCacheTestCase(SearxTestCase):
+
+    def test_lru(self):
+        cache = searx.search.cache.MemoryCache(60, 2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        self.assertEqual(cache.get('a'), b'1')
+        cache.set('c', b'3')
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), b'3')
+
+    def test_ttl(self):
+        cache = searx.search.cache.MemoryCache(-1, 2)
+        cache.set('a', b'1')
+        self.assertIsNone(cache.get('a'))
+
+
+class CircuitBreakerTestCase(SearxTestCase):
+
+    def setUp(self):
+        self.setattr4test(searx.shared, 'storage', SimpleSharedDict())
+
+    def test_shared_state(self):
+        # one CircuitBreaker per process for the same engine
+        worker1 = CircuitBreaker('engine', 1.0)
+        worker2 = CircuitBreaker('engine', 1.0)
+        self.assertTrue(worker1.allow_request())
+
+        worker1.record_failure(suspended_time=60)
+        self.assertEqual(worker2.get_state(), OPEN)
+        self.assertFalse(worker2.allow_request())
+        self.assertEqual(worker2.continuous_errors, 1)
+
+        worker1.record_failure()
+        self.assertEqual(worker2.continuous_errors, 2)
+
+    def test_half_open(self):
+        worker1 = CircuitBreaker('engine', 1.0)
+        worker2 = CircuitBreaker('engine', 1.0)
+        worker1.record_failure(suspended_time=0.01)
+        sleep(0.02)
+        self.assertEqual(worker1.get_state(), HALF_OPEN)
+
+        # only one probe
+        self.assertTrue(worker2.allow_request())
+        self.assertFalse(worker1.allow_request())
+        self.assertFalse(worker2.allow_request())
+
+        # the probe fails: suspended again
+        worker2.record_failure(suspended_time=0.01)
+        self.assertEqual(worker1.get_state(), OPEN)
+        sleep(0.02)
+
+        # the probe succeeds
+        self.assertTrue(worker1.allow_request())
+        worker1.record_success()
+        self.assertEqual(worker2.get_state(), CLOSED)
+        self.assertEqual(worker2.continuous_errors, 0)
+        self.assertTrue(worker2.allow_request())
+
+    def test_probe_timeout(self):
+        self.setattr4test(searx.search.circuit_breaker, 'PROBE_MARGIN', 0.01)
+        worker1 = CircuitBreaker('engine', 0)
+        worker2 = CircuitBreaker('engine', 0)
+        worker1.record_failure(suspended_time=0)
+        self.assertTrue(worker1.allow_request())
+        self.assertFalse(worker2.allow_request())
+        # the probe of worker1 never ends
+        sleep(0.02)
+        self.assertTrue(worker2.allow_request())
+
+
+class PrewarmTestCase(SearxTestCase):
+
+    def test_engine_origin(self):
+        get_engine_origin = searx.search.prewarm.get_engine_origin
+        self.assertEqual(get_engine_origin(SimpleNamespace(base_url='https://example.com/search?q={query}')),
+                         'https://example.com/')
+        self.assertEqual(get_engine_origin(SimpleNamespace(base_url='https://{language}.example.com/',
+                                                           search_url='http://example.org/?q={query}')),
+                         'http://example.org/')
+        self.assertIsNone(get_engine_origin(SimpleNamespace(url='ftp://example.com/')))
+        self.assertIsNone(get_engine_origin(SimpleNamespace()))
+
+    def test_prewarm(self):
+        def engine(base_url, **kwargs):
+            attributes = dict(base_url=base_url, disabled=False, engine_type='online', timeout=2.0,
+                              enable_http2=False)
+            attributes.update(kwargs)
+            return SimpleNamespace(**attributes)
+
+        fake_engines = {
+            'a': engine('https://a.example.com/search'),
+            'b': engine('https://a.example.com/other', enable_http2=True),
+            'c': engine('https://c.example.com/', disabled=True),
+            'd': engine('https://d.example.com/', engine_type='offline'),
+            'e': engine('https://e.example.com/', enable_http2=True),
+        }
+        self.setattr4test(searx.search.prewarm, 'engines', fake_engines)
+        with patch('searx.poolrequests.head') as head:
+            searx.search.prewarm.prewarm()
+        calls = sorted((call[0][0], call[1].get('http2', False)) for call in head.call_args_list)
+        self.assertEqual(calls, [('https://a.example.com/', False), ('https://e.example.com/', True)])
+
+    def test_prewarm_source_ips_proxies(self):
+        proxies = searx.poolrequests.get_proxy_cycles({'https': ['socks5h://p1', 'socks5h://p2']})
+        fake_engines = {
+            'a': SimpleNamespace(base_url='https://a.example.com/', disabled=False, engine_type='online',
+                                 timeout=2.0, enable_http2=False, proxies=proxies),
+        }
+        self.setattr4test(searx.search.prewarm, 'engines', fake_engines)
+        self.setattr4test(searx.poolrequests, 'source_ips', ('192.168.0.1', '192.168.0.2'))
+        self.setattr4test(searx.poolrequests, 'get_pool_stats', dict)
+        with patch('searx.poolrequests.head') as head:
+            searx.search.prewarm.prewarm()
+        calls = sorted((call[1]['source_ip_index'], call[1]['proxies']['https']) for call in head.call_args_list)
+        self.assertEqual(calls, [(0, 'socks5h://p1'), (0, 'socks5h://p2'), (1, 'socks5h://p1'), (1, 'socks5h://p2')])
+        # the proxy cycle used by the queries is not advanced
+        self.assertEqual(next(fake_engines['a'].proxies['https']), 'socks5h://p1')
+
+
+class LatencyTestCase(SearxTestCase):
+
+    def test_percentile(self):
+        latency = searx.metrology.latency.RollingLatency(100)
+        self.assertIsNone(latency.percentile(95))
+        for i in range(200, 0, -1):
+            latency.add(i / 100)
+        # only the last 100 values: 0.01 to 1.00
+        self.assertEqual(latency.count(), 100)
+        self.assertEqual(latency.percentile(95), 0.95)
+        self.assertEqual(latency.percentile(100), 1.0)
+        self.assertEqual(latency.percentile(0), 0.01)
+
+    def test_adaptive_timeout(self):
+        get_timeout = searx.metrology.latency.get_timeout
+        self.setattr4test(searx.metrology.latency, 'latencies_per_engines', {})
+        self.setattr4test(searx.metrology.latency, 'adaptive_timeout', False)
+        for _ in range(100):
+            searx.metrology.latency.record_latency('engine', 1.0)
+        self.assertEqual(get_timeout('engine', 6.0), 6.0)
+
+        self.setattr4test(searx.metrology.latency, 'adaptive_timeout', True)
+        self.assertEqual(get_timeout('engine', 6.0), 1.5)
+        self.assertEqual(get_timeout('engine', 1.2), 1.2)
+        self.assertEqual(get_timeout('other engine', 6.0), 6.0)
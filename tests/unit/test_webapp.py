@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import gzip
 import json
+import os
+import tempfile
 from urllib.parse import ParseResult
 from mock import Mock
-from searx import webapp
+import searx.shared
+from searx import webapp, compression
+from searx.shared.shared_simple import SimpleSharedDict
 from searx.testing import SearxTestCase
-from searx.search import Search
+from searx.webutils import get_hashed_static_files, get_precompressed_static_files
+from searx.search import Search, SearchWithPlugins
 
 
 class ViewsTestCase(SearxTestCase):
@@ -13,6 +19,8 @@ class ViewsTestCase(SearxTestCase):
     def setUp(self):
         webapp.app.config['TESTING'] = True  # to get better error messages
         self.app = webapp.app.test_client()
+        # the counters of the metrics start from zero in each test
+        self.setattr4test(searx.shared, 'storage', SimpleSharedDict())
 
         # set some defaults
         test_results = [
@@ -47,7 +55,11 @@ class ViewsTestCase(SearxTestCase):
         ]
 
         def search_mock(search_self, *args):
-            search_self.result_container = Mock(get_ordered_results=lambda: test_results,
+            def get_results(start=0):
+                return [dict(result) for result in test_results[start:]]
+
+            search_self.result_container = Mock(get_ordered_results=get_results,
+                                                get_unordered_results=get_results,
                                                 answers=dict(),
                                                 corrections=set(),
                                                 suggestions=set(),
@@ -58,8 +70,9 @@ class ViewsTestCase(SearxTestCase):
                                                 results_length=lambda: len(test_results),
                                                 get_timings=lambda: timings,
                                                 redirect_url=None)
+            return iter(('startpage', 'youtube'))
 
-        self.setattr4test(Search, 'search', search_mock)
+        self.setattr4test(Search, 'search_iter', search_mock)
 
         def get_current_theme_name_mock(override=None):
             if override:
@@ -118,6 +131,44 @@ class ViewsTestCase(SearxTestCase):
             result.data
         )
 
+    def test_search_html_stream(self):
+        self.setattr4test(webapp, 'stream_html', True)
+        search_iter = Search.search_iter
+        searches = []
+
+        def search_iter_mock(search_self, *args):
+            searches.append(search_self)
+            return search_iter(search_self, *args)
+
+        self.setattr4test(Search, 'search_iter', search_iter_mock)
+        result = self.app.post('/search', data={'q': 'test'}, buffered=False)
+        self.assertEqual(result.status_code, 200)
+        chunks = iter(result.response)
+        head = next(chunks)
+        # the head of the page is sent before the search
+        self.assertIn(b'</head>', head)
+        self.assertNotIn(b'second.test.xyz', head)
+        self.assertEqual(searches, [])
+        body = b''.join(chunks)
+        self.assertEqual(len(searches), 1)
+        self.assertIn(b'<p class="result-content">second <span class="highlight">test</span> content</p>', body)
+
+        # the same page as the page which is not streamed
+        self.setattr4test(webapp, 'stream_html', False)
+        self.assertEqual(head + body, self.app.post('/search', data={'q': 'test'}).data)
+
+    def test_search_html_stream_error(self):
+        self.setattr4test(webapp, 'stream_html', True)
+
+        def search_iter_mock(search_self, *args):
+            raise ValueError()
+
+        self.setattr4test(Search, 'search_iter', search_iter_mock)
+        result = self.app.post('/search', data={'q': 'test'})
+        # the head is already sent: the error is in the page
+        self.assertEqual(result.status_code, 200)
+        self.assertIn(b'search error', result.data)
+
     def test_index_json(self):
         result = self.app.post('/', data={'q': 'test', 'format': 'json'})
         self.assertEqual(result.status_code, 308)
@@ -131,6 +182,52 @@ class ViewsTestCase(SearxTestCase):
         self.assertEqual(result_dict['results'][0]['content'], 'first test content')
         self.assertEqual(result_dict['results'][0]['url'], 'http://first.test.xyz')
 
+    def test_search_json_stream(self):
+        result = self.app.post('/search', data={'q': 'test', 'format': 'json'},
+                               headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.mimetype, 'application/x-ndjson')
+        frames = [json.loads(line) for line in result.data.decode().splitlines()]
+
+        self.assertEqual([frame['type'] for frame in frames], ['engine', 'engine', 'final'])
+        self.assertEqual(frames[0]['engine'], 'startpage')
+        self.assertEqual(len(frames[0]['results']), 2)
+        self.assertEqual(frames[1]['results'], [])
+        self.assertEqual(len(frames[2]['results']), 2)
+        self.assertEqual(frames[2]['results'][0]['url'], 'http://first.test.xyz')
+
+    def test_search_json_stream_plugins(self):
+        def on_result(search_self, result):
+            result['url'] = result['url'].replace('http://', 'https://')
+            return True
+
+        self.setattr4test(SearchWithPlugins, 'on_result', on_result)
+        result = self.app.post('/search', data={'q': 'test', 'format': 'json'},
+                               headers={'Accept': 'application/x-ndjson'})
+        frames = [json.loads(line) for line in result.data.decode().splitlines()]
+        self.assertEqual(frames[0]['results'][0]['url'], 'https://first.test.xyz')
+
+    def test_search_json_stream_external_bang(self):
+        def search_mock(search_self, *args):
+            search_self.result_container = Mock(redirect_url='https://duckduckgo.com/?q=test',
+                                                get_ordered_results=lambda: [])
+            return iter(())
+
+        self.setattr4test(Search, 'search_iter', search_mock)
+        result = self.app.post('/search', data={'q': '!!ddg test', 'format': 'json'},
+                               headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(result.status_code, 302)
+        self.assertEqual(result.headers['Location'], 'https://duckduckgo.com/?q=test')
+
+    def test_search_json_event_stream(self):
+        result = self.app.post('/search', data={'q': 'test', 'format': 'json'},
+                               headers={'Accept': 'text/event-stream'})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.mimetype, 'text/event-stream')
+        events = result.data.decode().split('\n\n')
+        self.assertTrue(events[0].startswith('event: engine\ndata: {'))
+        self.assertTrue(events[2].startswith('event: final\ndata: {'))
+
     def test_index_csv(self):
         result = self.app.post('/', data={'q': 'test', 'format': 'csv'})
         self.assertEqual(result.status_code, 308)
@@ -203,6 +300,44 @@ class ViewsTestCase(SearxTestCase):
         self.assertEqual(result.status_code, 200)
         self.assertIn(b'<h1>Engine stats</h1>', result.data)
 
+    def test_stats_latency(self):
+        result = self.app.get('/stats/latency')
+        self.assertEqual(result.status_code, 200)
+        self.assertIsInstance(json.loads(result.data.decode()), dict)
+
+    def test_server_timing(self):
+        result = self.app.post('/search', data={'q': 'test'})
+        server_timing = result.headers['Server-Timing']
+        self.assertIn('total_0_startpage;dur=800', server_timing)
+        for stage in ('preferences', 'search_query', 'raw_text_query', 'format', 'render'):
+            self.assertIn(stage + ';dur=', server_timing)
+
+    def test_trace_log(self):
+        trace_logger = Mock()
+        self.setattr4test(webapp, 'trace_logger', trace_logger)
+        self.app.post('/search', data={'q': 'test'})
+        trace = json.loads(trace_logger.info.call_args[0][0])
+        self.assertEqual(trace['endpoint'], 'search')
+        self.assertEqual(trace['status'], 200)
+        self.assertEqual(trace['spans']['render']['count'], 1)
+        self.assertEqual(trace['engines']['youtube'], {'total': 0.9, 'load': 0.6})
+
+    def test_metrics(self):
+        self.app.get('/search?q=test')
+        result = self.app.get('/metrics')
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn(b'# TYPE searx_http_requests_total counter', result.data)
+        self.assertIn(b'searx_http_requests_total{endpoint="search"} 1.0\n', result.data)
+        self.assertIn(b'searx_cache_requests_total{cache="results",result="hit"}', result.data)
+
+    def test_stats_connections(self):
+        result = self.app.get('/stats/connections')
+        self.assertEqual(result.status_code, 200)
+        result_dict = json.loads(result.data.decode())
+        self.assertIn('pools', result_dict)
+        self.assertIn('executor', result_dict)
+
     def test_robots_txt(self):
         result = self.app.get('/robots.txt')
         self.assertEqual(result.status_code, 200)
@@ -222,3 +357,94 @@ class ViewsTestCase(SearxTestCase):
         self.assertEqual(result.status_code, 200)
         json_result = result.get_json()
         self.assertTrue(json_result)
+
+    def test_render_context(self):
+        self.setattr4test(webapp, '_render_contexts', {})
+        self.app.get('/')
+        self.app.get('/about')
+        self.assertEqual(len(webapp._render_contexts), 1)
+        render_context = next(iter(webapp._render_contexts.values()))
+        self.assertEqual(render_context.categories[0], 'general')
+        self.assertIn('autocomplete=', render_context.opensearch_url)
+
+        self.app.set_cookie('localhost', 'autocomplete', 'google')
+        self.app.get('/')
+        self.assertEqual(len(webapp._render_contexts), 2)
+
+        self.setattr4test(webapp, 'get_engines_version', lambda: -1)
+        self.app.get('/')
+        self.assertEqual(len(webapp._render_contexts), 3)
+
+    def test_static(self):
+        with tempfile.TemporaryDirectory() as static_path:
+            with open(static_path + '/searx.css', 'wb') as f:
+                f.write(b'body {}')
+            with open(static_path + '/searx.css.gz', 'wb') as f:
+                f.write(gzip.compress(b'body {}'))
+            static_files = {'searx.css', 'searx.css.gz'}
+            hashed_files = get_hashed_static_files(static_path, static_files)
+            self.assertEqual(list(hashed_files), ['searx.css'])
+            self.setattr4test(webapp, 'static_path', static_path)
+            self.setattr4test(webapp, 'static_files', static_files)
+            self.setattr4test(webapp, 'static_hashed_files', hashed_files)
+            self.setattr4test(webapp, 'static_original_files', {v: k for k, v in hashed_files.items()})
+            self.setattr4test(webapp, 'static_precompressed_files',
+                              get_precompressed_static_files(static_path, static_files))
+
+            with webapp.app.test_request_context():
+                url = webapp.url_for_theme('static', filename='searx.css')
+            self.assertRegex(url, r'^/static/searx\.[0-9a-f]{12}\.css$')
+
+            result = self.app.get(url)
+            self.assertEqual(result.status_code, 200)
+            self.assertEqual(result.data, b'body {}')
+            self.assertIn('immutable', result.headers['Cache-Control'])
+            self.assertEqual(result.headers['Vary'], 'Accept-Encoding')
+            result.close()
+
+            result = self.app.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+            self.assertEqual(result.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(result.mimetype, 'text/css')
+            self.assertEqual(gzip.decompress(result.data), b'body {}')
+            result.close()
+
+            result = self.app.get('/static/searx.css')
+            self.assertEqual(result.data, b'body {}')
+            self.assertNotIn('immutable', result.headers.get('Cache-Control', ''))
+            result.close()
+
+    def test_static_stale_precompressed(self):
+        with tempfile.TemporaryDirectory() as static_path:
+            with open(static_path + '/searx.css.gz', 'wb') as f:
+                f.write(gzip.compress(b'body {}'))
+            os.utime(static_path + '/searx.css.gz', (1000000000, 1000000000))
+            # searx.css has been modified after make static.compress
+            with open(static_path + '/searx.css', 'wb') as f:
+                f.write(b'body { color: red; }')
+            static_files = {'searx.css', 'searx.css.gz'}
+            precompressed_files = get_precompressed_static_files(static_path, static_files)
+            self.assertEqual(precompressed_files, {})
+            self.setattr4test(webapp, 'static_path', static_path)
+            self.setattr4test(webapp, 'static_files', static_files)
+            self.setattr4test(webapp, 'static_precompressed_files', precompressed_files)
+
+            result = self.app.get('/static/searx.css', headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', result.headers)
+            self.assertEqual(result.data, b'body { color: red; }')
+            result.close()
+
+    def test_search_compression(self):
+        self.setattr4test(compression, 'enabled', True)
+        self.setattr4test(compression, 'min_size', 100)
+        self.setattr4test(compression, 'encodings', ['gzip'])
+
+        result = self.app.post('/search', data={'q': 'test', 'format': 'json'},
+                               headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers['Content-Encoding'], 'gzip')
+        result_dict = json.loads(gzip.decompress(result.data).decode())
+        self.assertEqual('test', result_dict['query'])
+
+        result = self.app.post('/search', data={'q': 'test', 'format': 'json'})
+        self.assertNotIn('Content-Encoding', result.headers)
+        self.assertEqual('test', json.loads(result.data.decode())['query'])
@@ -63,3 +63,43 @@ class TestNewHmac(SearxTestCase):
             self.assertEqual(
                 res,
                 '23e2baa2404012a5cc8e4a18b4aabf0dde4cb9b56f679ddc0fd6d7c24339d819')
+
+
+class TestTemplates(SearxTestCase):
+
+    def get_environment(self, bytecode_cache=None):
+        from jinja2 import DictLoader, Environment
+        loader = DictLoader({
+            'oscar/index.html': '{{ 1 + 1 }}',
+            'oscar/spec.txt': 'not a template {{',
+            'other/index.html': '{{ 1 + 2 }}',
+            '__common__/opensearch.xml': '<xml />',
+        })
+        return Environment(loader=loader, bytecode_cache=bytecode_cache)
+
+    def test_precompile_templates(self):
+        env = self.get_environment()
+        self.assertEqual(webutils.precompile_templates(env, ['oscar']), 2)
+        self.assertEqual(sorted(name for _, name in env.cache.keys()),
+                         ['__common__/opensearch.xml', 'oscar/index.html'])
+
+    def test_bytecode_cache(self):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            env = self.get_environment(webutils.SharedFileSystemBytecodeCache(directory))
+            self.assertEqual(env.get_template('oscar/index.html').render(), '2')
+            self.assertEqual(len(os.listdir(directory)), 1)
+            self.assertFalse(any(filename.endswith('.tmp') for filename in os.listdir(directory)))
+
+            env = self.get_environment(webutils.SharedFileSystemBytecodeCache(directory))
+            self.assertEqual(env.get_template('oscar/index.html').render(), '2')
+
+    def test_bytecode_cache_write_error(self):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            env = self.get_environment(webutils.SharedFileSystemBytecodeCache(directory))
+            with mock.patch('os.replace', side_effect=OSError('read-only')):
+                self.assertEqual(env.get_template('oscar/index.html').render(), '2')
+            self.assertEqual(os.listdir(directory), [])
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Measure the first request to a page of searx for each theme, in a new
+process: without template cache, with the bytecode cache of the templates
+(``ui.templates_cache_directory``) and with the precompiled templates
+(``ui.precompile_templates``).
+
+.. code::  bash
+
+    $ python3 utils/benchmark_templates.py
+    $ python3 utils/benchmark_templates.py --path /about --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MODES = ('none', 'bytecode_cache', 'precompile')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a new process: searx.webapp is imported, then the page is requested twice
+CHILD_CODE = '''
+import json, sys
+from time import perf_counter
+from searx import webapp
+from searx.webutils import SharedFileSystemBytecodeCache, precompile_templates
+
+theme, mode, path, cache_directory = sys.argv[1:5]
+if mode == 'bytecode_cache':
+    webapp.app.jinja_env.bytecode_cache = SharedFileSystemBytecodeCache(cache_directory)
+elif mode == 'precompile':
+    precompile_templates(webapp.app.jinja_env, webapp.themes)
+client = webapp.app.test_client()
+client.set_cookie('localhost', 'theme', theme)
+durations = []
+for _ in range(2):
+    start_time = perf_counter()
+    client.get(path)
+    durations.append(perf_counter() - start_time)
+print(json.dumps(durations))
+'''
+
+
+def measure(theme, mode, path, cache_directory):
+    """Return the durations of the first and the second request in a new process"""
+    python_path = os.pathsep.join(filter(None, (REPO_ROOT, os.environ.get('PYTHONPATH'))))
+    env = dict(os.environ, SEARX_DEBUG='1', PYTHONPATH=python_path)
+    output = subprocess.run([sys.executable, '-c', CHILD_CODE, theme, mode, path, cache_directory],
+                            env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def parse_argument(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', default='/preferences', help='requested page (default: /preferences)')
+    parser.add_argument('--runs', type=int, default=3, help='number of processes for each measure (default: 3)')
+    parser.add_argument('--themes', nargs='+', default=('oscar', 'simple'), help='themes (default: oscar simple)')
+    return parser.parse_args(args)
+
+
+def main(args=None, stream=sys.stdout):
+    prog_args = parse_argument(args)
+    stream.write('{0:10} {1:16} {2:>14} {3:>14}\n'.format('theme', 'mode', 'first (ms)', 'second (ms)'))
+    for theme in prog_args.themes:
+        with tempfile.TemporaryDirectory() as cache_directory:
+            # fill the bytecode cache, as the first worker does
+            measure(theme, 'bytecode_cache', prog_args.path, cache_directory)
+            for mode in MODES:
+                durations = [measure(theme, mode, prog_args.path, cache_directory) for _ in range(prog_args.runs)]
+                first = statistics.median(duration[0] for duration in durations) * 1000
+                second = statistics.median(duration[1] for duration in durations) * 1000
+                stream.write('{0:10} {1:16} {2:14.1f} {3:14.1f}\n'.format(theme, mode, first, second))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
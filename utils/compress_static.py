@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Write the gzip and brotli versions of the static files of searx, next to
+them (``searx.min.css.gz`` and ``searx.min.css.br``).  The webapp sends them
+to the browsers which accept these encodings.  The brotli versions require
+the ``brotli`` package.
+
+.. code::  bash
+
+    $ python3 utils/compress_static.py searx/static
+"""
+
+import argparse
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# the other files (images, fonts) are already compressed
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.html', '.txt', '.xml', '.ttf', '.eot')
+# a smaller file is not worth a compressed version
+MIN_SIZE = 256
+
+
+def compress_gzip(content):
+    # mtime=0: the same content gives the same file
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def compress_brotli(content):
+    return brotli.compress(content, quality=11)
+
+
+def get_compressors():
+    compressors = [('.gz', compress_gzip)]
+    if brotli is not None:
+        compressors.append(('.br', compress_brotli))
+    return compressors
+
+
+def compress_file(filename, compressors):
+    """Write the compressed versions of filename which are missing or older, return the number of written files"""
+    count = 0
+    content = None
+    mtime = os.path.getmtime(filename)
+    for suffix, compress in compressors:
+        compressed_filename = filename + suffix
+        if os.path.exists(compressed_filename) and os.path.getmtime(compressed_filename) >= mtime:
+            continue
+        if content is None:
+            with open(filename, 'rb') as f:
+                content = f.read()
+        compressed_content = compress(content)
+        if len(compressed_content) >= len(content):
+            continue
+        with open(compressed_filename, 'wb') as f:
+            f.write(compressed_content)
+        count += 1
+    return count
+
+
+def compress_directory(directory, compressors):
+    count = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if filename.endswith(COMPRESSED_EXTENSIONS) and os.path.getsize(path) >= MIN_SIZE:
+                count += compress_file(path, compressors)
+    return count
+
+
+def parse_argument(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('directory', help='directory of the static files')
+    return parser.parse_args(args)
+
+
+def main(args=None, stream=sys.stdout):
+    prog_args = parse_argument(args)
+    compressors = get_compressors()
+    if brotli is None:
+        stream.write('brotli is not installed: only the gzip versions are written\n')
+    count = compress_directory(prog_args.directory, compressors)
+    stream.write('{0} file(s) written\n'.format(count))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
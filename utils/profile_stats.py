@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""Merge the profiles written by searx (see the ``profiler:`` section of the
+settings) and print the top functions.
+
+.. code::  bash
+
+    $ python3 utils/profile_stats.py /tmp/searx_profiles
+    $ python3 utils/profile_stats.py /tmp/searx_profiles --endpoint search --sort tottime --limit 50
+"""
+
+import argparse
+import os
+import pstats
+import sys
+
+FILE_SUFFIX = '.prof'
+
+
+def get_filenames(directory, endpoint=None):
+    """Return the profiles of directory, only the profiles of endpoint if it is not None"""
+    filenames = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(FILE_SUFFIX):
+            continue
+        if endpoint is not None and filename.rsplit('-', 2)[0] != endpoint:
+            continue
+        filenames.append(os.path.join(directory, filename))
+    return filenames
+
+
+def get_endpoints(filenames):
+    return sorted(set(os.path.basename(filename).rsplit('-', 2)[0] for filename in filenames))
+
+
+def merge(filenames, stream=sys.stdout):
+    stats = pstats.Stats(filenames[0], stream=stream)
+    for filename in filenames[1:]:
+        stats.add(filename)
+    return stats
+
+
+def parse_argument(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('directory', help='directory of the profiles')
+    parser.add_argument('--endpoint', help='only the profiles of this endpoint (default: one report per endpoint)')
+    parser.add_argument('--sort', default='cumulative',
+                        help='sort key of pstats: cumulative, tottime, ncalls... (default: cumulative)')
+    parser.add_argument('--limit', type=int, default=30, help='number of functions (default: 30)')
+    return parser.parse_args(args)
+
+
+def main(args=None, stream=sys.stdout):
+    prog_args = parse_argument(args)
+    filenames = get_filenames(prog_args.directory, prog_args.endpoint)
+    if not filenames:
+        stream.write('No profile in {0}\n'.format(prog_args.directory))
+        return 1
+    endpoints = [prog_args.endpoint] if prog_args.endpoint else get_endpoints(filenames)
+    for endpoint in endpoints:
+        endpoint_filenames = get_filenames(prog_args.directory, endpoint)
+        stream.write('=== {0}: {1} file(s)\n'.format(endpoint, len(endpoint_filenames)))
+        stats = merge(endpoint_filenames, stream)
+        stats.strip_dirs().sort_stats(prog_args.sort).print_stats(prog_args.limit)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())